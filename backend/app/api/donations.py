@@ -1,17 +1,19 @@
 # app/api/donations.py
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
-from pymongo.database import Database
-from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from app.services.geo_enrich import ensure_location_and_geo
+from app.services.geocode_worker import pending_fields, enqueue
+from app.services import listing, versions
 
 
 # ----- DB dependency (wired in app.main via dependency_overrides)
-def get_db() -> Database:
-    # this gets overridden in app.main
+def get_db() -> AsyncIOMotorDatabase:
+    # this gets overridden in app.main (Motor database)
     raise RuntimeError("get_db() not wired")
 
 # ----- Models
@@ -44,7 +46,7 @@ class DonationOut(BaseModel):
 
 router = APIRouter(prefix="/api/donations", tags=["donations"])
 
-def col(db: Database) -> Collection:
+def col(db: AsyncIOMotorDatabase) -> AsyncIOMotorCollection:
     return db["donations"]
 
 def _str_id(v) -> str:
@@ -78,10 +80,11 @@ def _serialize(doc: dict) -> dict:
         "created_at": _as_dt(doc.get("created_at")),
         "status": doc.get("status"),
         "driver_id": _str_id(doc.get("driver_id")) if doc.get("driver_id") else None,
+        "geo_pending": bool(doc.get("geo_pending")),
     }
 
 @router.post("", status_code=status.HTTP_201_CREATED)
-def create_donation(body: DonationIn, db: Database = Depends(get_db)):
+async def create_donation(body: DonationIn, db: AsyncIOMotorDatabase = Depends(get_db)):
     c = col(db)
     doc = {
         "donor_name": body.donor_name,
@@ -93,24 +96,64 @@ def create_donation(body: DonationIn, db: Database = Depends(get_db)):
         "created_at": datetime.utcnow(),
     }
 
-    # ✅ NEW: Convert address → coordinates if needed
-    doc = ensure_location_and_geo(doc)
-
-    ins = c.insert_one(doc)
-    saved = c.find_one({"_id": ins.inserted_id})
-    return {"donation": _serialize(saved)}
-
-@router.get("", response_model=List[DonationOut])
-def list_donations(db: Database = Depends(get_db)):
-    data = list(col(db).find({}).sort("created_at", -1))
-    return [_serialize(d) for d in data]
+    # Address only → saved as geo_pending and geocoded in the background;
+    # otherwise just normalize the given coordinates (no provider call)
+    pending = pending_fields(doc)
+    if not pending:
+        doc = ensure_location_and_geo(doc)
+
+    ins = await c.insert_one(doc)  # sets doc["_id"]; no read-back needed
+    await versions.bump(db, "donations")
+    if pending:
+        await enqueue(db, "donations", ins.inserted_id, doc["address"])
+    return {"donation": _serialize(doc)}
+
+LIST_FIELDS = set(DonationOut.model_fields) | {"geo_pending"}
+
+@router.get("")
+async def list_donations(
+    request: Request,
+    response: Response,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1, le=listing.MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    status_q: Optional[str] = Query(None, alias="status", description="one status or a comma list"),
+    donor: Optional[str] = Query(None, description="exact donor_name"),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    fields: Optional[str] = Query(None, description="comma list of fields to return"),
+):
+    """
+    Newest first. With limit or cursor: {"items", "next_cursor"} pages.
+    Without either, the legacy full array (while LEGACY_LISTINGS is on).
+    Conditional: 304 when If-None-Match still matches the ETag.
+    """
+    not_modified = await versions.check(request, response, db, "donations")
+    if not_modified is not None:
+        return not_modified
+    filt: dict = {}
+    if status_q:
+        filt["status"] = listing.in_list(status_q)
+    if donor:
+        filt["donor_name"] = donor
+    if bbox:
+        filt.update(listing.bbox_filter(bbox))
+    proj, keys = listing.projection(fields, LIST_FIELDS)
+
+    if not listing.paged(limit, cursor):
+        data = await col(db).find(filt, proj).sort(listing.SORT).to_list(length=None)
+        if keys is not None:
+            return [listing.pick(_serialize(d), keys) for d in data]
+        return [DonationOut(**_serialize(d)).model_dump() for d in data]
+
+    docs, nxt = await listing.page(col(db), filt, limit=limit, cursor=cursor, proj=proj)
+    return {"items": [listing.pick(_serialize(d), keys) for d in docs], "next_cursor": nxt}
 
 # ---------- Delivery ops ----------
 @router.patch("/{donation_id}/assign_driver")
-def assign_driver(
+async def assign_driver(
     donation_id: str,
     driver_id: str = Query(..., description="ObjectId of driver"),
-    db: Database = Depends(get_db),
+    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     try:
         _id = ObjectId(donation_id)
@@ -118,20 +161,22 @@ def assign_driver(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid donation_id or driver_id")
 
-    c = col(db)
-    res = c.update_one({"_id": _id}, {"$set": {"driver_id": _driver, "status": "assigned"}})
-    if res.matched_count == 0:
+    doc = await col(db).find_one_and_update(
+        {"_id": _id}, {"$set": {"driver_id": _driver, "status": "assigned"}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
         raise HTTPException(status_code=404, detail="Donation not found")
-    doc = c.find_one({"_id": _id})
+    await versions.bump(db, "donations")
     return {"ok": True, "donation": _serialize(doc)}
 
 ValidStatus = {"planned", "assigned", "picked_up", "in_transit", "delivered", "canceled", "open", "closed"}
 
 @router.patch("/{donation_id}/status")
-def update_status(
+async def update_status(
     donation_id: str,
     status_q: str = Query(..., alias="status"),
-    db: Database = Depends(get_db),
+    db: AsyncIOMotorDatabase = Depends(get_db),
 ):
     if status_q not in ValidStatus:
         raise HTTPException(status_code=400, detail=f"Invalid status. Allowed: {sorted(ValidStatus)}")
@@ -140,9 +185,10 @@ def update_status(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid donation_id")
 
-    c = col(db)
-    res = c.update_one({"_id": _id}, {"$set": {"status": status_q}})
-    if res.matched_count == 0:
+    doc = await col(db).find_one_and_update(
+        {"_id": _id}, {"$set": {"status": status_q}}, return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
         raise HTTPException(status_code=404, detail="Donation not found")
-    doc = c.find_one({"_id": _id})
+    await versions.bump(db, "donations")
     return {"ok": True, "donation": _serialize(doc)}
@@ -1,9 +1,10 @@
 # app/api/drivers.py
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from typing import Optional, List, Literal
 from pydantic import BaseModel
 from bson import ObjectId
-from app.db import donations_col, drivers_col   # we’ll use your db helper
+from app.db import donations_col, drivers_col, get_db   # we’ll use your db helper
+from app.services import versions
 
 router = APIRouter(prefix="/drivers", tags=["drivers"])
 
@@ -13,6 +14,12 @@ class DriverIn(BaseModel):
     contact: str
     vehicle: str
     availability: bool = True
+    # Optional overrides of the vehicle-type profile used for route packing
+    capacity_kg: Optional[float] = None
+    volume_l: Optional[float] = None
+    cold_slots: Optional[int] = None
+    # Hub the driver starts from when planning with several depots
+    depot_id: Optional[str] = None
 
 class DriverOut(DriverIn):
     id: str
@@ -24,12 +31,20 @@ def to_out(doc) -> DriverOut:
         name=doc["name"],
         contact=doc["contact"],
         vehicle=doc["vehicle"],
-        availability=doc.get("availability", True)
+        availability=doc.get("availability", True),
+        capacity_kg=doc.get("capacity_kg"),
+        volume_l=doc.get("volume_l"),
+        cold_slots=doc.get("cold_slots"),
+        depot_id=doc.get("depot_id"),
     )
 
 # ---------- Routes ----------
 @router.get("/", response_model=List[DriverOut])
-async def list_drivers(available: Optional[bool] = Query(None)):
+async def list_drivers(request: Request, response: Response, available: Optional[bool] = Query(None)):
+    # 304 when the client's ETag is still current
+    not_modified = await versions.check(request, response, get_db(), "drivers")
+    if not_modified is not None:
+        return not_modified
     query = {}
     if available is not None:
         query["availability"] = available
@@ -39,6 +54,7 @@ async def list_drivers(available: Optional[bool] = Query(None)):
 @router.post("/", response_model=DriverOut)
 async def add_driver(driver: DriverIn):
     res = await drivers_col().insert_one(driver.dict())
+    await versions.bump(get_db(), "drivers")
     doc = await drivers_col().find_one({"_id": res.inserted_id})
     return to_out(doc)
 
@@ -52,6 +68,7 @@ async def set_availability(driver_id: str, available: bool):
     res = await drivers_col().update_one({"_id": _id}, {"$set": {"availability": available}})
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Driver not found")
+    await versions.bump(get_db(), "drivers")
     return {"updated": True}
 
 @router.delete("/{driver_id}")
@@ -64,6 +81,7 @@ async def delete_driver(driver_id: str):
     res = await drivers_col().delete_one({"_id": _id})
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Driver not found")
+    await versions.bump(get_db(), "drivers")
     return {"deleted": True}
 
 @router.patch("/{donation_id}/assign_driver")
@@ -91,6 +109,7 @@ async def assign_driver(donation_id: str, driver_id: str):
 
     # mark driver unavailable
     await drivers_col().update_one({"_id": _drv_id}, {"$set": {"availability": False}})
+    await versions.bump(get_db(), "donations", "drivers")
 
     return {"assigned": True, "driver": driver["name"]}
 
@@ -121,5 +140,6 @@ async def update_status(donation_id: str, status: ValidStatus):
             await drivers_col().update_one({"_id": _drv_id}, {"$set": {"availability": True}})
         except Exception:
             pass
+    await versions.bump(get_db(), "donations", "drivers")
 
     return {"updated": True, "status": status}
\ No newline at end of file
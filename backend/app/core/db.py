@@ -1,14 +1,6 @@
 # app/core/db.py
-from motor.motor_asyncio import AsyncIOMotorClient
-from functools import lru_cache
-import os
+# Back-compat names; the clients themselves come from app/core/mongo.py
+from app.core.mongo import MONGODB_URI as MONGO_URI, MONGODB_DB as DB_NAME, get_client, get_db
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "foodbridge")
-
-@lru_cache
-def get_client() -> AsyncIOMotorClient:
-    return AsyncIOMotorClient(MONGO_URI, uuidRepresentation="standard")
-
-def get_db():
-    return get_client()[DB_NAME]
+# module-level handle used by security/events/middleware/scripts
+db = get_db()
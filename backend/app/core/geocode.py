@@ -1,63 +1,278 @@
 # app/core/geocode.py
 from __future__ import annotations
+import asyncio
 import os
+import time
 import httpx
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.geocode_cache import geocode_cache, NotFound
+from app.services.gazetteer import gazetteer_loaded, get_gazetteer
+from app.services.provider_health import provider_health
 
-# Choose provider via env:
-# GEOCODER = nominatim | opencage | google
+# Choose provider via env, or a fallthrough chain tried left to right:
+# GEOCODER = nominatim | opencage | google | local | cache,
+# e.g. "local,cache,nominatim,opencage"
+# ("local" is the offline gazetteer, see services/gazetteer.py; "cache" marks
+# where the geocode cache is consulted, by default right after any leading
+# "local"). Only "local" may come before the cache: remote answers are what
+# the cache stores. Remote providers get a circuit breaker each, and async
+# lookups hedge: if a provider is slower than its p95 the next one is asked
+# too, and the first answer wins (see services/provider_health.py).
 GEOCODER = os.getenv("GEOCODER", "nominatim").lower()
+PROVIDERS = [p.strip() for p in GEOCODER.split(",") if p.strip()] or ["nominatim"]
+
+# Endpoints (overridable, e.g. a self-hosted Nominatim or a local stand-in)
+NOMINATIM_URL = os.getenv("NOMINATIM_URL") or "https://nominatim.openstreetmap.org/search"
+OPENCAGE_URL = os.getenv("OPENCAGE_URL") or "https://api.opencagedata.com/geocode/v1/json"
+GOOGLE_GEOCODE_URL = os.getenv("GOOGLE_GEOCODE_URL") or "https://maps.googleapis.com/maps/api/geocode/json"
 
 # Optional keys
 OPENCAGE_KEY = os.getenv("OPENCAGE_KEY")
 GOOGLE_MAPS_KEY = os.getenv("GOOGLE_MAPS_KEY")
 
 # Global timeout
-_CLIENT = httpx.Client(timeout=12)
+_TIMEOUT = 12
+_CLIENT = httpx.Client(timeout=_TIMEOUT)
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
 
 class GeocodeError(Exception):
     pass
 
-def geocode_address(address: str) -> Tuple[float, float]:
-    """
-    Returns (lat, lng). Raises GeocodeError on failure.
-    """
-    a = (address or "").strip()
-    if not a:
-        raise GeocodeError("Empty address")
+class NoResults(GeocodeError, NotFound):
+    """The provider answered but found nothing (cached as a negative result)."""
 
-    if GEOCODER == "opencage":
+# ---------- Provider definitions (shared by the sync and async paths)
+def _request(a: str, provider: str) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    """(url, params, headers) for a remote provider."""
+    if provider == "opencage":
         if not OPENCAGE_KEY:
             raise GeocodeError("OPENCAGE_KEY not set")
-        url = "https://api.opencagedata.com/geocode/v1/json"
-        r = _CLIENT.get(url, params={"q": a, "key": OPENCAGE_KEY, "limit": 1})
-        r.raise_for_status()
-        js = r.json()
-        if not js.get("results"):
-            raise GeocodeError("No results")
-        g = js["results"][0]["geometry"]
-        return float(g["lat"]), float(g["lng"])
+        return OPENCAGE_URL, {"q": a, "key": OPENCAGE_KEY, "limit": 1}, {}
 
-    if GEOCODER == "google":
+    if provider == "google":
         if not GOOGLE_MAPS_KEY:
             raise GeocodeError("GOOGLE_MAPS_KEY not set")
-        url = "https://maps.googleapis.com/maps/api/geocode/json"
-        r = _CLIENT.get(url, params={"address": a, "key": GOOGLE_MAPS_KEY})
-        r.raise_for_status()
-        js = r.json()
-        if not js.get("results"):
-            raise GeocodeError("No results")
-        loc = js["results"][0]["geometry"]["location"]
-        return float(loc["lat"]), float(loc["lng"])
+        return GOOGLE_GEOCODE_URL, {"address": a, "key": GOOGLE_MAPS_KEY}, {}
 
     # Default: Nominatim (no key). Respect their policy: include a UA + email if possible.
     headers = {
         "User-Agent": f"FoodBridge/1.0 (+{os.getenv('ADMIN_CONTACT','mailto:admin@example.com')})"
     }
-    url = "https://nominatim.openstreetmap.org/search"
-    r = _CLIENT.get(url, params={"q": a, "format": "json", "limit": 1}, headers=headers)
-    r.raise_for_status()
-    js = r.json()
+    return NOMINATIM_URL, {"q": a, "format": "json", "limit": 1}, headers
+
+def _parse(js: Any, provider: str) -> Tuple[float, float]:
+    """(lat, lng) from the provider's JSON; NoResults when it found nothing."""
+    if provider == "opencage":
+        if not js.get("results"):
+            raise NoResults("No results")
+        g = js["results"][0]["geometry"]
+        return float(g["lat"]), float(g["lng"])
+
+    if provider == "google":
+        if not js.get("results"):
+            raise NoResults("No results")
+        loc = js["results"][0]["geometry"]["location"]
+        return float(loc["lat"]), float(loc["lng"])
+
     if not js:
-        raise GeocodeError("No results")
+        raise NoResults("No results")
     return float(js[0]["lat"]), float(js[0]["lon"])
+
+def _local(a: str) -> Tuple[float, float]:
+    gz = get_gazetteer()
+    hit = gz.lookup(a) if gz is not None else None
+    if hit is None:
+        raise NoResults("No results")
+    return hit
+
+async def _alocal(a: str) -> Tuple[float, float]:
+    """_local() for async code: a gazetteer still loading is awaited in a thread, not built on the loop."""
+    if not gazetteer_loaded():
+        await asyncio.to_thread(get_gazetteer)
+    return _local(a)
+
+def _split() -> Tuple[List[str], List[str]]:
+    """(providers before the cache, providers behind it)."""
+    if "cache" in PROVIDERS:
+        i = PROVIDERS.index("cache")
+        before, after = PROVIDERS[:i], PROVIDERS[i + 1:]
+    else:
+        i = 0
+        while i < len(PROVIDERS) and PROVIDERS[i] == "local":
+            i += 1
+        before, after = PROVIDERS[:i], PROVIDERS[i:]
+    # anything remote placed before the cache is moved behind it
+    return [p for p in before if p == "local"], [p for p in before if p != "local"] + after
+
+def local_first(a: str) -> Optional[Tuple[float, float]]:
+    """
+    Gazetteer answer when "local" comes before the cache in the chain, else None.
+    Checked before the geocode cache: it is in memory and needs no Mongo round trip.
+    """
+    if not _split()[0]:
+        return None
+    try:
+        return _local(a)
+    except NoResults:
+        return None
+
+async def alocal_first(a: str) -> Optional[Tuple[float, float]]:
+    """local_first() for async code (see _alocal)."""
+    if not _split()[0]:
+        return None
+    try:
+        return await _alocal(a)
+    except NoResults:
+        return None
+
+def _unavailable(skipped: List[str]) -> GeocodeError:
+    return GeocodeError(f"geocoding providers unavailable (circuit open: {', '.join(skipped)})")
+
+def _lookup(a: str) -> Tuple[float, float]:
+    """
+    Blocking provider calls for a non-empty address: the chain behind the
+    cache, in order, skipping providers whose circuit is open (no hedging;
+    sync callers only geocode from the threadpool). NoResults only when
+    every provider answered "nothing"; if one of them failed instead, its
+    error is raised (and not cached as a negative).
+    """
+    error: Optional[Exception] = None
+    skipped: List[str] = []
+    for p in _split()[1]:
+        if p == "local":
+            try:
+                return _local(a)
+            except NoResults:
+                continue
+        health = provider_health(p)
+        if not health.allow():
+            skipped.append(p)
+            continue
+        t0 = time.monotonic()
+        try:
+            url, params, headers = _request(a, p)
+            r = _CLIENT.get(url, params=params, headers=headers)
+            r.raise_for_status()
+            hit = _parse(r.json(), p)
+        except NoResults:
+            health.success(time.monotonic() - t0)
+            continue
+        except Exception as ex:
+            health.failure()
+            error = error or ex
+            continue
+        health.success(time.monotonic() - t0)
+        return hit
+    if error is None and skipped:
+        error = _unavailable(skipped)
+    raise error or NoResults("No results")
+
+def _async_client() -> httpx.AsyncClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(timeout=_TIMEOUT)
+    return _ASYNC_CLIENT
+
+async def _acall(a: str, p: str, client: httpx.AsyncClient) -> Tuple[float, float]:
+    """One remote provider call, reported to its breaker."""
+    health = provider_health(p)
+    t0 = time.monotonic()
+    try:
+        url, params, headers = _request(a, p)
+        r = await client.get(url, params=params, headers=headers)
+        r.raise_for_status()
+        hit = _parse(r.json(), p)
+    except NoResults:
+        health.success(time.monotonic() - t0)
+        raise
+    except asyncio.CancelledError:
+        health.release()  # another provider answered first
+        raise
+    except Exception:
+        health.failure()
+        raise
+    health.success(time.monotonic() - t0)
+    return hit
+
+async def _alookup(a: str, client: Optional[httpx.AsyncClient] = None) -> Tuple[float, float]:
+    """
+    _lookup without blocking the event loop, and hedged: when the provider
+    in flight hasn't answered within its p95 latency the next one in the
+    chain is started too, and the first answer wins. A failure or "nothing"
+    moves on to the next provider right away.
+    """
+    client = client or _async_client()
+    queue = list(_split()[1])
+    inflight: Dict[asyncio.Task, str] = {}
+    error: Optional[Exception] = None
+    skipped: List[str] = []
+
+    def launch() -> Optional[str]:
+        while queue:
+            p = queue.pop(0)
+            if p == "local" or provider_health(p).allow():
+                inflight[asyncio.ensure_future(_alocal(a) if p == "local" else _acall(a, p, client))] = p
+                return p
+            skipped.append(p)
+        return None
+
+    last = launch()
+    try:
+        while inflight:
+            delay = provider_health(last).hedge_delay() if queue and last not in (None, "local") else None
+            done, _ = await asyncio.wait(inflight, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                provider_health(last).hedged()
+                last = launch() or last
+                continue
+            for t in done:
+                inflight.pop(t)
+                try:
+                    return t.result()
+                except NoResults:
+                    pass
+                except Exception as ex:
+                    error = error or ex
+            if not inflight:
+                last = launch()
+    finally:
+        for t in inflight:
+            if not t.done():
+                t.cancel()
+            elif not t.cancelled():
+                t.exception()  # finished alongside the winner; mark its error as seen
+    if error is None and skipped:
+        error = _unavailable(skipped)
+    raise error or NoResults("No results")
+
+async def aclose() -> None:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+        _ASYNC_CLIENT = None
+
+# ---------- Public API
+def geocode_address(address: str) -> Tuple[float, float]:
+    """
+    Returns (lat, lng). Raises GeocodeError on failure.
+    Repeat addresses are answered from the geocode cache (see services/geocode_cache.py).
+    Blocking: only for sync code (e.g. `def` endpoints, which FastAPI runs in its
+    threadpool); async code uses geocode_address_async.
+    """
+    a = (address or "").strip()
+    if not a:
+        raise GeocodeError("Empty address")
+    hit = local_first(a) or geocode_cache.lookup(a, _lookup)
+    if hit is None:
+        raise NoResults("No results")
+    return hit
+
+async def geocode_address_async(address: str) -> Tuple[float, float]:
+    """Async geocode_address: same provider and cache, the event loop keeps running."""
+    a = (address or "").strip()
+    if not a:
+        raise GeocodeError("Empty address")
+    hit = await alocal_first(a) or await geocode_cache.alookup(a, _alookup)
+    if hit is None:
+        raise NoResults("No results")
+    return hit
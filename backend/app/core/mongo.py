@@ -0,0 +1,219 @@
+# app/core/mongo.py
+"""
+The one place MongoDB clients are made.
+
+Every module gets its handles from here: get_db() (Motor, async code),
+get_sync_db() (pymongo, sync `def` endpoints run in the threadpool). Both
+clients are created lazily, once per process, with the same settings:
+
+    MONGODB_URI                          (legacy: MONGO_URI, MONGO_URL)
+    MONGODB_DB                           (legacy: DB_NAME; else the URI path; else foodbridge)
+    MONGO_MAX_POOL_SIZE / MIN_POOL_SIZE  connections per server, per client
+    MONGO_MAX_IDLE_MS                    close pooled connections idle this long
+    MONGO_WAIT_QUEUE_TIMEOUT_MS          max wait for a free connection (0 = driver default)
+    MONGO_CONNECT_TIMEOUT_MS / MONGO_SOCKET_TIMEOUT_MS / MONGO_SERVER_SELECTION_TIMEOUT_MS
+    MONGO_READ_PREFERENCE                primary | primaryPreferred | secondaryPreferred | ...
+    MONGO_COMPRESSORS                    e.g. zstd,snappy,zlib (default: whichever are installed)
+
+Each client registers a pool listener, so pool_stats() can report per pool
+(client × server): connections open and checked out, checkouts, failed
+checkouts, and how long requests waited for a connection.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+
+MONGODB_URI = (os.getenv("MONGODB_URI") or os.getenv("MONGO_URI") or os.getenv("MONGO_URL")
+               or "mongodb://127.0.0.1:27017")
+
+
+def _db_name() -> str:
+    name = os.getenv("MONGODB_DB") or os.getenv("DB_NAME")
+    if name:
+        return name
+    path = urlparse(MONGODB_URI).path.strip("/")  # mongodb://host/foodbridge
+    return path.split("/")[0] if path else "foodbridge"
+
+
+MONGODB_DB = _db_name()
+
+
+def _default_compressors() -> str:
+    have = [c for c, mod in (("zstd", "zstandard"), ("snappy", "snappy")) if importlib.util.find_spec(mod)]
+    return ",".join(have + ["zlib"])
+
+
+def client_options() -> Dict[str, Any]:
+    """Keyword options shared by the async and sync clients."""
+    opts: Dict[str, Any] = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "300000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "readPreference": os.getenv("MONGO_READ_PREFERENCE", "primary"),
+        "compressors": os.getenv("MONGO_COMPRESSORS") or _default_compressors(),
+        "uuidRepresentation": "standard",
+        "appname": os.getenv("MONGO_APPNAME", "foodbridge-api"),
+    }
+    socket_ms = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+    if socket_ms:
+        opts["socketTimeoutMS"] = socket_ms
+    wait_ms = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
+    if wait_ms:
+        opts["waitQueueTimeoutMS"] = wait_ms
+    return opts
+
+
+# --------------------------------------------------
+# Pool metrics
+# --------------------------------------------------
+class _Pool:
+    def __init__(self) -> None:
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.cleared = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.waits: "deque[float]" = deque(maxlen=1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = np.fromiter(self.waits, dtype=np.float64) if self.waits else None
+        return {
+            "open": self.open, "checked_out": self.checked_out, "max_checked_out": self.max_checked_out,
+            "checkouts": self.checkouts, "checkout_failures": dict(self.checkout_failures),
+            "cleared": self.cleared,
+            "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else None,
+            "wait_ms_p95": round(float(np.percentile(waits, 95)), 3) if waits is not None else None,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+        }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool events of one client, aggregated per server address."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self._pools: Dict[Tuple[str, int], _Pool] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, address) -> _Pool:
+        p = self._pools.get(address)
+        if p is None:
+            p = self._pools[address] = _Pool()
+        return p
+
+    def _wait(self, p: _Pool, event) -> None:
+        d = getattr(event, "duration", None)  # seconds, pymongo >= 4.7
+        if d is not None:
+            ms = d * 1000.0
+            p.wait_ms_total += ms
+            p.wait_ms_max = max(p.wait_ms_max, ms)
+            p.waits.append(ms)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address).open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            p = self._pool(event.address)
+            p.open = max(0, p.open - 1)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            p = self._pool(event.address)
+            p.checkouts += 1
+            p.checked_out += 1
+            p.max_checked_out = max(p.max_checked_out, p.checked_out)
+            self._wait(p, event)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            p = self._pool(event.address)
+            p.checked_out = max(0, p.checked_out - 1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            p = self._pool(event.address)
+            reason = str(event.reason)
+            p.checkout_failures[reason] = p.checkout_failures.get(reason, 0) + 1
+            self._wait(p, event)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address).cleared += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(event.address, None)
+
+    # events we don't aggregate
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"client": self.label, "server": f"{a[0]}:{a[1]}", **p.snapshot()}
+                    for a, p in self._pools.items()]
+
+
+_metrics = {"async": PoolMetrics("async"), "sync": PoolMetrics("sync")}
+
+
+# --------------------------------------------------
+# Clients
+# --------------------------------------------------
+@lru_cache(maxsize=1)
+def get_client() -> AsyncIOMotorClient:
+    # Cached to play nicely with uvicorn --reload
+    return AsyncIOMotorClient(MONGODB_URI, event_listeners=[_metrics["async"]], **client_options())
+
+
+@lru_cache(maxsize=1)
+def get_sync_client() -> MongoClient:
+    return MongoClient(MONGODB_URI, event_listeners=[_metrics["sync"]], **client_options())
+
+
+def get_db():
+    return get_client()[MONGODB_DB]
+
+
+def get_sync_db():
+    return get_sync_client()[MONGODB_DB]
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Pool metrics of every client created so far, plus the effective settings."""
+    opts = client_options()
+    return {
+        "db": MONGODB_DB,
+        "settings": {k: opts[k] for k in ("maxPoolSize", "minPoolSize", "maxIdleTimeMS", "readPreference", "compressors")}
+                    | {"waitQueueTimeoutMS": opts.get("waitQueueTimeoutMS")},
+        "pools": [row for m in _metrics.values() for row in m.snapshot()],
+    }
+
+
+def close() -> None:
+    """Close whichever clients exist (app shutdown)."""
+    if get_client.cache_info().currsize:
+        get_client().close()
+        get_client.cache_clear()
+    if get_sync_client.cache_info().currsize:
+        get_sync_client().close()
+        get_sync_client.cache_clear()
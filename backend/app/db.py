@@ -1,28 +1,65 @@
 # app/db.py
 from __future__ import annotations
 
-import os
 import itertools
 from datetime import datetime
-from typing import Dict, List, Iterable, Union
-from functools import lru_cache
+from typing import Dict, List, Iterable, Optional, Union
+from contextlib import asynccontextmanager
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 
 # --------------------------------------------------
-# MongoDB Connection (env with safe defaults)
+# MongoDB Connection: clients, pool settings and env live in app/core/mongo.py
 # --------------------------------------------------
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://127.0.0.1:27017")
-MONGODB_DB  = os.getenv("MONGODB_DB", "foodbridge")  # single source of truth
+from app.core.mongo import MONGODB_URI, MONGODB_DB, get_client, get_db, get_sync_db
+from app.services.versions import bump
 
-@lru_cache(maxsize=1)
-def get_client() -> AsyncIOMotorClient:
-    # Cached to play nicely with uvicorn --reload
-    return AsyncIOMotorClient(MONGODB_URI)
+# --------------------------------------------------
+# Transactions (replica set / mongos only; standalone falls back)
+# --------------------------------------------------
+_txn_support: Dict[int, bool] = {}
 
-def get_db():
-    return get_client()[MONGODB_DB]
+async def supports_transactions(client: AsyncIOMotorClient) -> bool:
+    """True when the deployment is a replica set or sharded cluster (checked once per client)."""
+    key = id(client)
+    if key not in _txn_support:
+        try:
+            hello = await client.admin.command("hello")
+            _txn_support[key] = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+        except Exception:
+            _txn_support[key] = False
+    return _txn_support[key]
+
+_client_bulk_support: Dict[int, bool] = {}
+_CLIENT_BULK_WIRE = 25  # MongoDB 8.0
+
+async def supports_client_bulk_write(client: AsyncIOMotorClient) -> bool:
+    """True when one client.bulk_write can span collections (MongoDB 8.0+; checked once per client)."""
+    key = id(client)
+    if key not in _client_bulk_support:
+        try:
+            hello = await client.admin.command("hello")
+            _client_bulk_support[key] = (hasattr(client, "bulk_write")
+                                         and int(hello.get("maxWireVersion", 0)) >= _CLIENT_BULK_WIRE)
+        except Exception:
+            _client_bulk_support[key] = False
+    return _client_bulk_support[key]
+
+@asynccontextmanager
+async def transaction(client: AsyncIOMotorClient | None = None):
+    """
+    Yield a session with an open transaction, or None when the server can't do
+    transactions. Pass the result as session=... to every write; None is a no-op.
+    The transaction commits when the block exits and aborts on an exception.
+    """
+    client = client or get_client()
+    if not await supports_transactions(client):
+        yield None
+        return
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            yield session
 
 # --------------------------------------------------
 # Collections (helpers; no work at import time)
@@ -70,6 +107,7 @@ async def insert_donation(doc: Dict) -> Dict:
     doc.setdefault("created_at", datetime.utcnow())
 
     res = await donations_col().insert_one(doc)
+    await bump(get_db(), "donations")
     doc["_id"] = str(res.inserted_id)
     return doc
 
@@ -92,13 +130,14 @@ async def insert_request(doc: Dict) -> Dict:
     doc.setdefault("created_at", datetime.utcnow())
 
     res = await requests_col().insert_one(doc)
+    await bump(get_db(), "requests")
     doc["_id"] = str(res.inserted_id)
     return doc
 
-async def list_requests() -> List[Dict]:
-    """List all requests (most recent first)."""
+async def list_requests(filt: Optional[Dict] = None, projection: Optional[Dict] = None) -> List[Dict]:
+    """List all (matching) requests, most recent first. Paged listings use app.services.listing."""
     items: List[Dict] = []
-    cur = requests_col().find().sort("created_at", -1)
+    cur = requests_col().find(filt or {}, projection).sort([("created_at", -1), ("_id", -1)])
     async for r in cur:
         r["id"] = str(r.pop("_id"))
         items.append(r)
@@ -177,6 +216,7 @@ async def decrement_donation_items(donation_id: str, items: List[Dict]) -> None:
         {"_id": _oid},
         {"$set": {"items": new_items, "status": new_status}}
     )
+    await bump(get_db(), "donations")
 
 # --- Back-compat lazy collection shims (avoid import-time DB work) ---
 class _LazyCol:
@@ -199,6 +239,9 @@ drivers_collection   = _LazyCol("drivers")  # future-proof
 __all__ = [
     "get_client",
     "get_db",
+    "get_sync_db",
+    "supports_transactions",
+    "transaction",
     # collection helpers
     "users_col",
     "donors_col",
@@ -5,12 +5,9 @@ load_dotenv()
 USE_MONGO = os.getenv("USE_MONGO", "0") == "1"
 
 if USE_MONGO:
-    from motor.motor_asyncio import AsyncIOMotorClient
+    from .core.mongo import get_db
     from .repos.mongo import MongoRepo
-    MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-    DB_NAME = os.getenv("DB_NAME", "foodbridge")
-    _client = AsyncIOMotorClient(MONGO_URI)
-    _db = _client[DB_NAME]
+    _db = get_db()
     _repo_singleton = MongoRepo(_db)
 else:
     from .repos.inmemory import InMemoryRepo
@@ -1,12 +1,18 @@
 # app/main.py
+import asyncio
+import logging
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import ASCENDING, GEOSPHERE
+from pymongo import ASCENDING, DESCENDING
 
 # ---- Async Motor DB (used for indexes/backfill and other async routers)
-from app.db import get_client
 from app.db import get_db as mongo_get_db  # Motor-async DB
+from app.services.batch_opt import shutdown_pool
+from app.core.geocode import PROVIDERS as GEOCODE_PROVIDERS, aclose as geocode_aclose
+from app.services.gazetteer import aget_gazetteer
+from app.services import geocode_worker, geo_backfill
 
 # ---- Existing routers
 from app.api import auth
@@ -26,23 +32,22 @@ try:
 except Exception:
     HAS_OPTIMIZE = False
 
+# (Optional) capacity/distance-aware planner at /routes/plan
+try:
+    from app.routers import route_planning as route_planning_router
+    HAS_ROUTE_PLANNING = True
+except Exception:
+    HAS_ROUTE_PLANNING = False
+
 # ======================================================================
-# Donations API uses sync PyMongo under /api/donations
+# Donations API (Motor, async) under /api/donations
 # Key point: import BOTH the module and the ORIGINAL dependency function.
 # ======================================================================
-import os
-from pymongo import MongoClient
 import app.api.donations as donations_api                    # router lives here
 from app.api.donations import get_db as donations_dep_func   # ORIGINAL placeholder func object
+from app.core import mongo
 
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-MONGODB_DB  = os.getenv("MONGODB_DB", "foodbridge")
-
-_sync_client = MongoClient(MONGODB_URI)
-
-def get_db_sync():
-    """Return a sync (pymongo) Database for donations endpoints."""
-    return _sync_client[MONGODB_DB]
+log = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -55,64 +60,43 @@ async def lifespan(app: FastAPI):
             return
         await col.create_index(keys, name=name, **kwargs)
 
-    async def backfill_geo(col):
-        cursor = col.find({
-            "$or": [
-                {"geo": {"$exists": False}},
-                {"geo.type": {"$ne": "Point"}},
-                {"geo.coordinates": {"$not": {"$type": "array"}}},
-            ]
-        })
-        async for doc in cursor:
-            loc = doc.get("location") or {}
-            lat = loc.get("lat"); lng = loc.get("lng")
-            def valid(x, y):
-                try:
-                    x = float(x); y = float(y)
-                    return not (x == 0.0 and y == 0.0)
-                except Exception:
-                    return False
-
-            if valid(lat, lng):
-                geo = {"type": "Point", "coordinates": [float(lng), float(lat)]}
-                await col.update_one({"_id": doc["_id"]}, {"$set": {"geo": geo}})
-            else:
-                # try geocoding if address exists
-                addr = (doc.get("address") or "").strip()
-                if addr:
-                    from app.core.geocode import geocode_address, GeocodeError
-                    try:
-                        glat, glng = geocode_address(addr)
-                        await col.update_one({"_id": doc["_id"]}, {
-                            "$set": {
-                                "location": {"lat": float(glat), "lng": float(glng)},
-                                "geo": {"type": "Point", "coordinates": [float(glng), float(glat)]},
-                            },
-                            "$unset": {"_geocode_error": ""}
-                        })
-                    except GeocodeError as ex:
-                        await col.update_one({"_id": doc["_id"]}, {
-                            "$unset": {"geo": ""},
-                            "$set": {"_geocode_error": str(ex)}
-                        })
-                else:
-                    # no address; ensure we don't leave a bogus geo
-                    await col.update_one({"_id": doc["_id"]}, {"$unset": {"geo": ""}})
-
-
-    # Backfill legacy docs first (so 2dsphere can build)
-    await backfill_geo(db.donations)
-    await backfill_geo(db.requests)
-
     # Indexes
     await ensure_index(db.donations, [("status", ASCENDING)], "status_1")
     await ensure_index(db.donations, [("expires", ASCENDING)], "expires_1", sparse=True)
-    await ensure_index(db.donations, [("geo", GEOSPHERE)], "geo_2dsphere")
-    await ensure_index(db.requests,  [("geo", GEOSPHERE)], "geo_2dsphere")
     await ensure_index(db.transfers, [("timestamp", ASCENDING)], "timestamp_1")
+    await ensure_index(db.route_geometry, [("route_id", ASCENDING)], "route_id_1", unique=True)
+    await ensure_index(db.geocode_cache, [("expires_at", ASCENDING)], "expires_at_ttl", expireAfterSeconds=0)
+    await ensure_index(db.geocode_jobs, [("status", ASCENDING), ("next_at", ASCENDING)], "status_1_next_at_1")
+    # Keyset-paged listings (app/services/listing.py): newest first, optionally by status / donor / ngo
+    newest = [("created_at", DESCENDING), ("_id", DESCENDING)]
+    for c, owner in ((db.donations, "donor_name"), (db.requests, "ngo_name")):
+        await ensure_index(c, newest, "created_at_-1__id_-1")
+        await ensure_index(c, [("status", ASCENDING)] + newest, "status_1_created_at_-1__id_-1")
+        await ensure_index(c, [(owner, ASCENDING)] + newest, f"{owner}_1_created_at_-1__id_-1")
+
+    # Build the offline gazetteer index in a thread, not inside the first lookup
+    async def warm_gazetteer():
+        try:
+            await aget_gazetteer()
+        except Exception:
+            log.exception("offline gazetteer build failed; 'local' geocoding is unavailable")
+
+    warm = asyncio.create_task(warm_gazetteer()) if "local" in GEOCODE_PROVIDERS else None
+
+    # Deferred geocoding for documents created with only an address
+    geocode_worker.start(db)
+    # Legacy location/geo repair (resumable, in the background; builds the
+    # geo_2dsphere indexes once each collection is clean)
+    geo_backfill.start(db)
 
     yield
-    get_client().close()
+    if warm is not None:
+        warm.cancel()
+    await geo_backfill.stop()
+    await geocode_worker.stop()
+    shutdown_pool()
+    await geocode_aclose()
+    mongo.close()
 
 
 # --- Create app FIRST ---
@@ -120,7 +104,7 @@ app = FastAPI(lifespan=lifespan, title="FoodBridge API")
 
 # CRUCIAL: override the ORIGINAL dependency callable used in Depends(...)
 # Don't override donations_api.get_db (that may be a different function object).
-app.dependency_overrides[donations_dep_func] = get_db_sync
+app.dependency_overrides[donations_dep_func] = mongo.get_db
 
 # CORS
 app.add_middleware(
@@ -146,13 +130,19 @@ app.include_router(admin_fix_router.router)
 app.include_router(reports_router.router)       # /reports
 if HAS_OPTIMIZE:
     app.include_router(optimize_router.router)  # /optimize
+if HAS_ROUTE_PLANNING:
+    app.include_router(route_planning_router.router)  # /routes/plan
 
 # ---------- Compatibility shims (OLD paths) ----------
 from app.db import insert_request as _ins_req, list_requests as _list_req
 
 @app.post("/requests", status_code=201)
 async def _compat_create_request(body: dict):
+    pending = geocode_worker.pending_fields(body)
     created = await _ins_req(body)
+    if pending:
+        from bson import ObjectId
+        await geocode_worker.enqueue(mongo_get_db(), "requests", ObjectId(created["_id"]), body["address"])
     return {
         "request": {
             "id": created.get("id"),
@@ -173,3 +163,14 @@ async def _compat_get_requests():
 @app.get("/health")
 def health():
     return {"ok": True}
+
+@app.get("/health/db")
+async def health_db():
+    """Ping latency plus connection pool metrics (checked out, waits) per client and server."""
+    t0 = time.perf_counter()
+    try:
+        await mongo.get_client().admin.command("ping")
+        ping = {"ok": True, "ping_ms": round((time.perf_counter() - t0) * 1000, 2)}
+    except Exception as e:
+        ping = {"ok": False, "error": str(e)}
+    return {**ping, **mongo.pool_stats()}
@@ -1,38 +1,51 @@
 # app/routers/admin_fix.py
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from app.db import get_db
-from app.services.geo_enrich import ensure_location_and_geo
+from app.services.geocode_cache import geocode_cache
+from app.services.provider_health import health_stats
+from app.services import geo_backfill, geo_repair
+from app.services.ndjson import MEDIA_TYPE as NDJSON, ndjson_line
 
 router = APIRouter(prefix="/admin/fix", tags=["admin"])
 
 @router.post("/geos")
 async def fix_geos():
-    db = get_db()
-    fixed = {"donations": 0, "requests": 0}
+    """Repair missing/bogus geo on donations and requests (bulk, see services/geo_repair.py)."""
+    summary = {}
+    async for event in geo_repair.repair(get_db()):
+        summary = event
+    return {"fixed": summary["fixed"], "collections": summary["collections"],
+            "distinct_addresses": summary["distinct_addresses"], "elapsed_ms": summary["elapsed_ms"]}
+
+@router.post("/geos/stream")
+async def fix_geos_stream():
+    """
+    Same repair, streamed as NDJSON: a {"type": "progress", ...} line after
+    every chunk, then {"type": "summary", ...} (or {"type": "error", ...}).
+    """
+    async def lines():
+        try:
+            async for event in geo_repair.repair(get_db()):
+                yield ndjson_line(event)
+        except Exception as e:  # headers are already sent; report in-band
+            yield ndjson_line({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(lines(), media_type=NDJSON)
 
-    async def fix_col(col_name):
-        count = 0
-        col = getattr(db, col_name)
-        # candidates: geo missing or equals [0,0]
-        cur = col.find({
-            "$or": [
-                {"geo": {"$exists": False}},
-                {"geo.coordinates": [0,0]}
-            ]
-        })
-        async for doc in cur:
-            new_doc = ensure_location_and_geo(doc.copy())
-            if new_doc.get("geo") and new_doc.get("location"):
-                await col.update_one({"_id": doc["_id"]}, {
-                    "$set": {
-                        "location": new_doc["location"],
-                        "geo": new_doc["geo"]
-                    },
-                    "$unset": {"_geocode_error": ""}
-                })
-                count += 1
-        return count
+@router.get("/geocode/stats")
+async def geocode_stats():
+    """Hit/miss counters of the geocode cache and provider health (breakers, p95) in this process."""
+    return {**geocode_cache.stats(), "providers": health_stats()}
 
-    fixed["donations"] = await fix_col("donations")
-    fixed["requests"]  = await fix_col("requests")
-    return {"fixed": fixed}
+@router.get("/geo_backfill")
+async def geo_backfill_progress():
+    """Checkpoint and remaining count of the background geo backfill, per collection."""
+    return await geo_backfill.progress(get_db())
+
+@router.post("/geo_backfill/restart")
+async def geo_backfill_restart():
+    """Drop the checkpoints and run the backfill over both collections again."""
+    db = get_db()
+    await geo_backfill.restart(db)
+    return await geo_backfill.progress(db)
@@ -1,11 +1,14 @@
 # app/routers/dispatch.py
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Body
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime, timezone
 from typing import Any, Iterable
 
-from app.db import get_db
+from pymongo import UpdateMany, UpdateOne
+from app.db import get_db, supports_client_bulk_write, transaction
+from app.services import versions
 
 router = APIRouter(prefix="/api/dispatch", tags=["dispatch"])
 
@@ -45,7 +48,8 @@ async def start_route(
 ):
     q = _id_filter(rid)
     upd = {
-        "$set": {"status": "in_progress", "started_at": _utcnow()},
+        "$set": {"status": "in_progress", "started_at": _utcnow(), "current_step": 0},
+        "$inc": {"rev": 1},
         "$push": {"events": {"ts": _utcnow(), "type": "start"}},
     }
     res = await db.routes.update_one(q, upd)
@@ -64,6 +68,7 @@ async def start_route(
         if recip_ids:
             cond["request_id"] = {"$in": [ _maybe_oid(x) or x for x in recip_ids ]}
         await db.matches.update_many(cond, {"$set": {"status": "in_progress", "route_id": route["_id"], "locked_at": _utcnow()}})
+        await versions.bump(db, "matches")
 
     return {"ok": True, "status": "in_progress"}
 
@@ -80,7 +85,18 @@ async def checkpoint_route(
             evt["kg_override"] = float(payload["kg_override"])
         except Exception:
             raise HTTPException(400, "kg_override must be a number")
-    res = await db.routes.update_one(q, {"$push": {"events": evt}})
+    upd: dict = {"$push": {"events": evt}}
+    if payload and "step" in payload:
+        # index of the last step served; /api/routes/insert never places stops before it
+        try:
+            evt["step"] = int(payload["step"])
+        except Exception:
+            raise HTTPException(400, "step must be an integer")
+        if evt["step"] < 0:
+            raise HTTPException(400, "step must be >= 0")
+        upd["$set"] = {"current_step": evt["step"]}
+        upd["$inc"] = {"rev": 1}
+    res = await db.routes.update_one(q, upd)
     if not res.matched_count:
         raise HTTPException(404, "Route not found")
     return {"ok": True}
@@ -90,49 +106,66 @@ async def complete_route(
     rid: str,
     db: AsyncIOMotorDatabase = Depends(get_db),
 ):
-    # fetch route by either _id or string id
+    """
+    Complete a route and everything it carried. The status flip is a guarded
+    find_one_and_update, so concurrent calls complete a route exactly once.
+
+    On MongoDB 8.0+ the follow-up writes (donations, requests, matches, driver)
+    and the version bumps go out as a single client-level bulk_write, so the
+    route takes two round trips. Older servers can only batch within one
+    collection: there it is one write per collection plus the bump, run one
+    after another inside a transaction (a session can't run operations
+    concurrently) and concurrently without one.
+    """
     q = _id_filter(rid)
-    route = await db.routes.find_one(q)
-    if not route:
-        raise HTTPException(status_code=404, detail="Route not found")
-
-    # Pull lists (accept strings or ObjectIds)
-    donation_ids = _to_oid_list(route.get("donation_ids") or [])
-    request_ids  = _to_oid_list(route.get("request_ids")  or [])
-
-    # 1) Mark route completed
-    await db.routes.update_one(
-        q,
-        {
-            "$set": {"status": "completed", "completed_at": _utcnow()},
-            "$push": {"events": {"ts": _utcnow(), "type": "complete"}},
-        },
-    )
-
-    # 2) Mark donations delivered (if you use that status)
-    if donation_ids:
-        await db.donations.update_many(
-            {"_id": {"$in": donation_ids}},
-            {"$set": {"status": "delivered"}}
-        )
-
-    # 3) Close requests (optional)
-    if request_ids:
-        await db.requests.update_many(
-            {"_id": {"$in": request_ids}},
-            {"$set": {"status": "closed"}}
+    now = _utcnow()
+    async with transaction(db.client) as session:
+        # 1) Mark route completed (only if it isn't already)
+        route = await db.routes.find_one_and_update(
+            {"$and": [q, {"status": {"$ne": "completed"}}]},
+            {
+                "$set": {"status": "completed", "completed_at": now},
+                "$push": {"events": {"ts": now, "type": "complete"}},
+            },
+            session=session,
         )
-
-    # 4) Mark matches tied to this route as completed
-    await db.matches.update_many(
-        {"route_id": route.get("_id")},
-        {"$set": {"status": "completed", "completed_at": _utcnow()}}
-    )
-
-    # 5) Free driver (if stored)
-    driver_id = route.get("driver_id")
-    driver_oid = _maybe_oid(driver_id)
-    if driver_oid:
-        await db.drivers.update_one({"_id": driver_oid}, {"$set": {"available": True}})
+        if not route:
+            done = await db.routes.find_one(q, {"_id": 1, "id": 1}, session=session)
+            if not done:
+                raise HTTPException(status_code=404, detail="Route not found")
+            return {"ok": True, "route_id": str(done.get("_id") or done.get("id") or rid), "already_completed": True}
+
+        # Pull lists (accept strings or ObjectIds)
+        donation_ids = _to_oid_list(route.get("donation_ids") or [])
+        request_ids  = _to_oid_list(route.get("request_ids")  or [])
+        driver_oid = _maybe_oid(route.get("driver_id"))
+
+        # (collection, model, filter, update)
+        writes = [
+            # 2) Mark donations delivered
+            (db.donations, UpdateMany, {"_id": {"$in": donation_ids}}, {"$set": {"status": "delivered"}})
+            if donation_ids else None,
+            # 3) Close requests
+            (db.requests, UpdateMany, {"_id": {"$in": request_ids}}, {"$set": {"status": "closed"}})
+            if request_ids else None,
+            # 4) Mark matches tied to this route as completed
+            (db.matches, UpdateMany, {"route_id": route.get("_id")},
+             {"$set": {"status": "completed", "completed_at": now}}),
+            # 5) Free driver (if stored)
+            (db.drivers, UpdateOne, {"_id": driver_oid}, {"$set": {"available": True}})
+            if driver_oid else None,
+        ]
+        writes = [w for w in writes if w]
+        names = [c.name for c, *_ in writes]
+        if await supports_client_bulk_write(db.client):
+            models = [m(f, u, namespace=f"{db.name}.{c.name}") for c, m, f, u in writes]
+            await db.client.bulk_write(models + versions.bump_models(db, *names), ordered=False, session=session)
+        else:
+            if session is not None:
+                for c, m, f, u in writes:
+                    await c.bulk_write([m(f, u)], ordered=False, session=session)
+            else:
+                await asyncio.gather(*(c.bulk_write([m(f, u)], ordered=False) for c, m, f, u in writes))
+            await versions.bump(db, *names, session=session)
 
     return {"ok": True, "route_id": str(route.get("_id") or route.get("id") or rid)}
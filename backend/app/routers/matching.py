@@ -1,10 +1,11 @@
 # app/routers/matching.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from datetime import datetime, timezone
 from collections import defaultdict
 from app.db import get_db
+from app.services import versions
 
 router = APIRouter(prefix="/api/matching", tags=["matching"])
 
@@ -23,8 +24,9 @@ async def run_matching(db: AsyncIOMotorDatabase = Depends(get_db)):
     await db.matches.delete_many({"status": "planned"})
 
     # 1) Load active donations & requests
-    donations = [d async for d in db.donations.find({"status": {"$in": list(ACTIVE_DONATION_STAT)}})]
-    requests  = [r async for r in db.requests.find({"status": {"$in": list(ACTIVE_REQUEST_STAT)}})]
+    #    (documents still waiting for a background geocode are skipped until they resolve)
+    donations = [d async for d in db.donations.find({"status": {"$in": list(ACTIVE_DONATION_STAT)}, "geo_pending": {"$ne": True}})]
+    requests  = [r async for r in db.requests.find({"status": {"$in": list(ACTIVE_REQUEST_STAT)}, "geo_pending": {"$ne": True}})]
 
     # 2) Preload already reserved quantities (planned + in_progress)
     committed = defaultdict(float)   # (donation_id, item) -> allocated sum
@@ -91,11 +93,16 @@ async def run_matching(db: AsyncIOMotorDatabase = Depends(get_db)):
     if planned_docs:
         res = await db.matches.insert_many(planned_docs)
         count = len(res.inserted_ids)
+    await versions.bump(db, "matches")  # planned rows were replaced either way
 
     return {"ok": True, "planned": count}
 
 @router.get("/plan")
-async def list_planned(db: AsyncIOMotorDatabase = Depends(get_db)):
+async def list_planned(request: Request, response: Response, db: AsyncIOMotorDatabase = Depends(get_db)):
+    # rows join donor/ngo names, so any of the three collections changes the answer
+    not_modified = await versions.check(request, response, db, "matches", "donations", "requests")
+    if not_modified is not None:
+        return not_modified
     out = []
     async for m in db.matches.find({"status": "planned"}):
         did = m.get("donation_id")
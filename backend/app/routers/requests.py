@@ -1,10 +1,12 @@
 # app/routers/requests.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime, timezone
-from app.utils.geocode import geocode_address
-from app.db import insert_request, list_requests
+from bson import ObjectId
+from app.db import get_db, insert_request, list_requests, requests_col
+from app.services import listing, versions
+from app.services.geocode_worker import pending_fields, enqueue
 from app.services.geo_enrich import ensure_location_and_geo  # ✅ NEW
 
 router = APIRouter(prefix="/api/requests", tags=["requests"])
@@ -25,20 +27,14 @@ class RequestIn(BaseModel):
     ngo_name: str
     needs: List[NeedItem]
     address: Optional[str] = None
-    # You can keep this default (0,0) — ensure_location_and_geo treats 0,0 as invalid and will geocode.
+    # You can keep this default (0,0) — 0,0 counts as "no coords": the request is saved geo_pending and geocoded in the background.
     # If you prefer, make it Optional[Location] = None.
     location: Location = Field(default_factory=Location)
 
 
-from app.utils.geocode import geocode_address
-
 @router.post("", status_code=201)
 async def create_request(body: RequestIn):
     loc = body.location.model_dump() if body.location else None
-    if (not loc) or (float(loc.get("lat", 0)) == 0 and float(loc.get("lng", 0)) == 0):
-        g = geocode_address(body.address or "")
-        if g:
-            loc = g
 
     doc = {
         "ngo_name": body.ngo_name,
@@ -48,7 +44,13 @@ async def create_request(body: RequestIn):
         "status": "open",                       # <-- ensure open
         "created_at": datetime.utcnow(),        # optional but nice
     }
+    # Address only → saved as geo_pending, the geocode worker fills location/geo later
+    pending = pending_fields(doc)
+    if not pending:
+        ensure_location_and_geo(doc)            # given coords: just normalize + geo (no provider call)
     created = await insert_request(doc)
+    if pending:
+        await enqueue(get_db(), "requests", ObjectId(created["_id"]), doc["address"])
     return {
         "request": {
             "id": created.get("id"),
@@ -58,21 +60,63 @@ async def create_request(body: RequestIn):
             "location": created["location"],
             "status": created.get("status", "open"),
             "created_at": created.get("created_at"),
+            "geo_pending": pending,
         }
     }
 
 
+LEGACY_FIELDS = ("id", "ngo_name", "needs", "address", "location", "created_at")
+LIST_FIELDS = set(LEGACY_FIELDS) | {"status", "geo_pending"}
+
+
+def _row(r: dict, paged: bool) -> dict:
+    row = {
+        "id": r.get("id"),
+        "ngo_name": r.get("ngo_name"),
+        "needs": r.get("needs", []),
+        "address": r.get("address"),
+        "location": r.get("location", {}),
+        "created_at": r.get("created_at"),
+    }
+    if paged:
+        row["status"] = r.get("status")
+        row["geo_pending"] = bool(r.get("geo_pending"))
+    return row
+
+
 @router.get("")
-async def get_requests():
-    docs = await list_requests()
-    out = []
+async def get_requests(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=listing.MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    status: Optional[str] = Query(None, description="one status or a comma list"),
+    ngo: Optional[str] = Query(None, description="exact ngo_name"),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    fields: Optional[str] = Query(None, description="comma list of fields to return"),
+):
+    """
+    Newest first. With limit or cursor: {"items", "next_cursor"} pages.
+    Without either, the legacy full array (while LEGACY_LISTINGS is on).
+    Conditional: 304 when If-None-Match still matches the ETag.
+    """
+    not_modified = await versions.check(request, response, get_db(), "requests")
+    if not_modified is not None:
+        return not_modified
+    filt: dict = {}
+    if status:
+        filt["status"] = listing.in_list(status)
+    if ngo:
+        filt["ngo_name"] = ngo
+    if bbox:
+        filt.update(listing.bbox_filter(bbox))
+    proj, keys = listing.projection(fields, LIST_FIELDS)
+
+    if not listing.paged(limit, cursor):
+        docs = await list_requests(filt, proj)
+        return [listing.pick(_row(r, False), keys) for r in docs]
+
+    docs, nxt = await listing.page(requests_col(), filt, limit=limit, cursor=cursor, proj=proj)
     for r in docs:
-        out.append({
-            "id": r.get("id"),
-            "ngo_name": r.get("ngo_name"),
-            "needs": r.get("needs", []),
-            "address": r.get("address"),
-            "location": r.get("location", {}),
-            "created_at": r.get("created_at"),
-        })
-    return out
+        r["id"] = str(r.pop("_id"))
+    return {"items": [listing.pick(_row(r, True), keys) for r in docs], "next_cursor": nxt}
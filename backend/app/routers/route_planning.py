@@ -1,9 +1,14 @@
 # app/routers/route_planning.py
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional, Literal
+from datetime import datetime, timezone
 from app.core.security import get_current_user
+from app.schemas import TimeWindow
 from app.services.routing import plan_route as plan_route_service  # << alias to avoid name collision
+from app.services.plan_cache import fingerprint, route_plans
+from app.services.speed_profile import hour_of_week
 
 router = APIRouter(prefix="/routes", tags=["routes"])
 
@@ -14,6 +19,8 @@ class Stop(BaseModel):
     coord: Coord = Field(..., description="[lon, lat]")
     kind: Literal["donor","recipient","hub"] = "recipient"
     demand: Optional[float] = None
+    time_window: Optional[TimeWindow] = None
+    service_min: Optional[float] = Field(None, ge=0)
 
 class PlanRequest(BaseModel):
     depot: Coord
@@ -21,6 +28,8 @@ class PlanRequest(BaseModel):
     vehicle_capacity: Optional[float] = None
     max_distance_km: Optional[float] = None
     objective: Literal["shortest_path","min_time","balanced"] = "shortest_path"
+    time_budget_s: Optional[float] = Field(None, gt=0, le=30)
+    depart_at: Optional[datetime] = Field(None, description="defaults to now; time windows are relative to it")
 
 class Leg(BaseModel):
     from_id: str
@@ -33,14 +42,38 @@ class PlanResponse(BaseModel):
     legs: List[Leg]
     total_distance_km: float
     objective: str
+    trips: List[List[str]] = []
+    unassigned: List[dict] = []
+    notes: List[str] = []
+    cached: bool = False
+
+def _plan_key(req: PlanRequest) -> str:
+    """Same depot, stop set, limits and departure (minute with windows, else hour of week) → same plan."""
+    depart = req.depart_at or datetime.now(timezone.utc)
+    windowed = any(s.time_window for s in req.stops)
+    stops = sorted(
+        ([s.coord[0], s.coord[1], s.demand or 0.0, s.id,
+          s.time_window.model_dump() if s.time_window else None, s.service_min] for s in req.stops),
+        key=lambda t: (t[0], t[1], t[2], t[3]),
+    )
+    return fingerprint(
+        depot=list(req.depot), stops=stops,
+        capacity=req.vehicle_capacity, max_km=req.max_distance_km, objective=req.objective,
+        depart=depart.replace(second=0, microsecond=0) if windowed else hour_of_week(depart),
+    )
 
 def _plan_route(req: PlanRequest) -> PlanResponse:
     """
     Adapter: call your service and normalize to PlanResponse.
     Update the mapping if your service returns a different shape.
     """
-    # Pass a plain dict; easier for services
-    plan = plan_route_service(req.model_dump())
+    key = _plan_key(req)
+    plan = route_plans.get(key)
+    cached = plan is not None
+    if not cached:
+        # Pass a plain dict; easier for services
+        plan = plan_route_service(req.model_dump())
+        route_plans.put(key, plan)
 
     # Accept either of these shapes from the service:
     #  A) {"ordered_stop_ids": [...], "legs":[{"from_id":...,"to_id":...,"distance_km":...,"eta_min":...}], "total_distance_km": ...}
@@ -65,10 +98,15 @@ def _plan_route(req: PlanRequest) -> PlanResponse:
         legs=legs,
         total_distance_km=float(total_km),
         objective=req.objective,
+        trips=plan.get("trips") or [],
+        unassigned=plan.get("unassigned") or [],
+        notes=plan.get("notes") or [],
+        cached=cached,
     )
 
 @router.post("/plan", response_model=PlanResponse)
 async def plan_route_endpoint(body: PlanRequest, user=Depends(get_current_user)):
     if not body.stops:
         raise HTTPException(400, "No stops provided")
-    return _plan_route(body)
+    # CPU-bound search; keep the event loop free while it runs
+    return await run_in_threadpool(_plan_route, body)
@@ -1,10 +1,30 @@
 # app/routers/routes.py
-from fastapi import APIRouter, Body
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Tuple
 from math import radians, sin, cos, asin
+import asyncio
+import time
 from datetime import datetime, timezone
 from bson import ObjectId
-from app.db import get_db
+from pymongo import UpdateMany, ReturnDocument
+from app.db import get_db, transaction
+import numpy as np
+from app.services.spatial import nn_order
+from app.services import versions
+from app.services.ndjson import MEDIA_TYPE as NDJSON, ndjson_line
+from app.services.batch_opt import improve_batches, iter_improved
+from app.services.routing import PLAN_BUDGET_S, route_geometry
+from app.services.speed_profile import path_minutes, get_profile
+from app.services import time_windows as tw
+from app.services.route_opt import haversine_matrix
+from app.services.plan_cache import fingerprint, match_plans
+from app.services.depots import depot_costs, assign_depots
+from app.services.polyline import encode as encode_polyline, decode as decode_polyline, simplify as simplify_polyline, tolerance_for_zoom
+from app.services.clustering import capacitated_kmeans, sweep, groups, project_km
+from app.services.packing import pack, vehicle_capacity, VOLUME_L_PER_KG
+from app.services.insertion import best_pair_insertion, apply_pair, steps_distance_km
 
 router = APIRouter(prefix="/api/routes", tags=["routes"])
 
@@ -39,220 +59,846 @@ def _hav_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
 def _nn_order(depot: Tuple[float, float], points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if not points:
         return []
-    un = points[:]
-    cur = depot
-    out = []
-    while un:
-        nxt = min(un, key=lambda p: _hav_km(cur, (p["lat"], p["lng"])))
-        out.append(nxt)
-        cur = (nxt["lat"], nxt["lng"])
-        un.remove(nxt)
+    order = nn_order(depot, [p["lat"] for p in points], [p["lng"] for p in points])
+    return [points[i] for i in order]
+
+def _pack_batches(
+    stops: List[Dict[str, Any]],
+    capacity_kg: float,
+    fleet: List[Dict[str, float]] | None = None,
+    spatial: bool = False,
+    keep_empty: bool = False,
+) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, float]]]:
+    """Best-fit packing over kg/volume/cold slots; extra bins get `capacity_kg`."""
+    if (capacity_kg is None or capacity_kg <= 0) and not fleet:
+        return ([stops] if stops else []), ([{}] if stops else [])
+    default = {"kg": float(capacity_kg)} if capacity_kg and capacity_kg > 0 else None
+    batches, caps, unpacked = pack(stops, fleet, default, spatial=spatial, keep_empty=keep_empty)
+    # stops too big for any vehicle still get a (single-stop) route rather than vanishing
+    for s in unpacked:
+        batches.append([s])
+        caps.append(default or {})
+    return batches, caps
+
+def _needs_cold(ddoc: Dict[str, Any], item: str) -> bool:
+    if ddoc.get("cold_chain"):
+        return True
+    label = (item or "").strip().lower()
+    return any(
+        it.get("perishable") and (it.get("name") or "").strip().lower() == label
+        for it in (ddoc.get("items") or [])
+    )
+
+async def _docs_by_ids(col, ids) -> Dict[str, Dict[str, Any]]:
+    """Fetch docs whose _id (ObjectId or raw) or custom 'id' is in ids, keyed by the given id string."""
+    ids = [x for x in ids if x is not None]
+    if not ids:
+        return {}
+    oids = [o for o in (_maybe_oid(x) for x in ids) if o]
+    raw = [str(x) for x in ids]
+    out: Dict[str, Dict[str, Any]] = {}
+    async for d in col.find({"$or": [{"_id": {"$in": oids + raw}}, {"id": {"$in": raw}}]}):
+        out[str(d.get("_id"))] = d
+        if d.get("id") is not None:
+            out[str(d["id"])] = d
     return out
 
-def _pack_batches(stops: List[Dict[str, Any]], capacity_kg: float) -> List[List[Dict[str, Any]]]:
-    """Greedy bin packing by descending weight (kg)."""
-    if capacity_kg is None or capacity_kg <= 0:
-        return [stops] if stops else []
-    arr = sorted(stops, key=lambda s: float(s.get("kg", 0) or 0), reverse=True)
-    bins: List[List[Dict[str, Any]]] = []
-    loads: List[float] = []
-    for s in arr:
-        w = float(s.get("kg", 0) or 0)
-        placed = False
-        for i, load in enumerate(loads):
-            if load + w <= capacity_kg:
-                bins[i].append(s)
-                loads[i] += w
-                placed = True
-                break
-        if not placed:
-            bins.append([s])
-            loads.append(w)
-    return bins
+def _match_nodes(recs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Aggregate resolved matches into pickup nodes (per donor) and drop nodes (per recipient)."""
+    donors: Dict[str, Dict[str, Any]] = {}
+    recips: Dict[str, Dict[str, Any]] = {}
+    for r in recs:
+        mid, kg, cold = r["_id"], r["kg"], r["cold"]
+        vol = kg * r["l_per_kg"]
+        if r["pick"] is not None:
+            node = donors.setdefault(r["dkey"], {
+                "type": "pickup",
+                "label": r["ddoc"].get("donor_name", "Donor"),
+                "lat": r["pick"][0], "lng": r["pick"][1],
+                "kg": 0.0, "volume_l": 0.0, "cold_slots": 0, "donation_id": r["dkey"],
+                "window": r["ddoc"].get("pickup_window"), "ready_after": r["ddoc"].get("ready_after"),
+                "match_ids": [], "match_kg": {}  # all matches touching this donor
+            })
+            node["kg"] += kg
+            node["volume_l"] += vol
+            node["cold_slots"] = max(node["cold_slots"], 1 if cold else 0)
+            node["match_ids"].append(mid)
+            node["match_kg"][mid] = node["match_kg"].get(mid, 0.0) + kg
+        if r["drop"] is not None:
+            node = recips.setdefault(r["rkey"], {
+                "type": "drop",
+                "label": r["rdoc"].get("ngo_name", "Recipient"),
+                "lat": r["drop"][0], "lng": r["drop"][1],
+                "kg": 0.0, "volume_l": 0.0, "cold_slots": 0, "request_id": r["rkey"],
+                "window": r["rdoc"].get("delivery_window"),
+                "match_ids": [], "match_kg": {}  # all matches touching this recipient
+            })
+            node["kg"] += kg
+            node["volume_l"] += vol
+            node["cold_slots"] = max(node["cold_slots"], 1 if cold else 0)
+            node["match_ids"].append(mid)
+            node["match_kg"][mid] = node["match_kg"].get(mid, 0.0) + kg
+    return list(donors.values()), list(recips.values())
+
+def _cluster_matches(
+    recs: List[Dict[str, Any]],
+    depot: Tuple[float, float],
+    capacity_kg: float,
+    method: str,
+) -> List[List[Dict[str, Any]]]:
+    """Split matches into capacity-sized geographic clusters on both pickup and drop coordinates."""
+    located = [r for r in recs if r["pick"] is not None or r["drop"] is not None]
+    if not located:
+        return []
+    # a match missing one end is placed by the end it has
+    pick = [r["pick"] or r["drop"] for r in located]
+    drop = [r["drop"] or r["pick"] for r in located]
+    lat0 = depot[0]
+    px, py = project_km([p[0] for p in pick], [p[1] for p in pick], lat0)
+    dx, dy = project_km([p[0] for p in drop], [p[1] for p in drop], lat0)
+    demand = np.array([r["kg"] for r in located])
+    if method == "sweep":
+        ox, oy = project_km([depot[0]], [depot[1]], lat0)
+        X = np.column_stack([(px + dx) / 2.0, (py + dy) / 2.0])
+        labels = sweep(X, demand, capacity_kg, (float(ox[0]), float(oy[0])))
+    else:
+        X = np.column_stack([px, py, dx, dy])
+        labels = capacitated_kmeans(X, demand, capacity_kg)
+    return [[located[i] for i in g] for g in groups(labels)]
+
+def _plan_batches(
+    recs: List[Dict[str, Any]],
+    dep: Tuple[float, float],
+    capacity_kg: float,
+    fleet: List[Dict[str, float]] | None,
+    spatial: bool,
+    cluster: str | None,
+) -> List[Dict[str, Any]]:
+    """
+    CPU part of plan_from_matches (cluster, pack, nearest-neighbour order); runs off the event loop.
+    Returns one dict per non-empty vehicle batch: cluster, cap, picks, drops (in visiting order).
+    """
+    clustered = bool(cluster) and capacity_kg is not None and capacity_kg > 0
+    parts = _cluster_matches(recs, dep, capacity_kg, cluster) if clustered else [recs]
+
+    out: List[Dict[str, Any]] = []
+    for ci, part in enumerate(parts):
+        pickups, drops = _match_nodes(part)
+        # with several clusters each fleet vehicle may serve only one of them, so keep
+        # empty fleet slots in place to see which vehicles this cluster used up
+        track = clustered and bool(fleet)
+        pick_batches, pick_caps = _pack_batches(pickups, capacity_kg, fleet, spatial, keep_empty=track)
+        # Drops are packed into the vehicles the pickups used, so index i is one vehicle.
+        drop_batches, drop_caps = _pack_batches(drops, capacity_kg, pick_caps or fleet, spatial,
+                                                keep_empty=True)
+        if track:
+            used = {i for i in range(len(fleet))
+                    if (i < len(pick_batches) and pick_batches[i]) or (i < len(drop_batches) and drop_batches[i])}
+            fleet = [c for i, c in enumerate(fleet) if i not in used] or None
+
+        for i in range(max(len(pick_batches), len(drop_batches))):
+            picks = pick_batches[i] if i < len(pick_batches) else []
+            drps  = drop_batches[i] if i < len(drop_batches) else []
+            cap = (pick_caps[i] if i < len(pick_caps) else None) or (drop_caps[i] if i < len(drop_caps) else {})
+            if not picks and not drps:
+                continue
+            ordered_picks = _nn_order(dep, picks)
+            curpos = dep if not ordered_picks else (ordered_picks[-1]["lat"], ordered_picks[-1]["lng"])
+            out.append({
+                "cluster": ci if clustered else None,
+                "cap": cap,
+                "picks": ordered_picks,
+                "drops": _nn_order(curpos, drps),
+            })
+    return out
+
+def _window_batches(dep: Tuple[float, float], batches: List[Dict[str, Any]], t0: datetime) -> List[Dict[str, Any]]:
+    """
+    Make batches with pickup/delivery windows time-feasible, in place. Late stops are
+    moved (pickups stay before drops) or dropped, and a dropped stop takes its matches
+    off the paired stops too. Sets b["eta"] (arrival minutes per step) on scheduled
+    batches; returns the stops left unscheduled.
+    """
+    unscheduled: List[Dict[str, Any]] = []
+    for b in batches:
+        nodes = b["picks"] + b["drops"]
+        ew = [tw.window(t0, s.get("window"), s.get("ready_after")) for s in nodes]
+        if all(e == -tw.INF and l == tw.INF for e, l in ew):
+            continue
+        lat = [dep[0]] + [s["lat"] for s in nodes]
+        lng = [dep[1]] + [s["lng"] for s in nodes]
+        D = haversine_matrix(lat, lng)
+        T = get_profile().minutes_matrix(lat, lng, t0, D=D)
+        e = np.array([0.0] + [w[0] for w in ew])
+        l = np.array([tw.INF] + [w[1] for w in ew])
+        s = np.array([0.0] + [tw.SERVICE_MIN] * len(nodes))
+        group = np.array([0] + [0] * len(b["picks"]) + [1] * len(b["drops"]))
+
+        route, late = tw.repair(list(range(len(nodes) + 1)) + [0], T, D, e, l, s, 0.0, group)
+        route = tw.improve(route, T, D, e, l, s, 0.0, time.perf_counter() + 0.2, group)
+
+        # matches whose pickup or drop missed its window can't be carried on this route
+        gone = {mid for v in late for mid in nodes[v - 1]["match_ids"]}
+        for v in late:
+            n = nodes[v - 1]
+            unscheduled.append({"type": n["type"], "label": n["label"],
+                                "donation_id": n.get("donation_id"), "request_id": n.get("request_id"),
+                                "match_ids": [str(m) for m in n["match_ids"]],
+                                "reason": "time window cannot be met"})
+        kept = []
+        for v in route[1:-1]:
+            n = nodes[v - 1]
+            if gone & set(n["match_ids"]):
+                left = [m for m in n["match_ids"] if m not in gone]
+                if not left:
+                    unscheduled.append({"type": n["type"], "label": n["label"],
+                                        "donation_id": n.get("donation_id"), "request_id": n.get("request_id"),
+                                        "match_ids": [str(m) for m in n["match_ids"]],
+                                        "reason": "paired stop cannot be scheduled"})
+                    continue
+                share = sum(n["match_kg"][m] for m in left) / max(n["kg"], 1e-9)
+                n = {**n, "match_ids": left, "kg": sum(n["match_kg"][m] for m in left),
+                     "volume_l": n["volume_l"] * share}
+            kept.append((v, n))
+        route = [0] + [v for v, _ in kept] + [0]
+        b["picks"] = [n for _, n in kept if n["type"] == "pickup"]
+        b["drops"] = [n for _, n in kept if n["type"] == "drop"]
+        arr, _, _ = tw.schedule(route, T, e, l, s, 0.0)
+        b["eta"] = [float(a) for a in arr]
+    return unscheduled
+
+def _plan_key(recs: List[Dict[str, Any]], parts: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Fingerprint of a plan_from_matches run and the matches in canonical order.
+    Matches are identified by what they look like (coordinates, kg, cold chain,
+    windows, and which of them share a donor or recipient), not by id, so the same
+    stops re-matched after a completion hash the same.
+    """
+    order = sorted(recs, key=lambda r: (r["pick"] or (), r["drop"] or (), r["kg"], r["cold"], r["l_per_kg"]))
+    dgroup: Dict[Any, int] = {}
+    rgroup: Dict[Any, int] = {}
+    rows = []
+    for r in order:
+        ddoc, rdoc = r["ddoc"] or {}, r["rdoc"] or {}
+        rows.append([
+            r["pick"], r["drop"], r["kg"], r["cold"], r["l_per_kg"],
+            dgroup.setdefault(r["dkey"], len(dgroup)), rgroup.setdefault(r["rkey"], len(rgroup)),
+            ddoc.get("ready_after"), ddoc.get("pickup_window"), rdoc.get("delivery_window"),
+        ])
+    return fingerprint(matches=rows, **parts), order
+
+def _node_refs(nodes: List[Dict[str, Any]], index: Dict[Any, int]) -> List[List[int]]:
+    return [[index[m] for m in n["match_ids"]] for n in nodes]
+
+def _node_from_refs(order: List[Dict[str, Any]], refs: List[int], kind: str) -> Dict[str, Any]:
+    pickups, drops = _match_nodes([order[i] for i in refs])
+    return (pickups if kind == "pickup" else drops)[0]
+
+def _cache_entry(batches: List[Dict[str, Any]], unscheduled: List[Dict[str, Any]],
+                 order: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Batches and unscheduled stops as positions in the canonical match order."""
+    index = {r["_id"]: i for i, r in enumerate(order)}
+    by_str = {str(r["_id"]): i for i, r in enumerate(order)}
+    return {
+        "batches": [{"cluster": b["cluster"], "cap": b["cap"], "eta": b.get("eta"), "depot": b.get("depot", 0),
+                     "picks": _node_refs(b["picks"], index), "drops": _node_refs(b["drops"], index)}
+                    for b in batches],
+        "unscheduled": [{"type": u["type"], "reason": u["reason"], "refs": [by_str[m] for m in u["match_ids"]]}
+                        for u in unscheduled],
+    }
+
+def _from_cache_entry(entry: Dict[str, Any], order: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Rebuild (batches, unscheduled) for the current matches from a cached entry."""
+    batches = []
+    for b in entry["batches"]:
+        out = {"cluster": b["cluster"], "cap": b["cap"], "depot": b["depot"],
+               "picks": [_node_from_refs(order, refs, "pickup") for refs in b["picks"]],
+               "drops": [_node_from_refs(order, refs, "drop") for refs in b["drops"]]}
+        if b["eta"] is not None:
+            out["eta"] = b["eta"]
+        batches.append(out)
+    unscheduled = []
+    for u in entry["unscheduled"]:
+        n = _node_from_refs(order, u["refs"], u["type"])
+        unscheduled.append({"type": n["type"], "label": n["label"],
+                            "donation_id": n.get("donation_id"), "request_id": n.get("request_id"),
+                            "match_ids": [str(m) for m in n["match_ids"]], "reason": u["reason"]})
+    return batches, unscheduled
+
+def _route_steps(dep: Tuple[float, float], picks: List[Dict[str, Any]], drps: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+    """Depot → pickups → drops → depot in the given order; returns (steps, km)."""
+    steps = [{"action": "start", "lat": dep[0], "lng": dep[1], "label": "Depot"}]
+    for s in picks:
+        steps.append({"action": "pickup", "lat": s["lat"], "lng": s["lng"], "label": s["label"], "kg": round(float(s["kg"]), 3)})
+    for s in drps:
+        steps.append({"action": "drop", "lat": s["lat"], "lng": s["lng"], "label": s["label"], "kg": round(float(s["kg"]), 3)})
+    steps.append({"action": "end", "lat": dep[0], "lng": dep[1], "label": "Depot"})
+
+    dist = 0.0
+    coords = [(st["lat"], st["lng"]) for st in steps]
+    for a, b in zip(coords, coords[1:]):
+        dist += _hav_km(a, b)
+    return steps, dist
+
+async def _load_recs(db, max_rows: int) -> List[Dict[str, Any]]:
+    """Planned matches with their donation/request docs and pickup/drop coordinates."""
+    # 1) Pull planned matches
+    matches = []
+    cur = db.matches.find({"status": "planned"}).limit(max_rows)
+    async for m in cur:
+        matches.append(m)
+    if not matches:
+        return []
+
+    # 2) Resolve donations/requests in two queries and attach pickup/drop coordinates
+    dons = await _docs_by_ids(db.donations, [m.get("donation_id") for m in matches])
+    reqs = await _docs_by_ids(db.requests, [m.get("request_id") for m in matches])
+    recs: List[Dict[str, Any]] = []
+    for m in matches:
+        ddoc = dons.get(str(m.get("donation_id"))) if m.get("donation_id") is not None else None
+        rdoc = reqs.get(str(m.get("request_id"))) if m.get("request_id") is not None else None
+        dloc = (ddoc or {}).get("location") or {}
+        rloc = (rdoc or {}).get("location") or {}
+        recs.append({
+            "_id": m.get("_id"),
+            "kg": float(m.get("allocated", 0) or 0),
+            "cold": _needs_cold(ddoc, m.get("item")) if ddoc else False,
+            "l_per_kg": float((ddoc or {}).get("volume_l_per_kg") or VOLUME_L_PER_KG),
+            "ddoc": ddoc, "rdoc": rdoc,
+            "dkey": str(ddoc.get("id") or ddoc.get("_id")) if ddoc else None,
+            "rkey": str(rdoc.get("id") or rdoc.get("_id")) if rdoc else None,
+            "pick": _to_pair(dloc["lat"], dloc["lng"]) if dloc.get("lat") is not None and dloc.get("lng") is not None else None,
+            "drop": _to_pair(rloc["lat"], rloc["lng"]) if rloc.get("lat") is not None and rloc.get("lng") is not None else None,
+        })
+    return recs
+
+def _hubs(depot: Dict[str, float] | None, depots: List[Dict[str, Any]] | None, capacity_kg: float) -> List[Dict[str, Any]]:
+    """Normalize `depot` / `depots` bodies to [{id, pair, capacity_kg, fleet}]."""
+    raw = depots or ([depot] if depot else [])
+    if not raw:
+        raise HTTPException(400, "depot or depots is required")
+    hubs = []
+    for k, d in enumerate(raw):
+        if d.get("lat") is None or d.get("lng") is None:
+            raise HTTPException(400, f"depot {k} needs lat and lng")
+        hubs.append({
+            "id": str(d["id"]) if d.get("id") is not None else (None if len(raw) == 1 else str(k)),
+            "pair": _to_pair(d["lat"], d["lng"]),
+            "capacity_kg": float(d.get("capacity_kg") or capacity_kg),
+            "fleet": d.get("fleet") or None,  # explicit [{kg, volume_l, cold_slots}, ...]
+        })
+    return hubs
+
+async def _plan_context(db, recs, hubs, use_fleet, spatial_packing, cluster, depart_at) -> Dict[str, Any]:
+    """Per-hub fleets, departure time and the plan-cache lookup shared by both plan_from_matches endpoints."""
+    fleets = [h["fleet"] for h in hubs]
+    if use_fleet:
+        drivers = [d async for d in db.drivers.find({"availability": {"$ne": False}})]
+        ids = [h["id"] for h in hubs]
+        for k, h in enumerate(hubs):
+            if fleets[k] is not None:
+                continue
+            # a driver serves the hub named by its depot_id; anyone else serves the first hub
+            own = [vehicle_capacity(d, h["capacity_kg"]) for d in drivers
+                   if (d.get("depot_id") if d.get("depot_id") in ids else ids[0]) == h["id"]]
+            fleets[k] = [c for c in own if c] or None
+
+    t0 = depart_at or _utcnow()
+    if t0.tzinfo is None:
+        t0 = t0.replace(tzinfo=timezone.utc)
+    windowed = any((r["ddoc"] or {}).get(k) for r in recs for k in ("ready_after", "pickup_window")) or \
+        any((r["rdoc"] or {}).get("delivery_window") for r in recs)
+    key, order = _plan_key(recs, {
+        "depots": [[h["pair"], h["capacity_kg"]] for h in hubs], "fleets": fleets,
+        "spatial": spatial_packing, "cluster": cluster,
+        "depart": t0.replace(second=0, microsecond=0) if windowed else None,
+    })
+    return {"fleets": fleets, "t0": t0, "key": key, "order": order, "entry": match_plans.get(key)}
+
+def _assign_hubs(recs: List[Dict[str, Any]], hubs: List[Dict[str, Any]], fleets: List[Any]) -> np.ndarray:
+    """Hub index per match in one vectorized pass; a hub with a known fleet takes at most its fleet's kg."""
+    if len(hubs) == 1:
+        return np.zeros(len(recs), dtype=np.int64)
+    pick = np.array([r["pick"] or r["drop"] or hubs[0]["pair"] for r in recs])
+    drop = np.array([r["drop"] or r["pick"] or hubs[0]["pair"] for r in recs])
+    cost = depot_costs(pick, drop, np.array([h["pair"] for h in hubs]))
+    cap = [sum(float(c.get("kg") or 0) for c in f) if f else np.inf for f in fleets]
+    return assign_depots(cost, [r["kg"] for r in recs], cap)
+
+async def _plan_hub(recs, hub, index, fleet, spatial_packing, cluster, budget, t0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Steps 3–3c for one hub's matches: (batches, unscheduled)."""
+    dep = hub["pair"]
+    # 3) Cluster (optional), pack and order each batch in a worker thread so the
+    #    event loop keeps serving other requests on large plans
+    batches = await run_in_threadpool(_plan_batches, recs, dep, hub["capacity_kg"], fleet, spatial_packing, cluster)
+    for b in batches:
+        b["depot"] = index
+
+    # 3b) Improve every batch in the process pool; merged back in batch order,
+    #     anything not finished within the budget keeps its nearest-neighbour order
+    if budget > 0:
+        improved = await improve_batches(dep, [_batch_points(b) for b in batches], budget)
+        for b, res in zip(batches, improved):
+            _apply_order(b, res)
+
+    # 3c) Pickup/delivery windows: repair late stops, then window-checked improvement
+    unscheduled = await run_in_threadpool(_window_batches, dep, batches, t0)
+    return [b for b in batches if b["picks"] or b["drops"]], unscheduled
+
+def _batch_points(b: Dict[str, Any]) -> Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]:
+    return [(s["lat"], s["lng"]) for s in b["picks"]], [(s["lat"], s["lng"]) for s in b["drops"]]
+
+def _apply_order(b: Dict[str, Any], res) -> None:
+    if res:
+        b["picks"] = [b["picks"][k] for k in res[0]]
+        b["drops"] = [b["drops"][k] for k in res[1]]
+
+def _route_doc(hubs: List[Dict[str, Any]], b: Dict[str, Any], batch_index: int) -> Tuple[Dict[str, Any], List[Any]]:
+    """Route document for one batch and the match ids it locks."""
+    picks, drps, cap = b["picks"], b["drops"], b["cap"]
+    hub = hubs[b.get("depot", 0)]
+    dep, capacity_kg = hub["pair"], hub["capacity_kg"]
+    steps, dist = _route_steps(dep, picks, drps)
+    if "eta" in b:
+        for st, eta in zip(steps, b["eta"]):
+            st["eta_min"] = round(eta, 1)
+        duration_min = b["eta"][-1]
+    else:
+        duration_min = path_minutes(steps)
+
+    # collect ids present in this batch (strings; later we’ll convert to ObjectIds)
+    donor_ids = list({s.get("donation_id") for s in picks if s.get("donation_id")})
+    recip_ids = list({s.get("request_id") for s in drps  if s.get("request_id")})
+
+    # route doc (we include donation_ids/request_ids inside the route)
+    doc = {
+        "batch_index": batch_index,
+        "capacity_kg": cap.get("kg", capacity_kg),
+        "capacity": cap,
+        "load": {
+            "kg": round(sum(float(s.get("kg", 0) or 0) for s in picks), 3),
+            "volume_l": round(sum(float(s.get("volume_l", 0) or 0) for s in picks), 1),
+            "cold_slots": sum(int(s.get("cold_slots", 0) or 0) for s in picks),
+        },
+        "total_distance_km": round(dist, 3),
+        "duration_min": round(duration_min, 1),
+        "steps": steps,
+        "donation_ids": [ _maybe_oid(x) or x for x in donor_ids ],
+        "request_ids":  [ _maybe_oid(x) or x for x in recip_ids ],
+        "status": "planned",
+        "created_at": _utcnow(),
+    }
+    if b["cluster"] is not None:
+        doc["cluster_index"] = b["cluster"]
+    if len(hubs) > 1:
+        doc["depot"] = {"id": hub["id"], "lat": dep[0], "lng": dep[1]}
+
+    # a match belongs to this route when both its pickup and its drop are on it
+    picked = {mid for s in picks for mid in s["match_ids"]}
+    return doc, [mid for s in drps for mid in s["match_ids"] if mid in picked]
+
+async def _persist_routes(db, plan_docs: List[Dict[str, Any]], route_match_ids: List[List[Any]]) -> List[Any]:
+    """Insert routes and lock their matches (status → in_progress, route_id set) in one
+    transaction where supported, with a single bulk_write for all locks."""
+    now = _utcnow()
+    async with transaction(db.client) as session:
+        res = await db.routes.insert_many(plan_docs, session=session)
+        route_ids = res.inserted_ids  # aligned with plan_docs order
+        locks = [
+            UpdateMany({"_id": {"$in": mids}, "status": "planned"},
+                       {"$set": {"status": "in_progress", "route_id": rid, "locked_at": now}})
+            for rid, mids in zip(route_ids, route_match_ids) if mids
+        ]
+        if locks:
+            await db.matches.bulk_write(locks, ordered=False, session=session)
+            await versions.bump(db, "matches", session=session)
+    return route_ids
+
+def _safe_plan(p: Dict[str, Any], rid: Any) -> Dict[str, Any]:
+    q = dict(p)
+    q["_id"] = str(rid)
+    # Convert any ObjectIds inside arrays to strings
+    q["donation_ids"] = [str(x) if isinstance(x, ObjectId) else x for x in q.get("donation_ids", [])]
+    q["request_ids"]  = [str(x) if isinstance(x, ObjectId) else x for x in q.get("request_ids", [])]
+    return q
 
 @router.post("/plan_from_matches")
 async def plan_from_matches(
-    depot: Dict[str, float] = Body(..., example={"lat": 14.5547, "lng": 121.0244}),
+    depot: Dict[str, float] | None = Body(None, example={"lat": 14.5547, "lng": 121.0244}),
+    depots: List[Dict[str, Any]] | None = Body(
+        None, description="several hubs instead of depot: [{id, lat, lng, capacity_kg?, fleet?}]",
+        example=[{"id": "north", "lat": 14.65, "lng": 121.03}, {"id": "south", "lat": 14.45, "lng": 121.02}]),
     capacity_kg: float = Body(80.0),
     max_rows: int = Body(500),
+    use_fleet: bool = Body(False),
+    spatial_packing: bool = Body(False),
+    cluster: str | None = Body(None, description="'kmeans' or 'sweep' to cluster matches before packing"),
+    time_budget_s: float | None = Body(None, description="seconds for route improvement; 0 = nearest-neighbour only"),
+    depart_at: datetime | None = Body(None, description="vehicle departure (default now); pickup/delivery windows are checked against it"),
 ):
     """
-    Build route plans from *planned* matches. For each route we:
+    Build route plans from *planned* matches. Batches are packed on kg, volume and
+    cold-chain slots; with use_fleet=True bin capacities come from available drivers'
+    vehicles (extra bins fall back to capacity_kg). With cluster set, matches are first
+    split into capacity-sized geographic clusters (pickup and drop ends both count) and
+    each cluster is packed and routed on its own. Batches are then improved
+    (2-opt/Or-opt) in a process pool within time_budget_s. Batches whose donations
+    or requests carry ready_after / pickup_window / delivery_window are then made
+    time-feasible; stops that can't be served in time are listed in `unscheduled`
+    and their matches stay planned. Steps 3–3c are memoized (services/plan_cache.py)
+    on the depot, capacities, options and the matches' stops and kg, so a
+    re-triggered plan over the same stops is rebuilt from the cached order
+    (`cached: true`); persisting and locking always run.
+
+    With `depots`, every match is first assigned to the hub where depot → pickup
+    plus drop → depot is cheapest (one vectorized pass; a hub whose fleet is known
+    takes at most that fleet's kg, the rest spill to their next-best hub). Each
+    hub's share is then planned concurrently with its own fleet: an explicit
+    `fleet` list on the depot, or with use_fleet the drivers whose depot_id is
+    that hub's id (drivers without one serve the first hub). Routes start and
+    end at their hub and record it in `depot`. For each route we:
       - compute steps (start → pickups → drops → end)
       - include donation_ids/request_ids inside the route
       - lock only the matches belonging to that route: status=in_progress + route_id
     """
     db = get_db()
-    dep = _to_pair(depot["lat"], depot["lng"])
-
-    # 1) Pull planned matches
-    matches = []
-    cur = db.matches.find({"status": "planned"}).limit(max_rows)
-    async for m in cur:
-        matches.append(m)
+    hubs = _hubs(depot, depots, capacity_kg)
 
-    if not matches:
+    recs = await _load_recs(db, max_rows)
+    if not recs:
         return {"count": 0, "plans": []}
 
-    # 2) Aggregate pickups by donor, drops by recipient; track which match-ids contribute to each node
-    donors: Dict[str, Dict[str, Any]] = {}
-    recips: Dict[str, Dict[str, Any]] = {}
-
-    # Also prepare reverse-index: for (donor_id, recipient_id) collect match _id’s (so we can tag per-route later)
-    by_pair: Dict[Tuple[str, str], List[ObjectId]] = {}
+    ctx = await _plan_context(db, recs, hubs, use_fleet, spatial_packing, cluster, depart_at)
+    cached = ctx["entry"] is not None
+    if cached:
+        # same stops as a recent run: reuse its batches and order for today's matches
+        batches, unscheduled = _from_cache_entry(ctx["entry"], ctx["order"])
+    else:
+        # 3a) Assign matches to hubs, then plan every hub at once (steps 3–3c);
+        #     their improvement jobs share the process pool and the time budget
+        labels = _assign_hubs(recs, hubs, ctx["fleets"])
+        budget = float(time_budget_s if time_budget_s is not None else PLAN_BUDGET_S)
+        parts = await asyncio.gather(*(
+            _plan_hub([r for r, lab in zip(recs, labels) if lab == k], hub, k, ctx["fleets"][k],
+                      spatial_packing, cluster, budget, ctx["t0"])
+            for k, hub in enumerate(hubs)
+        ))
+        batches = [b for bs, _ in parts for b in bs]
+        unscheduled = [u for _, us in parts for u in us]
+        match_plans.put(ctx["key"], _cache_entry(batches, unscheduled, ctx["order"]))
 
-    for m in matches:
-        mid = m.get("_id")
-        item_kg = float(m.get("allocated", 0) or 0)
-
-        # ------------------ DONATION (pickup) ------------------
-        ddoc = await db.donations.find_one({
-            "$or": [
-                {"id": m.get("donation_id")},
-                {"_id": _try_obj(m.get("donation_id"))},
-                {"_id": m.get("donation_id")}
-            ]
-        })
-        dkey = None
-        dloc = None
-        if ddoc:
-            dkey = str(ddoc.get("id") or ddoc.get("_id"))
-            loc = ddoc.get("location") or {}
-            lat = loc.get("lat"); lng = loc.get("lng")
-            if lat is not None and lng is not None:
-                node = donors.setdefault(dkey, {
-                    "type": "pickup",
-                    "label": ddoc.get("donor_name", "Donor"),
-                    "lat": float(lat), "lng": float(lng),
-                    "kg": 0.0, "donation_id": dkey,
-                    "match_ids": []  # all matches touching this donor
-                })
-                node["kg"] += item_kg
-                node["match_ids"].append(mid)
-                dloc = (float(lat), float(lng))
-
-        # ------------------ REQUEST (drop) ------------------
-        rdoc = await db.requests.find_one({
-            "$or": [
-                {"id": m.get("request_id")},
-                {"_id": _try_obj(m.get("request_id"))},
-                {"_id": m.get("request_id")}
-            ]
-        })
-        rkey = None
-        if rdoc:
-            rkey = str(rdoc.get("id") or rdoc.get("_id"))
-            loc = rdoc.get("location") or {}
-            lat = loc.get("lat"); lng = loc.get("lng")
-            if lat is not None and lng is not None:
-                node = recips.setdefault(rkey, {
-                    "type": "drop",
-                    "label": rdoc.get("ngo_name", "Recipient"),
-                    "lat": float(lat), "lng": float(lng),
-                    "kg": 0.0, "request_id": rkey,
-                    "match_ids": []  # all matches touching this recipient
-                })
-                node["kg"] += item_kg
-                node["match_ids"].append(mid)
-
-        # Pair mapping (for later per-route tagging)
-        if dkey and rkey and isinstance(mid, ObjectId):
-            by_pair.setdefault((dkey, rkey), []).append(mid)
-
-    pickups = list(donors.values())
-    drops   = list(recips.values())
-
-    # 3) Pack into capacity-batches independently, then pair batches by index
-    pick_batches = _pack_batches(pickups, capacity_kg)
-    drop_batches = _pack_batches(drops, capacity_kg)
-
-    n = max(len(pick_batches), len(drop_batches))
     plan_docs: List[Dict[str, Any]] = []
-    # For mapping route index -> sets of donor_ids & request_ids (strings)
-    route_donor_ids: List[List[str]] = []
-    route_request_ids: List[List[str]] = []
-
-    for i in range(n):
-        picks = pick_batches[i] if i < len(pick_batches) else []
-        drps  = drop_batches[i] if i < len(drop_batches) else []
-
-        ordered_picks = _nn_order(dep, picks)
-        curpos = dep if not ordered_picks else (ordered_picks[-1]["lat"], ordered_picks[-1]["lng"])
-        ordered_drops = _nn_order(curpos, drps)
-
-        steps = [{"action": "start", "lat": dep[0], "lng": dep[1], "label": "Depot"}]
-        for s in ordered_picks:
-            steps.append({"action": "pickup", "lat": s["lat"], "lng": s["lng"], "label": s["label"], "kg": round(float(s["kg"]), 3)})
-        for s in ordered_drops:
-            steps.append({"action": "drop", "lat": s["lat"], "lng": s["lng"], "label": s["label"], "kg": round(float(s["kg"]), 3)})
-        steps.append({"action": "end", "lat": dep[0], "lng": dep[1], "label": "Depot"})
-
-        # distance & ETA
-        dist = 0.0
-        coords = [(st["lat"], st["lng"]) for st in steps]
-        for a, b in zip(coords, coords[1:]):
-            dist += _hav_km(a, b)
-        duration_min = (dist / 25.0) * 60.0
-
-        # collect ids present in this batch (strings; later we’ll convert to ObjectIds)
-        donor_ids = list({s.get("donation_id") for s in picks if s.get("donation_id")})
-        recip_ids = list({s.get("request_id") for s in drps  if s.get("request_id")})
-
-        # route doc (we include donation_ids/request_ids inside the route)
-        plan_docs.append({
-            "batch_index": i,
-            "capacity_kg": capacity_kg,
-            "total_distance_km": round(dist, 3),
-            "duration_min": round(duration_min, 1),
-            "steps": steps,
-            "donation_ids": [ _maybe_oid(x) or x for x in donor_ids ],
-            "request_ids":  [ _maybe_oid(x) or x for x in recip_ids ],
-            "status": "planned",
-            "created_at": _utcnow(),
-        })
-        route_donor_ids.append(donor_ids)
-        route_request_ids.append(recip_ids)
+    route_match_ids: List[List[Any]] = []
+    for b in batches:
+        doc, mids = _route_doc(hubs, b, len(plan_docs))
+        plan_docs.append(doc)
+        route_match_ids.append(mids)
 
-    # 4) Persist routes; get ids in order
-    if plan_docs:
-        res = await db.routes.insert_many(plan_docs)
-        route_ids = res.inserted_ids  # aligned with plan_docs order
-    else:
-        return {"count": 0, "plans": []}
+    if not plan_docs:
+        return {"count": 0, "plans": [], "unscheduled": unscheduled, "cached": cached}
+
+    # 4) Persist routes and 5) lock their matches
+    route_ids = await _persist_routes(db, plan_docs, route_match_ids)
+
+    # 6) Prepare safe response (ObjectId → str)
+    safe_plans = [_safe_plan(p, rid) for p, rid in zip(plan_docs, route_ids)]
+    return {"count": len(safe_plans), "plans": safe_plans, "unscheduled": unscheduled, "cached": cached}
+
+@router.post("/plan_from_matches/stream")
+async def plan_from_matches_stream(
+    depot: Dict[str, float] = Body(..., example={"lat": 14.5547, "lng": 121.0244}),
+    capacity_kg: float = Body(80.0),
+    max_rows: int = Body(500),
+    use_fleet: bool = Body(False),
+    spatial_packing: bool = Body(False),
+    cluster: str | None = Body(None, description="'kmeans' or 'sweep' to cluster matches before packing"),
+    time_budget_s: float | None = Body(None, description="seconds for route improvement; 0 = nearest-neighbour only"),
+    depart_at: datetime | None = Body(None, description="vehicle departure (default now); pickup/delivery windows are checked against it"),
+):
+    """
+    Same plan as POST /plan_from_matches (single `depot`), streamed as NDJSON (one JSON object per line):
+
+        {"type": "route", "plan": {...}}      one per route, as soon as it is stored and its matches locked
+        {"type": "summary", "count": n, "unscheduled": [...], "cached": false, "elapsed_ms": ...}
+        {"type": "error", "detail": "..."}    instead of the summary if planning fails midway
 
-    # 5) Lock matches belonging to each route: status → in_progress, route_id set
-    for idx, rid in enumerate(route_ids):
-        dids = set(route_donor_ids[idx])
-        rids = set(route_request_ids[idx])
-        if not dids and not rids:
+    Routes arrive in the order their improvement finishes, not in batch order;
+    routes already streamed stay stored if the client disconnects.
+    """
+    db = get_db()
+    hubs = _hubs(depot, None, capacity_kg)
+    dep = hubs[0]["pair"]
+    started = time.perf_counter()
+
+    async def lines():
+        count = 0
+        unscheduled: List[Dict[str, Any]] = []
+
+        async def emit(b):
+            nonlocal count
+            doc, mids = _route_doc(hubs, b, count)
+            rid = (await _persist_routes(db, [doc], [mids]))[0]
+            count += 1
+            return ndjson_line({"type": "route", "plan": _safe_plan(doc, rid)})
+
+        try:
+            recs = await _load_recs(db, max_rows)
+            cached = False
+            if recs:
+                ctx = await _plan_context(db, recs, hubs, use_fleet, spatial_packing, cluster, depart_at)
+                cached = ctx["entry"] is not None
+                if cached:
+                    batches, unscheduled = _from_cache_entry(ctx["entry"], ctx["order"])
+                    for b in batches:
+                        yield await emit(b)
+                else:
+                    batches = await run_in_threadpool(_plan_batches, recs, dep, capacity_kg, ctx["fleets"][0], spatial_packing, cluster)
+                    budget = float(time_budget_s if time_budget_s is not None else PLAN_BUDGET_S)
+                    # each batch is windowed, stored and sent as soon as its improvement is back
+                    async for i, res in iter_improved(dep, [_batch_points(b) for b in batches], budget):
+                        b = batches[i]
+                        b["depot"] = 0
+                        _apply_order(b, res)
+                        unscheduled += await run_in_threadpool(_window_batches, dep, [b], ctx["t0"])
+                        if b["picks"] or b["drops"]:
+                            yield await emit(b)
+                    match_plans.put(ctx["key"], _cache_entry([b for b in batches if b["picks"] or b["drops"]],
+                                                             unscheduled, ctx["order"]))
+            yield ndjson_line({"type": "summary", "count": count, "unscheduled": unscheduled, "cached": cached,
+                           "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+        except Exception as e:  # headers are already sent; report in-band
+            yield ndjson_line({"type": "error", "detail": str(e), "count": count})
+
+    return StreamingResponse(lines(), media_type=NDJSON)
+
+
+INSERT_RETRIES = 3
+
+
+async def _insert_candidates(db, route_statuses: List[str], current_step: Dict[str, int]) -> Dict[Any, Dict[str, Any]]:
+    """
+    Routes that can take new stops, each with `first_pos`: the first slot a
+    stop may go after. Planned routes start at 0; routes under way start at
+    the driver's current step (body `current_step`, else the stored marker set
+    by /api/dispatch checkpoints) and are skipped when neither is known.
+    """
+    routes: Dict[Any, Dict[str, Any]] = {}
+    async for r in db.routes.find({"status": {"$in": route_statuses}},
+                                  {"steps": 1, "capacity_kg": 1, "status": 1, "current_step": 1, "rev": 1}):
+        if len(r.get("steps") or []) < 2:
+            continue
+        if r.get("status") == "planned":
+            r["first_pos"] = 0
+        else:
+            pos = current_step.get(str(r["_id"]), r.get("current_step"))
+            if pos is None:
+                continue
+            r["first_pos"] = int(pos)
+        routes[r["_id"]] = r
+    return routes
+
+
+def _place(matches, dons, reqs, routes, inserted, unplaced) -> Dict[Any, Dict[str, Any]]:
+    """Greedy cheapest insertion of each match; returns the touched routes."""
+    touched: Dict[Any, Dict[str, Any]] = {}
+    for m in matches:
+        ddoc = dons.get(str(m.get("donation_id")))
+        rdoc = reqs.get(str(m.get("request_id")))
+        dloc = (ddoc or {}).get("location") or {}
+        rloc = (rdoc or {}).get("location") or {}
+        if None in (dloc.get("lat"), dloc.get("lng"), rloc.get("lat"), rloc.get("lng")):
+            unplaced.append({"match_id": str(m["_id"]), "reason": "missing location"})
+            continue
+        kg = float(m.get("allocated", 0) or 0)
+        pick = (float(dloc["lat"]), float(dloc["lng"]))
+        drop = (float(rloc["lat"]), float(rloc["lng"]))
+
+        best = None
+        for rid, r in routes.items():
+            res = best_pair_insertion(r["steps"], pick, drop, kg, r.get("capacity_kg"), first_pos=r["first_pos"])
+            if res and (best is None or res[0] < best[0]):
+                best = (res[0], rid, res[1], res[2])
+        if best is None:
+            unplaced.append({"match_id": str(m["_id"]), "reason": "no feasible position"})
             continue
 
-        donor_filter = []
-        if dids:
-            donor_filter.append({"donation_id": {"$in": [ _maybe_oid(x) or x for x in dids ]}})
-        recip_filter = []
-        if rids:
-            recip_filter.append({"request_id": {"$in": [ _maybe_oid(x) or x for x in rids ]}})
+        delta, rid, i, j = best
+        r = routes[rid]
+        dkey = str(ddoc.get("id") or ddoc.get("_id"))
+        rkey = str(rdoc.get("id") or rdoc.get("_id"))
+        r["steps"] = apply_pair(
+            r["steps"],
+            {"action": "pickup", "lat": pick[0], "lng": pick[1],
+             "label": ddoc.get("donor_name", "Donor"), "kg": round(kg, 3)},
+            {"action": "drop", "lat": drop[0], "lng": drop[1],
+             "label": rdoc.get("ngo_name", "Recipient"), "kg": round(kg, 3)},
+            i, j,
+        )
+        t = touched.setdefault(rid, {"donation_ids": set(), "request_ids": set(), "matches": [], "inserted": []})
+        t["donation_ids"].add(_maybe_oid(dkey) or dkey)
+        t["request_ids"].add(_maybe_oid(rkey) or rkey)
+        t["matches"].append(m)
+        t["inserted"].append({"match_id": str(m["_id"]), "route_id": str(rid), "delta_km": round(delta, 3)})
+    return touched
 
-        # Only planned matches that join a donor in this route and a recipient in this route
-        match_query = {
-            "status": "planned",
-            "$and": donor_filter + recip_filter if (donor_filter and recip_filter) else donor_filter or recip_filter
-        }
 
+async def _write_insertion(db, rid, r: Dict[str, Any], t: Dict[str, Any]) -> bool:
+    """
+    Store the new steps only if the route is still at the revision it was read
+    at (another insert or a checkpoint bumps `rev`), and lock the matches in
+    the same transaction where supported. False on a lost race.
+    """
+    now = _utcnow()
+    steps = r["steps"]
+    async with transaction(db.client) as session:
+        res = await db.routes.update_one({"_id": rid, "rev": r.get("rev")}, {
+            "$set": {
+                "steps": steps,
+                "total_distance_km": round(steps_distance_km(steps), 3),
+                "duration_min": round(path_minutes(steps), 1),
+                "updated_at": now,
+            },
+            "$inc": {"rev": 1},
+            "$unset": {"geometry_id": ""},
+            "$addToSet": {
+                "donation_ids": {"$each": list(t["donation_ids"])},
+                "request_ids": {"$each": list(t["request_ids"])},
+            },
+        }, session=session)
+        if not res.matched_count:
+            return False
         await db.matches.update_many(
-            match_query,
-            {"$set": {"status": "in_progress", "route_id": rid, "locked_at": _utcnow()}}
+            {"_id": {"$in": [m["_id"] for m in t["matches"]]}, "status": "planned"},
+            {"$set": {"status": "in_progress", "route_id": rid, "locked_at": now}},
+            session=session,
         )
+        # the stored shape no longer matches the new stop order; rebuilt on next GET
+        await db.route_geometry.delete_many({"route_id": rid}, session=session)
+    return True
 
-    # 6) Prepare safe response (ObjectId → str)
-    safe_plans: List[Dict[str, Any]] = []
-    for p, rid in zip(plan_docs, route_ids):
-        q = dict(p)
-        q["_id"] = str(rid)
-        # Convert any ObjectIds inside arrays to strings
-        q["donation_ids"] = [str(x) if isinstance(x, ObjectId) else x for x in q.get("donation_ids", [])]
-        q["request_ids"]  = [str(x) if isinstance(x, ObjectId) else x for x in q.get("request_ids", [])]
-        safe_plans.append(q)
-
-    return {"count": len(safe_plans), "plans": safe_plans}
+
+@router.post("/insert")
+async def insert_into_routes(
+    match_ids: List[str] = Body(..., embed=True),
+    route_statuses: List[str] = Body(["planned"], embed=True),
+    current_step: Dict[str, int] = Body({}, embed=True),
+):
+    """
+    Insert new planned matches into already-planned routes without replanning.
+    Each match becomes a pickup/drop pair placed at the cheapest position
+    (capacity- and precedence-feasible) over all candidate routes. Only the
+    routes that receive stops and the inserted matches are written.
+
+    Routes under way (route_statuses including "in_progress") only take stops
+    after the driver's current step: pass {route_id: index of the last step
+    served} as `current_step`, or rely on the marker stored by dispatch
+    checkpoints. A route changed by someone else meanwhile is re-read and its
+    matches placed again (up to INSERT_RETRIES times).
+    """
+    db = get_db()
+    oids = [o for o in (_maybe_oid(x) for x in match_ids) if o]
+    pending = [m async for m in db.matches.find({"_id": {"$in": oids}, "status": "planned"})]
+    if not pending:
+        return {"inserted": [], "unplaced": [], "routes_touched": 0}
+
+    dons = await _docs_by_ids(db.donations, [str(m.get("donation_id")) for m in pending])
+    reqs = await _docs_by_ids(db.requests, [str(m.get("request_id")) for m in pending])
+
+    inserted, unplaced, written = [], [], set()
+    for _ in range(INSERT_RETRIES):
+        routes = await _insert_candidates(db, route_statuses, current_step)
+        touched = _place(pending, dons, reqs, routes, inserted, unplaced)
+        pending = []
+        for rid, t in touched.items():
+            if await _write_insertion(db, rid, routes[rid], t):
+                inserted += t["inserted"]
+                written.add(rid)
+            else:
+                pending += t["matches"]
+        if not pending:
+            break
+    unplaced += [{"match_id": str(m["_id"]), "reason": "route changed concurrently"} for m in pending]
+    if written:
+        await versions.bump(db, "matches")
+
+    return {"inserted": inserted, "unplaced": unplaced, "routes_touched": len(written)}
+
+
+# ------------------------------------------------------------
+# Route reads (geometry is stored apart and fetched lazily)
+# ------------------------------------------------------------
+def _route_out(doc: Dict[str, Any]) -> Dict[str, Any]:
+    q = dict(doc)
+    q["_id"] = str(q["_id"])
+    for k in ("donation_ids", "request_ids"):
+        if k in q:
+            q[k] = [str(x) if isinstance(x, ObjectId) else x for x in q.get(k) or []]
+    for k in ("geometry_id", "driver_id"):
+        if isinstance(q.get(k), ObjectId):
+            q[k] = str(q[k])
+    return q
+
+def _route_filter(rid: str) -> Dict[str, Any]:
+    oid = _maybe_oid(rid)
+    return {"$or": [{"_id": oid}, {"id": rid}]} if oid else {"id": rid}
+
+@router.get("")
+async def list_routes(status: str | None = None, limit: int = 100):
+    """Route summaries without steps, events or geometry."""
+    db = get_db()
+    q = {"status": status} if status else {}
+    cur = db.routes.find(q, {"steps": 0, "events": 0}).sort("created_at", -1).limit(max(1, min(limit, 500)))
+    return [_route_out(r) async for r in cur]
+
+@router.get("/{rid}")
+async def get_route(rid: str):
+    db = get_db()
+    route = await db.routes.find_one(_route_filter(rid))
+    if not route:
+        raise HTTPException(404, "Route not found")
+    return _route_out(route)
+
+@router.get("/{rid}/geometry")
+async def get_route_geometry(rid: str, zoom: float | None = Query(None, ge=0, le=22)):
+    """
+    Encoded polyline (precision 5) for a route. Built from its steps on first
+    request and stored in route_geometry: the OSRM/Google polyline with
+    ROUTE_GEOMETRY_PROVIDER set, else road-following when the road graph is
+    configured, else straight stop-to-stop segments (`source` says which).
+    With zoom, the shape is simplified to about one pixel.
+    """
+    db = get_db()
+    route = await db.routes.find_one(_route_filter(rid), {"steps": 1, "geometry_id": 1})
+    if not route:
+        raise HTTPException(404, "Route not found")
+
+    geo = None
+    if route.get("geometry_id"):
+        geo = await db.route_geometry.find_one({"_id": route["geometry_id"]})
+    if not geo:
+        steps = route.get("steps") or []
+        line, source = await route_geometry(steps)
+        # upsert keyed on route_id so concurrent first requests store one document
+        geo = await db.route_geometry.find_one_and_update(
+            {"route_id": route["_id"]},
+            {"$setOnInsert": {"route_id": route["_id"], "polyline": line, "precision": 5,
+                              "source": source, "created_at": _utcnow()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        await db.routes.update_one({"_id": route["_id"]}, {"$set": {"geometry_id": geo["_id"]}})
+
+    line = geo["polyline"]
+    pts = decode_polyline(line)
+    if zoom is not None and len(pts) > 2:
+        lat0 = sum(p[0] for p in pts) / len(pts)
+        pts = simplify_polyline(pts, tolerance_for_zoom(zoom, lat0))
+        line = encode_polyline(pts)
+    return {
+        "route_id": str(route["_id"]),
+        "polyline": line,
+        "precision": 5,
+        "points": len(pts),
+        "zoom": zoom,
+        "source": geo.get("source"),
+    }
@@ -0,0 +1,158 @@
+# app/services/batch_opt.py
+"""
+Per-batch route improvement for plan_from_matches, run in a process pool.
+
+A batch is visited depot → pickups → drops → depot. Each leg is improved
+separately with route_opt.improve (2-opt + Or-opt). The open path is turned
+into a closed tour by pinning an edge between its two ends with a large
+negative weight:
+
+    pickups: depot … last pickup, pinned to the drops' centroid
+    drops:   last pickup … last drop, pinned back to the depot
+
+Workers only see plain lists of (lat, lng) and return index orders, so jobs
+pickle cheaply. Deadlines are wall-clock (time.time()) because perf_counter
+values mean nothing across processes.
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.route_opt import haversine_matrix, improve
+
+Point = Tuple[float, float]
+
+ROUTE_OPT_WORKERS = int(os.getenv("ROUTE_OPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_PIN = -1e6
+_MIN_JOB_S = 0.05
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _improve_path(start: Point, pts: Sequence[Point], end: Optional[Point], deadline: float) -> List[int]:
+    """
+    Best order of pts for a path start → pts → end (end=None: back to start).
+    pts come in their current order, which is the starting tour.
+    """
+    n = len(pts)
+    if n < 3:
+        return list(range(n))
+    nodes = [start] + list(pts) + ([end] if end is not None else [])
+    D = haversine_matrix([p[0] for p in nodes], [p[1] for p in nodes])
+    if end is not None:
+        z = n + 1
+        D[0, z] = D[z, 0] = _PIN
+        tour = np.array(list(range(n + 2)) + [0], dtype=np.int64)
+    else:
+        tour = np.array(list(range(n + 1)) + [0], dtype=np.int64)
+    best = improve(D, tour, time.perf_counter() + max(0.0, deadline - time.time()))
+    if end is not None and best[1] == n + 1:
+        best = best[::-1]
+    return [int(v) - 1 for v in best[1:-1] if 1 <= v <= n]
+
+
+def improve_batch(
+    depot: Point,
+    picks: Sequence[Point],
+    drops: Sequence[Point],
+    deadline: float,
+) -> Optional[Tuple[List[int], List[int]]]:
+    """(pickup order, drop order) for one batch, or None when the deadline already passed."""
+    if time.time() >= deadline:
+        return None
+    if drops:
+        hub = (float(np.mean([p[0] for p in drops])), float(np.mean([p[1] for p in drops])))
+        pick_order = _improve_path(depot, picks, hub, deadline)
+    else:
+        pick_order = _improve_path(depot, picks, None, deadline)
+    start = picks[pick_order[-1]] if picks else depot
+    drop_order = _improve_path(start, drops, depot if picks else None, deadline)
+    return pick_order, drop_order
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared worker pool; None when ROUTE_OPT_WORKERS=0 (jobs then run in threads)."""
+    global _pool
+    if _pool is None and ROUTE_OPT_WORKERS > 0:
+        # spawn, not fork: the server process has running threads and an event loop
+        _pool = ProcessPoolExecutor(ROUTE_OPT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def iter_improved(
+    depot: Point,
+    batches: Sequence[Tuple[Sequence[Point], Sequence[Point]]],
+    budget_s: float,
+) -> AsyncIterator[Tuple[int, Optional[Tuple[List[int], List[int]]]]]:
+    """
+    Improve every (picks, drops) batch within budget_s seconds overall, yielding
+    (batch index, result) as each one finishes. Every index is yielded once; None
+    means "keep the construction order" (too small to bother, out of time, or the
+    worker failed). Batches too small to improve come first.
+    """
+    todo = [i for i, (p, d) in enumerate(batches) if len(p) >= 3 or len(d) >= 3] if budget_s > 0 else []
+    todo_set = set(todo)
+    for i in range(len(batches)):
+        if i not in todo_set:
+            yield i, None
+    if not todo:
+        return
+
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+    lanes = max(1, ROUTE_OPT_WORKERS)
+    t0 = time.time()
+    overall = t0 + budget_s
+    # fair share per job, so one huge batch cannot starve the queue behind it
+    share = max(_MIN_JOB_S, budget_s * lanes / len(todo))
+    futs = {
+        loop.run_in_executor(pool, improve_batch, depot, list(batches[i][0]), list(batches[i][1]),
+                             min(overall, t0 + share * (k // lanes + 1))): i
+        for k, i in enumerate(todo)
+    }
+    pending = set(futs)
+    try:
+        # a little grace for the last jobs to report back
+        grace = overall + 0.5
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, grace - time.time()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                ok = not f.cancelled() and f.exception() is None
+                yield futs[f], (f.result() if ok else None)
+        for f in pending:
+            yield futs[f], None
+    finally:
+        # client went away or we ran out of time: drop whatever has not started
+        for f in futs:
+            if not f.done():
+                f.cancel()
+
+
+async def improve_batches(
+    depot: Point,
+    batches: Sequence[Tuple[Sequence[Point], Sequence[Point]]],
+    budget_s: float,
+) -> List[Optional[Tuple[List[int], List[int]]]]:
+    """Results of iter_improved aligned with `batches`."""
+    out: List[Optional[Tuple[List[int], List[int]]]] = [None] * len(batches)
+    async for i, res in iter_improved(depot, batches, budget_s):
+        out[i] = res
+    return out
@@ -0,0 +1,183 @@
+# app/services/clustering.py
+"""
+Capacity-constrained geographic clustering (the "cluster first" half of
+cluster-first, route-second planning).
+
+Points are feature rows in a local km plane (see project_km). For pickup/drop
+pairs a row is [pick_x, pick_y, drop_x, drop_y], so a cluster keeps both ends
+close. Every point has a demand, and no cluster may exceed `capacity` unless
+a single point is already bigger than that, in which case it gets a cluster
+to itself.
+
+  capacitated_kmeans  Lloyd iterations where the assignment step fills the
+                      nearest centroid that still has room. High-regret
+                      points go first. All distances are one numpy op per
+                      iteration.
+  sweep               polar sweep around an origin (the depot). It cuts a
+                      new cluster whenever the next point would overflow.
+                      Cheap and good when the depot sits inside the area.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_KM_PER_DEG = 111.32
+_EPS = 1e-9
+
+
+def project_km(lat: Sequence[float], lng: Sequence[float], lat0: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to km around lat0 (default: mean latitude)."""
+    la = np.asarray(lat, dtype=np.float64)
+    ln = np.asarray(lng, dtype=np.float64)
+    if lat0 is None:
+        lat0 = float(la.mean()) if la.size else 0.0
+    return ln * _KM_PER_DEG * math.cos(math.radians(lat0)), la * _KM_PER_DEG
+
+
+def groups(labels: np.ndarray) -> List[List[int]]:
+    """Indices per cluster, clusters ordered by label."""
+    labels = np.asarray(labels)
+    if labels.size == 0:
+        return []
+    order = np.argsort(labels, kind="stable")
+    cuts = np.flatnonzero(np.diff(labels[order])) + 1
+    return [part.tolist() for part in np.split(order, cuts)]
+
+
+def _compact(labels: np.ndarray) -> np.ndarray:
+    _, inv = np.unique(labels, return_inverse=True)
+    return inv.reshape(-1).astype(np.int64)
+
+
+def _sq_dist(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    return ((X[:, None, :] - C[None, :, :]) ** 2).sum(axis=2)
+
+
+def _kpp_init(X: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means++ seeding."""
+    n = X.shape[0]
+    centers = [X[int(rng.integers(n))]]
+    d2 = ((X - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = float(d2.sum())
+        if total <= _EPS:
+            break
+        i = int(rng.choice(n, p=d2 / total))
+        centers.append(X[i])
+        d2 = np.minimum(d2, ((X - X[i]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def _assign(X: np.ndarray, C: np.ndarray, demand: np.ndarray, capacity: float) -> np.ndarray:
+    D = _sq_dist(X, C)
+    k = C.shape[0]
+    rank = np.argsort(D, axis=1)
+    if k > 1:
+        part = np.partition(D, 1, axis=1)
+        regret = part[:, 1] - part[:, 0]
+    else:
+        regret = np.zeros(X.shape[0])
+    # points that lose the most by missing their nearest centroid choose first;
+    # ties go to the heavier point (harder to place later)
+    order = np.lexsort((-demand, -regret))
+
+    load = np.zeros(k)
+    labels = np.full(X.shape[0], -1, dtype=np.int64)
+    extra: List[Tuple[np.ndarray, float]] = []  # clusters opened on overflow: (seed point, load)
+    for i in order:
+        dem = demand[i]
+        for c in rank[i]:
+            if load[c] + dem <= capacity + _EPS:
+                labels[i] = c
+                load[c] += dem
+                break
+        else:
+            # no centroid has room: nearest overflow cluster with room, else open one
+            best, best_d = -1, math.inf
+            for j, (seed, ld) in enumerate(extra):
+                d = float(((X[i] - seed) ** 2).sum())
+                if ld + dem <= capacity + _EPS and d < best_d:
+                    best, best_d = j, d
+            if best < 0:
+                extra.append((X[i], dem))
+                best = len(extra) - 1
+            else:
+                extra[best] = (extra[best][0], extra[best][1] + dem)
+            labels[i] = k + best
+    return labels
+
+
+def capacitated_kmeans(
+    X: np.ndarray,
+    demand: Sequence[float],
+    capacity: float,
+    k: Optional[int] = None,
+    fill: float = 0.9,
+    max_iter: int = 20,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Cluster label per row of X. `k` defaults to total demand over
+    (capacity * fill); the slack lets the assignment respect geography
+    instead of packing every cluster to the brim.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    dem = np.asarray(demand, dtype=np.float64)
+    n = X.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if k is None:
+        # an oversized point fills one vehicle on its own, however big it is
+        k = int(math.ceil(float(np.minimum(dem, capacity).sum()) / max(capacity * fill, _EPS)))
+    k = max(1, min(int(k), n))
+    rng = np.random.default_rng(seed)
+    C = _kpp_init(X, k, rng)
+
+    best, best_sse = None, math.inf
+    labels = None
+    for _ in range(max_iter):
+        new = _compact(_assign(X, C, dem, capacity))
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        m = int(labels.max()) + 1
+        C = np.zeros((m, X.shape[1]))
+        np.add.at(C, labels, X)
+        C /= np.bincount(labels, minlength=m)[:, None]
+        # capacity makes Lloyd non-monotone, so keep the best labelling seen
+        sse = float(((X - C[labels]) ** 2).sum())
+        if sse < best_sse - _EPS:
+            best, best_sse = labels, sse
+    return best if best is not None else labels
+
+
+def sweep(X: np.ndarray, demand: Sequence[float], capacity: float, origin: Tuple[float, float]) -> np.ndarray:
+    """
+    Cluster label per row of X (only the first two columns are used) by sweeping
+    the polar angle around `origin`. The sweep starts at the widest angular gap
+    so no cluster straddles it.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    dem = np.asarray(demand, dtype=np.float64)
+    n = X.shape[0]
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    ang = np.arctan2(X[:, 1] - origin[1], X[:, 0] - origin[0])
+    order = np.argsort(ang, kind="stable")
+    a = ang[order]
+    gaps = np.diff(np.append(a, a[0] + 2.0 * math.pi))
+    start = (int(np.argmax(gaps)) + 1) % n
+    order = np.roll(order, -start)
+
+    labels = np.empty(n, dtype=np.int64)
+    c, load = 0, 0.0
+    for i in order.tolist():
+        if load > 0 and load + dem[i] > capacity + _EPS:
+            c += 1
+            load = 0.0
+        labels[i] = c
+        load += dem[i]
+    return labels
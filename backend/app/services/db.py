@@ -1,8 +1,8 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+# app/services/db.py
+# Shared handles from app/core/mongo.py (no client of its own)
+from app.core.mongo import get_client, get_db
 
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.foodbridge          # 👈 database name: foodbridge
+client = get_client()
+db = get_db()                   # 👈 database name: MONGODB_DB (foodbridge)
 routes_col = db.routes          # 👈 collection name: routes
 users_col = db.users
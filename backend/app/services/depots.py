@@ -0,0 +1,66 @@
+# app/services/depots.py
+"""
+Depot (hub) assignment for multi-depot planning.
+
+Each match costs depot → pickup plus drop → depot at a given hub; the
+pickup → drop leg is the same wherever it is served from, so it is left
+out. The (matches × depots) cost matrix is one vectorized haversine per
+depot (route_opt's, so depot and route km agree), and without capacities
+the assignment is a single argmin.
+
+With per-depot capacities (e.g. the kg its fleet can carry), a depot
+that would be overfilled keeps its cheapest matches and the rest spill
+to their next-best depot, in order of regret (how much more the next
+depot costs), so matches with a clear favourite keep it.
+"""
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.services.route_opt import haversine_to
+
+
+def depot_costs(pick: np.ndarray, drop: np.ndarray, depots: np.ndarray) -> np.ndarray:
+    """(M, K) km of depot → pick plus drop → depot; pick/drop are (M, 2), depots (K, 2) lat/lng."""
+    pick = np.asarray(pick, dtype=np.float64).reshape(-1, 2)
+    drop = np.asarray(drop, dtype=np.float64).reshape(-1, 2)
+    dep = np.asarray(depots, dtype=np.float64).reshape(-1, 2)
+    out = np.empty((pick.shape[0], dep.shape[0]))
+    # same great-circle helper (and Earth radius) as the route km
+    for k, (la, ln) in enumerate(dep):
+        out[:, k] = haversine_to(pick[:, 0], pick[:, 1], la, ln) + haversine_to(drop[:, 0], drop[:, 1], la, ln)
+    return out
+
+
+def assign_depots(
+    cost: np.ndarray,
+    demand: Optional[Sequence[float]] = None,
+    capacity: Optional[Sequence[float]] = None,
+) -> np.ndarray:
+    """Depot index per match: cheapest depot, respecting capacity (inf = unlimited) where given."""
+    cost = np.asarray(cost, dtype=np.float64)
+    M, K = cost.shape
+    labels = cost.argmin(axis=1) if K else np.zeros(M, dtype=np.int64)
+    if capacity is None or demand is None or K < 2:
+        return labels
+    dem = np.asarray(demand, dtype=np.float64)
+    cap = np.asarray(capacity, dtype=np.float64)
+    if (np.bincount(labels, weights=dem, minlength=K) <= cap + 1e-9).all():
+        return labels
+
+    # regret = second-best minus best; most-regret matches choose first
+    ranked = np.argsort(cost, axis=1)
+    rows = np.arange(M)
+    regret = cost[rows, ranked[:, 1]] - cost[rows, ranked[:, 0]]
+    left = cap.copy()
+    for i in np.argsort(-regret, kind="stable"):
+        for k in ranked[i]:
+            if dem[i] <= left[k] + 1e-9:
+                labels[i] = k
+                left[k] -= dem[i]
+                break
+        else:
+            labels[i] = ranked[i, 0]  # fits nowhere: cheapest depot, packed as an extra bin
+    return labels
@@ -0,0 +1,262 @@
+# app/services/gazetteer.py
+"""
+Offline geocoder over a local gazetteer of our service area.
+
+The gazetteer is a CSV (GAZETTEER_PATH) with a header and one place per row:
+
+    name,lat,lng,kind,locality
+    Ayala Avenue,14.5547,121.0244,street,Makati
+    Barangay San Lorenzo,14.5512,121.0245,barangay,Makati
+    SM Megamall,14.5849,121.0563,landmark,Mandaluyong
+
+(kind and locality are optional). Names go through the same
+normalize_address() as the geocode cache keys, so abbreviations, accents and
+punctuation don't matter.
+
+Index, all flat arrays built once at load:
+
+  vocab      sorted unique tokens; a prefix is a bisect range over it (what
+             a prefix trie answers, without a node object per character)
+  postings   token → entry ids, CSR (offsets + one int32 array), separately
+             for name tokens and locality tokens
+  deletes    token with one character dropped → tokens, for typo matching
+             (symmetric-delete edit distance 1)
+
+A query is tokenized; each token matches the vocab exactly, else by one edit
+(len ≥ 4), else by prefix (len ≥ 3). Candidates are the postings of the
+matched *rare* tokens plus the few entries that could qualify on common
+tokens ("street", a city name) alone, so a query never walks the long
+postings lists; those are only binary-searched for the candidates. Matched
+tokens add their idf to the candidates containing them. An entry qualifies when the query
+covers at least GAZETTEER_MIN_SCORE of its name (idf-weighted), and the
+qualifying entry with the most matched weight wins; locality tokens only add
+weight, so "Rizal St, Pasig" picks the Pasig Rizal Street. Unknown query
+tokens (house numbers, "unit 5b") are ignored rather than penalized.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import math
+import os
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.geocode_cache import normalize_address
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH")
+GAZETTEER_MIN_SCORE = float(os.getenv("GAZETTEER_MIN_SCORE", "0.75"))
+
+_TYPO_SIM = 0.8
+_PREFIX_LIMIT = 16
+_COMMON_SHARE = 0.01  # tokens in more than this share of places are "common"
+
+LatLng = Tuple[float, float]
+
+
+def _deletes(tok: str) -> List[str]:
+    return [tok[:i] + tok[i + 1:] for i in range(len(tok))]
+
+
+def _one_edit(a: str, b: str) -> bool:
+    """Damerau-Levenshtein distance(a, b) <= 1."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        return a[i + 1:] == b[i + 1:] or (a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:])
+    return a[i + 1:] == b[i:] if la > lb else a[i:] == b[i + 1:]
+
+
+def _member(cands: np.ndarray, postings: np.ndarray) -> np.ndarray:
+    """Mask of the sorted candidate ids that appear in a sorted postings list."""
+    if postings.size == 0:
+        return np.zeros(cands.size, dtype=bool)
+    idx = np.minimum(np.searchsorted(postings, cands), postings.size - 1)
+    return postings[idx] == cands
+
+
+def _csr(lists: Sequence[Iterable[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    sizes = np.fromiter((len(x) for x in lists), dtype=np.int64, count=len(lists))
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    flat = np.fromiter((i for x in lists for i in x), dtype=np.int32, count=int(offsets[-1]))
+    return offsets, flat
+
+
+class Gazetteer:
+    """Fuzzy address → (lat, lng) over a fixed list of places."""
+
+    def __init__(self, names: Sequence[str], lat: Sequence[float], lng: Sequence[float],
+                 kinds: Optional[Sequence[str]] = None, localities: Optional[Sequence[str]] = None):
+        n = len(names)
+        self.names = list(names)
+        self.kinds = list(kinds) if kinds is not None else [""] * n
+        self.localities = list(localities) if localities is not None else [""] * n
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+
+        name_toks = [sorted(set(normalize_address(s).split())) for s in self.names]
+        loc_toks = [sorted(set(normalize_address(s).split()) - set(nt))
+                    for s, nt in zip(self.localities, name_toks)]
+        self.vocab: List[str] = sorted({t for ts in name_toks + loc_toks for t in ts})
+        tid = {t: i for i, t in enumerate(self.vocab)}
+
+        name_post: List[List[int]] = [[] for _ in self.vocab]
+        loc_post: List[List[int]] = [[] for _ in self.vocab]
+        for e, ts in enumerate(name_toks):
+            for t in ts:
+                name_post[tid[t]].append(e)
+        for e, ts in enumerate(loc_toks):
+            for t in ts:
+                loc_post[tid[t]].append(e)
+        self._name_off, self._name_ids = _csr(name_post)
+        self._loc_off, self._loc_ids = _csr(loc_post)
+
+        df = np.array([len(a) + len(b) for a, b in zip(name_post, loc_post)], dtype=np.float64)
+        self.idf = np.log1p(max(n, 1) / np.maximum(df, 1.0))
+        self._name_weight = np.array([sum(self.idf[tid[t]] for t in ts) for ts in name_toks], dtype=np.float64)
+
+        # common tokens are never expanded into candidates; entries whose name
+        # could reach GAZETTEER_MIN_SCORE on common tokens alone always are
+        self._common = df > max(32.0, _COMMON_SHARE * n)
+        common_w = np.array([sum(self.idf[tid[t]] for t in ts if self._common[tid[t]]) for ts in name_toks],
+                            dtype=np.float64)
+        self._common_only = np.flatnonzero(common_w >= GAZETTEER_MIN_SCORE * self._name_weight - 1e-12).astype(np.int32)
+
+        self._tid = tid
+        deletes: Dict[str, List[int]] = defaultdict(list)
+        for i, t in enumerate(self.vocab):
+            if len(t) >= 4 and not t.isdigit():
+                for d in _deletes(t):
+                    deletes[d].append(i)
+        self._deletes = dict(deletes)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # ---- query
+    def _token_matches(self, q: str) -> Dict[int, float]:
+        """vocab id → similarity for one query token."""
+        i = self._tid.get(q)
+        if i is not None:
+            return {i: 1.0}
+        if q.isdigit():
+            return {}  # house numbers only match exactly
+        out: Dict[int, float] = {}
+        if len(q) >= 4:
+            cands = set(self._deletes.get(q, ()))
+            for d in _deletes(q):
+                j = self._tid.get(d)
+                if j is not None:
+                    cands.add(j)
+                cands.update(self._deletes.get(d, ()))
+            for j in cands:
+                if _one_edit(q, self.vocab[j]):
+                    out[j] = _TYPO_SIM
+        if not out and len(q) >= 3:
+            lo = bisect_left(self.vocab, q)
+            hi = bisect_left(self.vocab, q + "\uffff")
+            for j in range(lo, min(hi, lo + _PREFIX_LIMIT)):
+                out[j] = 0.9 * len(q) / len(self.vocab[j])
+        return out
+
+    def search(self, address: str, limit: int = 5) -> List[Dict[str, object]]:
+        """Best qualifying places for an address, highest score first."""
+        if not len(self):
+            return []
+        best: Dict[int, float] = {}
+        for q in normalize_address(address).split():
+            for j, s in self._token_matches(q).items():
+                if s > best.get(j, 0.0):
+                    best[j] = s
+        if not best:
+            return []
+
+        parts = [self._common_only]
+        for j in best:
+            if not self._common[j]:
+                parts.append(self._name_ids[self._name_off[j]:self._name_off[j + 1]])
+        cands = np.unique(np.concatenate(parts))
+        if cands.size == 0:
+            return []
+        name_score = np.zeros(cands.size)
+        loc_score = np.zeros(cands.size)
+        for j, s in best.items():
+            w = self.idf[j] * s
+            name_score += w * _member(cands, self._name_ids[self._name_off[j]:self._name_off[j + 1]])
+            loc_score += w * _member(cands, self._loc_ids[self._loc_off[j]:self._loc_off[j + 1]])
+
+        coverage = name_score / np.maximum(self._name_weight[cands], 1e-12)
+        total = np.where(coverage >= GAZETTEER_MIN_SCORE, name_score + loc_score, 0.0)
+        k = min(limit, int(np.count_nonzero(total)))
+        if k == 0:
+            return []
+        top = np.argpartition(-total, k - 1)[:k]
+        top = top[np.argsort(-total[top], kind="stable")]
+        return [{"name": self.names[e], "kind": self.kinds[e], "locality": self.localities[e],
+                 "lat": float(self.lat[e]), "lng": float(self.lng[e]),
+                 "score": round(float(total[i]), 4), "coverage": round(float(min(coverage[i], 1.0)), 4)}
+                for i, e in ((i, int(cands[i])) for i in top)]
+
+    def lookup(self, address: str) -> Optional[LatLng]:
+        """(lat, lng) of the best match, or None."""
+        hits = self.search(address, limit=1)
+        return (hits[0]["lat"], hits[0]["lng"]) if hits else None
+
+    # ---- I/O
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        names, lat, lng, kinds, locs = [], [], [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    la, ln = float(row["lat"]), float(row["lng"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if not (row.get("name") or "").strip() or not (math.isfinite(la) and math.isfinite(ln)):
+                    continue
+                names.append(row["name"].strip()); lat.append(la); lng.append(ln)
+                kinds.append((row.get("kind") or "").strip()); locs.append((row.get("locality") or "").strip())
+        return cls(names, lat, lng, kinds, locs)
+
+
+_gazetteer: Optional[Gazetteer] = None
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def get_gazetteer() -> Optional[Gazetteer]:
+    """
+    Gazetteer from GAZETTEER_PATH, or None when it isn't configured. Built
+    once per process; callers arriving during the build wait for it.
+    Blocking: async code uses aget_gazetteer().
+    """
+    global _gazetteer, _loaded
+    if not _loaded:
+        with _load_lock:
+            if not _loaded:
+                if GAZETTEER_PATH and os.path.isfile(GAZETTEER_PATH):
+                    _gazetteer = Gazetteer.load(GAZETTEER_PATH)
+                _loaded = True
+    return _gazetteer
+
+
+def gazetteer_loaded() -> bool:
+    return _loaded
+
+
+async def aget_gazetteer() -> Optional[Gazetteer]:
+    """get_gazetteer() that waits for (or runs) the build in a thread, never on the event loop."""
+    if _loaded:
+        return _gazetteer
+    return await asyncio.to_thread(get_gazetteer)
@@ -0,0 +1,204 @@
+# app/services/geo_backfill.py
+"""
+Background migration that repairs legacy location/geo fields.
+
+Replaces the serial backfill the app used to run in its lifespan before it
+accepted requests. Each collection is walked in _id order, GEO_BACKFILL_BATCH
+documents at a time:
+
+  - valid location        → geo Point set from it
+  - address, no coords    → handed to the geocode queue (geo_pending + a job in
+                            geocode_jobs); the geocode worker resolves them
+                            concurrently, rate limited and deduped by address
+  - neither               → bogus geo removed
+
+Updates go out as one bulk_write per batch, and after every batch a
+checkpoint lands in `migrations`:
+
+    {_id: "geo_backfill:<collection>", status: running|done|failed, last_id,
+     scanned, located, queued, cleared, batches, started_at, updated_at,
+     finished_at, [error]}
+
+so a restart resumes after last_id instead of starting over. When a
+collection is clean its 2dsphere index is built (legacy junk in geo would
+make the build fail, which is why it used to wait for the backfill).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import GEOSPHERE, UpdateOne
+
+from app.services import geocode_worker, versions
+from app.services.geo_enrich import _address_to_geocode, _valid
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS = "migrations"
+COLLECTIONS = ("donations", "requests")
+GEO_BACKFILL_BATCH = int(os.getenv("GEO_BACKFILL_BATCH", "500"))
+
+# documents whose geo is missing or malformed (and not already queued)
+NEEDS_GEO = {
+    "geo_pending": {"$ne": True},
+    "$or": [
+        {"geo": {"$exists": False}},
+        {"geo.type": {"$ne": "Point"}},
+        {"geo.coordinates": {"$not": {"$type": "array"}}},
+        {"geo.coordinates": [0, 0]},
+    ],
+}
+
+_task: Optional[asyncio.Task] = None
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _ckpt_id(collection: str) -> str:
+    return f"geo_backfill:{collection}"
+
+
+def _fields(ckpt: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in ckpt.items() if k != "_id"}
+
+
+def plan_batch(collection: str, docs: List[Dict[str, Any]]):
+    """(doc updates, geocode jobs, counts) for one batch; pure, no I/O."""
+    ops: List[UpdateOne] = []
+    jobs: List[Dict[str, Any]] = []
+    counts = {"located": 0, "queued": 0, "cleared": 0}
+    for doc in docs:
+        loc = doc.get("location") or {}
+        if _valid(loc.get("lat"), loc.get("lng")):
+            lat, lng = float(loc["lat"]), float(loc["lng"])
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+                "location": {"lat": lat, "lng": lng},
+                "geo": {"type": "Point", "coordinates": [lng, lat]},
+            }}))
+            counts["located"] += 1
+            continue
+        addr = _address_to_geocode(doc)
+        if addr:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"geo_pending": True}, "$unset": {"geo": ""}}))
+            jobs.append(geocode_worker.job_doc(collection, doc["_id"], addr))
+            counts["queued"] += 1
+        else:
+            # no address; ensure we don't leave a bogus geo
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$unset": {"geo": ""}}))
+            counts["cleared"] += 1
+    return ops, jobs, counts
+
+
+async def _ensure_geo_index(col) -> None:
+    if "geo_2dsphere" not in [ix["name"] async for ix in col.list_indexes()]:
+        await col.create_index([("geo", GEOSPHERE)], name="geo_2dsphere")
+
+
+async def run_collection(db, collection: str, batch: int = GEO_BACKFILL_BATCH) -> Dict[str, Any]:
+    """Backfill one collection from its checkpoint; returns the final checkpoint."""
+    mig, col = db[MIGRATIONS], db[collection]
+    ckpt = await mig.find_one({"_id": _ckpt_id(collection)})
+    if ckpt and ckpt.get("status") == "done":
+        await _ensure_geo_index(col)
+        return ckpt
+    if not ckpt:
+        ckpt = {"_id": _ckpt_id(collection), "last_id": None, "scanned": 0, "located": 0,
+                "queued": 0, "cleared": 0, "batches": 0, "started_at": _utcnow()}
+    ckpt["status"] = "running"
+    ckpt.pop("error", None)
+
+    try:
+        await mig.update_one({"_id": ckpt["_id"]}, {"$set": _fields(ckpt), "$unset": {"error": ""}}, upsert=True)
+        while True:
+            q = dict(NEEDS_GEO)
+            if ckpt["last_id"] is not None:
+                q["_id"] = {"$gt": ckpt["last_id"]}
+            docs = await col.find(q, {"location": 1, "address": 1}).sort("_id", 1).limit(batch).to_list(length=batch)
+            if not docs:
+                break
+            ops, jobs, counts = plan_batch(collection, docs)
+            if jobs:
+                # jobs first: a crash before the doc updates only leaves a duplicate job behind
+                await db[geocode_worker.JOBS].insert_many(jobs, ordered=False)
+            if ops:
+                await col.bulk_write(ops, ordered=False)
+                await versions.bump(db, collection)
+            if jobs:
+                geocode_worker.notify()
+
+            ckpt["last_id"] = docs[-1]["_id"]
+            ckpt["scanned"] += len(docs)
+            ckpt["batches"] += 1
+            for k, v in counts.items():
+                ckpt[k] += v
+            ckpt["updated_at"] = _utcnow()
+            await mig.update_one({"_id": ckpt["_id"]}, {"$set": _fields(ckpt)})
+
+        await _ensure_geo_index(col)
+        ckpt.update(status="done", finished_at=_utcnow())
+    except asyncio.CancelledError:
+        raise  # stays "running"; the next start resumes from last_id
+    except Exception as ex:
+        log.exception("geo backfill of %s failed", collection)
+        ckpt.update(status="failed", error=f"{type(ex).__name__}: {ex}")
+    try:
+        await mig.update_one({"_id": ckpt["_id"]}, {"$set": _fields(ckpt)}, upsert=True)
+    except Exception:
+        log.exception("could not save geo backfill checkpoint for %s", collection)
+    return ckpt
+
+
+async def run(db) -> None:
+    await asyncio.gather(*(run_collection(db, c) for c in COLLECTIONS))
+
+
+def start(db) -> asyncio.Task:
+    """Run (or resume) the backfill in the background; the app doesn't wait for it."""
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run(db), name="geo-backfill")
+    return _task
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+
+
+def running() -> bool:
+    return _task is not None and not _task.done()
+
+
+async def progress(db) -> Dict[str, Any]:
+    """Checkpoint per collection plus how many documents still need a geo."""
+    out: Dict[str, Any] = {"running": running(), "collections": {}}
+    for c in COLLECTIONS:
+        ckpt = await db[MIGRATIONS].find_one({"_id": _ckpt_id(c)}) or {"status": "not_started", "last_id": None}
+        q = dict(NEEDS_GEO)
+        if ckpt.get("last_id") is not None:
+            q["_id"] = {"$gt": ckpt["last_id"]}
+        info = {k: v for k, v in ckpt.items() if k not in ("_id", "last_id")}
+        info["last_id"] = str(ckpt["last_id"]) if ckpt.get("last_id") is not None else None
+        info["remaining"] = await db[c].count_documents(q) if ckpt.get("status") != "done" else 0
+        info["pending_geocode"] = await db[c].count_documents({"geo_pending": True})
+        out["collections"][c] = info
+    return out
+
+
+async def restart(db) -> asyncio.Task:
+    """Forget the checkpoints and walk both collections again (e.g. after a bulk import)."""
+    await stop()
+    await db[MIGRATIONS].delete_many({"_id": {"$in": [_ckpt_id(c) for c in COLLECTIONS]}})
+    return start(db)
@@ -1,41 +1,55 @@
 # app/services/geo_enrich.py
-from typing import Dict, Any
-from app.core.geocode import geocode_address, GeocodeError
+from typing import Dict, Any, Optional, Tuple
+from app.core.geocode import geocode_address, geocode_address_async, GeocodeError
 
-def ensure_location_and_geo(doc: Dict[str, Any]) -> Dict[str, Any]:
-    addr = (doc.get("address") or "").strip()
+def _valid(x, y) -> bool:
+    try:
+        x = float(x); y = float(y)
+        return x is not None and y is not None and not (x == 0.0 and y == 0.0)
+    except Exception:
+        return False
+
+def _address_to_geocode(doc: Dict[str, Any]) -> Optional[str]:
+    """The address to look up when the doc has no usable coords, else None."""
     loc = doc.get("location") or {}
-    lat = loc.get("lat"); lng = loc.get("lng")
+    if _valid(loc.get("lat"), loc.get("lng")):
+        return None
+    return (doc.get("address") or "").strip() or None
 
-    def valid(x, y):
-        try:
-            x = float(x); y = float(y)
-            return x is not None and y is not None and not (x == 0.0 and y == 0.0)
-        except Exception:
-            return False
+def _finish(doc: Dict[str, Any], coords: Optional[Tuple[float, float]] = None, error: Optional[str] = None) -> Dict[str, Any]:
+    loc = doc.get("location") or {}
+    if coords is None and _valid(loc.get("lat"), loc.get("lng")):
+        coords = (loc["lat"], loc["lng"])
+    if coords is not None:
+        # valid coords (given or geocoded): normalize & set geo
+        lat, lng = float(coords[0]), float(coords[1])
+        doc["location"] = {"lat": lat, "lng": lng}
+        doc["geo"] = {"type": "Point", "coordinates": [lng, lat]}
+        doc.pop("_geocode_error", None)
+        return doc
+    if error is not None:
+        # No good geocode: DO NOT set geo to [0,0]
+        doc.setdefault("_geocode_error", error)
+    # No address to geocode: keep as-is, but ensure no bogus geo
+    doc.pop("geo", None)
+    return doc
 
-    # If coords are invalid → try geocoding from address
-    if not valid(lat, lng):
-        if addr:
-            try:
-                glat, glng = geocode_address(addr)
-                doc["location"] = {"lat": float(glat), "lng": float(glng)}
-                doc["geo"] = {"type": "Point", "coordinates": [float(glng), float(glat)]}
-                doc.pop("_geocode_error", None)
-                return doc
-            except GeocodeError as ex:
-                # No good geocode: DO NOT set geo to [0,0]
-                doc.setdefault("_geocode_error", str(ex))
-                doc.pop("geo", None)
-                return doc
-        else:
-            # No address to geocode: keep as-is, but ensure no bogus geo
-            doc.pop("geo", None)
-            return doc
+def ensure_location_and_geo(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Blocking; for sync code such as the pymongo donations API (run in FastAPI's threadpool)."""
+    addr = _address_to_geocode(doc)
+    if not addr:
+        return _finish(doc)
+    try:
+        return _finish(doc, geocode_address(addr))
+    except GeocodeError as ex:
+        return _finish(doc, error=str(ex))
 
-    # If coords are valid, normalize & set geo
-    lat = float(lat); lng = float(lng)
-    doc["location"] = {"lat": lat, "lng": lng}
-    doc["geo"] = {"type": "Point", "coordinates": [lng, lat]}
-    doc.pop("_geocode_error", None)
-    return doc
+async def ensure_location_and_geo_async(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Same as ensure_location_and_geo for async code; never blocks the event loop."""
+    addr = _address_to_geocode(doc)
+    if not addr:
+        return _finish(doc)
+    try:
+        return _finish(doc, await geocode_address_async(addr))
+    except GeocodeError as ex:
+        return _finish(doc, error=str(ex))
@@ -0,0 +1,113 @@
+# app/services/geo_repair.py
+"""
+Bulk repair of missing/bogus location+geo, behind POST /admin/fix/geos.
+
+For each collection, candidates (geo_backfill.NEEDS_GEO) are read in _id
+order, FIX_GEOS_CHUNK at a time, with a projection of just location and
+address. Per chunk:
+
+  - documents with valid coordinates get their geo Point directly
+  - the remaining addresses are deduped by normalize_address(); each
+    distinct one is geocoded once per run, concurrently (GEOCODE_WORKERS)
+    and paced like the geocode queue (GEOCODE_RATE_PER_S provider calls/s;
+    gazetteer and cache hits are free)
+  - all updates go out as one bulk_write
+
+repair() yields a progress dict after every chunk and a summary at the end,
+so the admin endpoint can stream them.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.services.geo_backfill import COLLECTIONS, NEEDS_GEO
+from app.services.geo_enrich import _address_to_geocode, _valid
+from app.services.geocode_cache import normalize_address
+from app.services import versions
+from app.services.geocode_worker import GEOCODE_RATE_PER_S, GEOCODE_WORKERS, _RateLimiter, resolve
+
+FIX_GEOS_CHUNK = int(os.getenv("FIX_GEOS_CHUNK", "500"))
+
+Resolved = Tuple[Optional[Tuple[float, float]], Optional[str], bool]
+
+
+def _located(lat: float, lng: float) -> Dict[str, Any]:
+    return {"location": {"lat": lat, "lng": lng}, "geo": {"type": "Point", "coordinates": [lng, lat]}}
+
+
+async def _repair_chunk(db, col, docs: List[Dict[str, Any]], seen: Dict[str, Resolved],
+                        limiter: _RateLimiter, sem: asyncio.Semaphore) -> Dict[str, int]:
+    counts = {"located": 0, "geocoded": 0, "not_found": 0, "errors": 0, "skipped": 0, "lookups": 0}
+    by_key: Dict[str, List[Dict[str, Any]]] = {}
+    ops: List[UpdateOne] = []
+    for doc in docs:
+        loc = doc.get("location") or {}
+        if _valid(loc.get("lat"), loc.get("lng")):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": _located(float(loc["lat"]), float(loc["lng"])),
+                                                       "$unset": {"_geocode_error": ""}}))
+            counts["located"] += 1
+            continue
+        addr = _address_to_geocode(doc)
+        if not addr:
+            counts["skipped"] += 1  # nothing to go on
+            continue
+        by_key.setdefault(normalize_address(addr), []).append(doc)
+
+    todo = [k for k in by_key if k not in seen]
+    counts["lookups"] = len(todo)
+    results = await asyncio.gather(*(resolve(by_key[k][0]["address"], limiter, sem) for k in todo))
+    seen.update(zip(todo, results))
+
+    for key, group in by_key.items():
+        hit, err, retry = seen[key]
+        for doc in group:
+            if hit is not None:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": _located(*hit), "$unset": {"_geocode_error": ""}}))
+                counts["geocoded"] += 1
+            elif retry:
+                counts["errors"] += 1  # transient: left as is for the next run
+            else:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"_geocode_error": err}, "$unset": {"geo": ""}}))
+                counts["not_found"] += 1
+    if ops:
+        await col.bulk_write(ops, ordered=False)
+        await versions.bump(db, col.name)
+    return counts
+
+
+async def repair(db, collections: Iterable[str] = COLLECTIONS, chunk: int = FIX_GEOS_CHUNK,
+                 limiter: Optional[_RateLimiter] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Repair the collections one chunk at a time, yielding progress as it goes."""
+    started = time.perf_counter()
+    limiter = limiter or _RateLimiter(GEOCODE_RATE_PER_S)
+    sem = asyncio.Semaphore(max(1, GEOCODE_WORKERS))
+    seen: Dict[str, Resolved] = {}
+    totals: Dict[str, Dict[str, int]] = {}
+    for name in collections:
+        col = db[name]
+        tot = totals[name] = {"scanned": 0, "located": 0, "geocoded": 0, "not_found": 0,
+                              "errors": 0, "skipped": 0, "lookups": 0}
+        last_id = None
+        while True:
+            q = dict(NEEDS_GEO)
+            if last_id is not None:
+                q["_id"] = {"$gt": last_id}
+            docs = await col.find(q, {"location": 1, "address": 1}).sort("_id", 1).limit(chunk).to_list(length=chunk)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+            counts = await _repair_chunk(db, col, docs, seen, limiter, sem)
+            tot["scanned"] += len(docs)
+            for k, v in counts.items():
+                tot[k] += v
+            yield {"type": "progress", "collection": name, **tot,
+                   "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+    yield {"type": "summary",
+           "fixed": {n: t["located"] + t["geocoded"] for n, t in totals.items()},
+           "collections": totals, "distinct_addresses": len(seen),
+           "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
@@ -0,0 +1,266 @@
+# app/services/geocode_cache.py
+"""
+Two-tier cache in front of the geocoding provider.
+
+Addresses are keyed by normalize_address(): case, accents, punctuation and
+whitespace are folded and common street abbreviations expanded, so
+"123 Rizal Ave., Brgy. 5" and "123 rizal avenue barangay 5" share a key.
+
+    tier 1  in-process LRU (GEOCODE_LRU_SIZE entries)
+    tier 2  Mongo `geocode_cache` {_id: key, found, lat, lng, expires_at}
+            with a TTL index on expires_at
+
+"No such address" answers are cached too (found=False), for a shorter
+GEOCODE_NEG_TTL_S, so a bad address typed into every donation form doesn't
+hit the provider each time. Transient failures (timeouts, HTTP errors,
+missing keys) are never cached.
+
+The Mongo tier is best-effort: if the database is unreachable lookups go
+straight to the provider. lookup() is for sync callers (pymongo tier);
+alookup() is the same flow for async callers (Motor tier, async fetch).
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+GEOCODE_LRU_SIZE = int(os.getenv("GEOCODE_LRU_SIZE", "4096"))
+GEOCODE_TTL_S = float(os.getenv("GEOCODE_TTL_S", str(90 * 24 * 3600)))
+GEOCODE_NEG_TTL_S = float(os.getenv("GEOCODE_NEG_TTL_S", str(24 * 3600)))
+CACHE_COLLECTION = "geocode_cache"
+_DB_RETRY_S = 60.0  # after a Mongo error, skip that tier this long
+
+LatLng = Tuple[float, float]
+
+# whole-word expansions; keys are already lower-case and punctuation-free
+ABBREVIATIONS: Dict[str, str] = {
+    "st": "street", "str": "street", "ave": "avenue", "av": "avenue", "rd": "road",
+    "blvd": "boulevard", "dr": "drive", "hwy": "highway", "ln": "lane", "ext": "extension",
+    "cor": "corner", "bldg": "building", "flr": "floor", "fl": "floor",
+    "brgy": "barangay", "bgy": "barangay", "bo": "barrio", "pob": "poblacion",
+    "subd": "subdivision", "vill": "village", "vil": "village", "cmpd": "compound",
+    "mt": "mount", "sta": "santa", "sto": "santo", "gen": "general", "pres": "president",
+    "qc": "quezon city", "mla": "manila", "ph": "philippines", "phl": "philippines",
+    "no": "number", "nos": "numbers",
+}
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_address(address: str) -> str:
+    """Canonical form of an address for cache keys (empty string for blank input)."""
+    s = unicodedata.normalize("NFKD", address or "")
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()  # ñ → n, é → e
+    s = _PUNCT.sub(" ", s.replace("#", " number "))
+    words = [ABBREVIATIONS.get(w, w) for w in _SPACE.split(s) if w]
+    return " ".join(words)
+
+
+class NotFound(Exception):
+    """Raised by a fetch function when the provider has no result for the address."""
+
+
+class GeocodeCache:
+    """LRU → Mongo → provider lookup with hit/miss counters."""
+
+    def __init__(self, maxsize: int = GEOCODE_LRU_SIZE, ttl_s: float = GEOCODE_TTL_S,
+                 neg_ttl_s: float = GEOCODE_NEG_TTL_S, collection: Any = None, acollection: Any = None):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.neg_ttl_s = neg_ttl_s
+        self._collection = collection
+        self._acollection = acollection
+        self._lru: "OrderedDict[str, Tuple[float, Optional[LatLng]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_down_until = 0.0
+        self.counters = {"memory_hits": 0, "db_hits": 0, "negative_hits": 0,
+                         "misses": 0, "provider_errors": 0, "db_errors": 0}
+
+    # ---- tiers
+    def _col(self):
+        if self._collection is None:
+            from app.core.mongo import get_sync_db
+            self._collection = get_sync_db()[CACHE_COLLECTION]
+        return self._collection
+
+    def _acol(self):
+        if self._acollection is None:
+            from app.db import get_db
+            self._acollection = get_db()[CACHE_COLLECTION]
+        return self._acollection
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _db_failed(self) -> None:
+        self._count("db_errors")
+        self._db_down_until = time.time() + _DB_RETRY_S
+
+    def _mem_get(self, key: str) -> Tuple[bool, Optional[LatLng]]:
+        with self._lock:
+            item = self._lru.get(key)
+            if item is None:
+                return False, None
+            if item[0] <= time.time():
+                del self._lru[key]
+                return False, None
+            self._lru.move_to_end(key)
+            return True, item[1]
+
+    def _mem_put(self, key: str, value: Optional[LatLng], expires: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._lru[key] = (expires, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def _from_doc(self, doc: Optional[Dict[str, Any]]) -> Tuple[bool, Optional[LatLng], float]:
+        if not doc:
+            return False, None, 0.0
+        exp = doc.get("expires_at")
+        if exp is not None:
+            if exp.tzinfo is None:
+                exp = exp.replace(tzinfo=timezone.utc)
+            if exp <= datetime.now(timezone.utc):
+                return False, None, 0.0  # the TTL monitor runs once a minute
+        value = (float(doc["lat"]), float(doc["lng"])) if doc.get("found") else None
+        return True, value, exp.timestamp() if exp is not None else time.time() + self.ttl_s
+
+    def _to_doc(self, address: str, value: Optional[LatLng], ttl: float) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        doc = {"found": value is not None, "address": address, "created_at": now,
+               "expires_at": now + timedelta(seconds=ttl)}
+        if value is not None:
+            doc["lat"], doc["lng"] = value
+        return doc
+
+    def _db_get(self, key: str) -> Tuple[bool, Optional[LatLng], float]:
+        if time.time() < self._db_down_until:
+            return False, None, 0.0
+        try:
+            return self._from_doc(self._col().find_one({"_id": key}))
+        except Exception:
+            self._db_failed()
+            return False, None, 0.0
+
+    def _db_put(self, key: str, address: str, value: Optional[LatLng], ttl: float) -> None:
+        if time.time() < self._db_down_until:
+            return
+        try:
+            self._col().update_one({"_id": key}, {"$set": self._to_doc(address, value, ttl)}, upsert=True)
+        except Exception:
+            self._db_failed()
+
+    async def _adb_get(self, key: str) -> Tuple[bool, Optional[LatLng], float]:
+        if time.time() < self._db_down_until:
+            return False, None, 0.0
+        try:
+            return self._from_doc(await self._acol().find_one({"_id": key}))
+        except Exception:
+            self._db_failed()
+            return False, None, 0.0
+
+    async def _adb_put(self, key: str, address: str, value: Optional[LatLng], ttl: float) -> None:
+        if time.time() < self._db_down_until:
+            return
+        try:
+            await self._acol().update_one({"_id": key}, {"$set": self._to_doc(address, value, ttl)}, upsert=True)
+        except Exception:
+            self._db_failed()
+
+    def _cached(self, key: str) -> Tuple[bool, Optional[LatLng]]:
+        hit, value = self._mem_get(key)
+        if hit:
+            self._count("memory_hits")
+            if value is None:
+                self._count("negative_hits")
+        return hit, value
+
+    def _db_hit(self, key: str, value: Optional[LatLng], expires: float) -> None:
+        self._count("db_hits")
+        if value is None:
+            self._count("negative_hits")
+        self._mem_put(key, value, expires)
+
+    # ---- public
+    def lookup(self, address: str, fetch: Callable[[str], LatLng]) -> Optional[LatLng]:
+        """
+        (lat, lng) for address, or None when the provider (now or earlier) found nothing.
+        Exceptions from fetch other than NotFound propagate and are not cached.
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+        hit, value = self._cached(key)
+        if hit:
+            return value
+        hit, value, expires = self._db_get(key)
+        if hit:
+            self._db_hit(key, value, expires)
+            return value
+
+        self._count("misses")
+        try:
+            value = fetch(address.strip())
+        except NotFound:
+            value = None
+        except Exception:
+            self._count("provider_errors")
+            raise
+        ttl = self.ttl_s if value is not None else self.neg_ttl_s
+        self._mem_put(key, value, time.time() + ttl)
+        self._db_put(key, address.strip(), value, ttl)
+        return value
+
+    async def alookup(self, address: str, fetch: Callable[[str], Awaitable[LatLng]]) -> Optional[LatLng]:
+        """lookup() for async callers: Motor for the Mongo tier and an async fetch."""
+        key = normalize_address(address)
+        if not key:
+            return None
+        hit, value = self._cached(key)
+        if hit:
+            return value
+        hit, value, expires = await self._adb_get(key)
+        if hit:
+            self._db_hit(key, value, expires)
+            return value
+
+        self._count("misses")
+        try:
+            value = await fetch(address.strip())
+        except NotFound:
+            value = None
+        except Exception:
+            self._count("provider_errors")
+            raise
+        ttl = self.ttl_s if value is not None else self.neg_ttl_s
+        self._mem_put(key, value, time.time() + ttl)
+        await self._adb_put(key, address.strip(), value, ttl)
+        return value
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self.counters)
+            size = len(self._lru)
+        hits = c["memory_hits"] + c["db_hits"]
+        total = hits + c["misses"]
+        return {**c, "memory_size": size, "memory_maxsize": self.maxsize,
+                "hit_ratio": round(hits / total, 4) if total else None}
+
+
+geocode_cache = GeocodeCache()
+
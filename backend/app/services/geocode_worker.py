@@ -0,0 +1,257 @@
+# app/services/geocode_worker.py
+"""
+Deferred geocoding for donation/request creation.
+
+Creating a document that only has an address no longer waits for the
+provider: the document is saved with geo_pending=True and a job goes into
+`geocode_jobs`:
+
+    {_id, collection, doc_id, address, key, status: queued|running|done|failed,
+     attempts, next_at, created_at, [claim, claimed_at, error]}
+
+A background worker (started in the app lifespan) drains the queue:
+
+  - claims up to GEOCODE_BATCH due jobs at once (update_many with a claim
+    token, so several app processes never take the same job; a job left
+    "running" past GEOCODE_LEASE_S by a dead process is claimed again)
+  - groups jobs by normalized address, so ten donations from the same
+    supermarket cost one lookup
+  - geocodes with at most GEOCODE_WORKERS lookups in flight and no more
+    than GEOCODE_RATE_PER_S provider calls per second (cache hits don't
+    count against the rate)
+  - sets location/geo and clears geo_pending on every document of a key;
+    "no results" fails the job at once, transient errors retry with
+    exponential backoff up to GEOCODE_MAX_ATTEMPTS
+
+The matcher skips documents while geo_pending is set.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.core.geocode import GeocodeError, NoResults, _alookup, alocal_first
+from app.services.geo_enrich import _address_to_geocode
+from app.services.geocode_cache import geocode_cache, normalize_address
+from app.services import versions
+
+log = logging.getLogger(__name__)
+
+JOBS = "geocode_jobs"
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "4"))
+GEOCODE_RATE_PER_S = float(os.getenv("GEOCODE_RATE_PER_S", "1"))  # Nominatim policy: 1 req/s
+GEOCODE_BATCH = int(os.getenv("GEOCODE_BATCH", "50"))
+GEOCODE_MAX_ATTEMPTS = int(os.getenv("GEOCODE_MAX_ATTEMPTS", "5"))
+GEOCODE_LEASE_S = float(os.getenv("GEOCODE_LEASE_S", "300"))
+_POLL_S = 2.0
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --------------------------------------------------
+# Enqueue (called by the create endpoints)
+# --------------------------------------------------
+def pending_fields(doc: Dict[str, Any]) -> bool:
+    """
+    Mark doc geo_pending when it has an address but no usable coordinates.
+    Returns True when a geocode job should be queued for it after insert.
+    """
+    if not _address_to_geocode(doc):
+        return False
+    doc["geo_pending"] = True
+    doc.pop("geo", None)
+    return True
+
+
+def job_doc(collection: str, doc_id: Any, address: str) -> Dict[str, Any]:
+    now = _utcnow()
+    return {"collection": collection, "doc_id": doc_id, "address": address.strip(),
+            "key": normalize_address(address), "status": "queued", "attempts": 0,
+            "next_at": now, "created_at": now}
+
+
+async def enqueue(db, collection: str, doc_id: Any, address: str) -> None:
+    await db[JOBS].insert_one(job_doc(collection, doc_id, address))
+    notify()
+
+
+# --------------------------------------------------
+# Worker
+# --------------------------------------------------
+class _RateLimiter:
+    """At most `rate` acquisitions per second, spaced evenly."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_wake: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_task: Optional[asyncio.Task] = None
+_lock = threading.Lock()
+
+
+def notify() -> None:
+    """Wake the worker now instead of at its next poll; safe from any thread."""
+    with _lock:
+        loop, ev = _loop, _wake
+    if loop is None or ev is None or loop.is_closed():
+        return
+    try:
+        if asyncio.get_running_loop() is loop:
+            ev.set()
+            return
+    except RuntimeError:
+        pass
+    loop.call_soon_threadsafe(ev.set)
+
+
+async def _claim(db) -> List[Dict[str, Any]]:
+    now = _utcnow()
+    due = {"$or": [
+        {"status": "queued", "next_at": {"$lte": now}},
+        {"status": "running", "claimed_at": {"$lt": now - timedelta(seconds=GEOCODE_LEASE_S)}},
+    ]}
+    ids = [j["_id"] async for j in db[JOBS].find(due, {"_id": 1}).sort("next_at", 1).limit(GEOCODE_BATCH)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    await db[JOBS].update_many({"$and": [{"_id": {"$in": ids}}, due]},
+                               {"$set": {"status": "running", "claim": token, "claimed_at": now}})
+    return [j async for j in db[JOBS].find({"claim": token, "status": "running"})]
+
+
+async def resolve(address: str, limiter: _RateLimiter, sem: asyncio.Semaphore):
+    """
+    (hit, error, retryable) for one address: local gazetteer, cache, then the
+    providers, with at most `sem` lookups in flight and provider calls paced
+    by `limiter`. Also used by the bulk repair in services/geo_repair.py.
+    """
+    async with sem:
+        async def fetch(a):
+            await limiter.acquire()  # only real provider calls are rate limited
+            return await _alookup(a)
+        try:
+            hit = await alocal_first(address) or await geocode_cache.alookup(address, fetch)
+            if hit is None:
+                raise NoResults("No results")
+            return hit, None, False
+        except NoResults as ex:
+            return None, str(ex), False
+        except GeocodeError as ex:  # e.g. provider key missing: retrying won't help soon, but may later
+            return None, str(ex), True
+        except Exception as ex:  # timeouts, HTTP errors
+            return None, f"{type(ex).__name__}: {ex}", True
+
+
+async def process_batch(db, limiter: Optional[_RateLimiter] = None) -> int:
+    """Claim and resolve one batch of due jobs; returns how many jobs were handled."""
+    jobs = await _claim(db)
+    if not jobs:
+        return 0
+    limiter = limiter or _RateLimiter(GEOCODE_RATE_PER_S)
+    sem = asyncio.Semaphore(max(1, GEOCODE_WORKERS))
+    by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for j in jobs:
+        by_key[j.get("key") or normalize_address(j["address"])].append(j)
+    keys = list(by_key)
+    results = await asyncio.gather(*(resolve(by_key[k][0]["address"], limiter, sem) for k in keys))
+
+    now = _utcnow()
+    doc_ops: Dict[str, List[UpdateOne]] = defaultdict(list)
+    job_ops: List[UpdateOne] = []
+    for k, (hit, err, retry) in zip(keys, results):
+        for j in by_key[k]:
+            attempts = int(j.get("attempts") or 0) + 1
+            if hit is not None:
+                lat, lng = hit
+                doc_ops[j["collection"]].append(UpdateOne({"_id": j["doc_id"]}, {
+                    "$set": {"location": {"lat": lat, "lng": lng},
+                             "geo": {"type": "Point", "coordinates": [lng, lat]}},
+                    "$unset": {"geo_pending": "", "_geocode_error": ""},
+                }))
+                job_ops.append(UpdateOne({"_id": j["_id"]}, {"$set": {"status": "done", "attempts": attempts, "done_at": now},
+                                                             "$unset": {"claim": ""}}))
+            elif retry and attempts < GEOCODE_MAX_ATTEMPTS:
+                backoff = min(3600.0, 5.0 * 2 ** attempts)
+                job_ops.append(UpdateOne({"_id": j["_id"]}, {
+                    "$set": {"status": "queued", "attempts": attempts, "error": err,
+                             "next_at": now + timedelta(seconds=backoff)},
+                    "$unset": {"claim": ""}}))
+            else:
+                # give up: the doc stops being pending and carries the reason, like a failed inline geocode
+                doc_ops[j["collection"]].append(UpdateOne({"_id": j["doc_id"]}, {
+                    "$set": {"_geocode_error": err}, "$unset": {"geo_pending": "", "geo": ""}}))
+                job_ops.append(UpdateOne({"_id": j["_id"]}, {"$set": {"status": "failed", "attempts": attempts, "error": err},
+                                                             "$unset": {"claim": ""}}))
+    for name, ops in doc_ops.items():
+        await db[name].bulk_write(ops, ordered=False)
+    await versions.bump(db, *doc_ops)
+    if job_ops:
+        await db[JOBS].bulk_write(job_ops, ordered=False)
+    return len(jobs)
+
+
+async def _run(db) -> None:
+    limiter = _RateLimiter(GEOCODE_RATE_PER_S)
+    while True:
+        try:
+            n = await process_batch(db, limiter)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("geocode worker batch failed")
+            n = 0
+        if n:
+            continue  # more may be due right away
+        _wake.clear()
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=_POLL_S)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start(db) -> asyncio.Task:
+    """Start the worker on the running loop (app lifespan)."""
+    global _wake, _loop, _task
+    with _lock:
+        _loop = asyncio.get_running_loop()
+        _wake = asyncio.Event()
+    _task = asyncio.create_task(_run(db), name="geocode-worker")
+    return _task
+
+
+async def stop() -> None:
+    global _task, _loop, _wake
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    with _lock:
+        _task = _loop = _wake = None
+
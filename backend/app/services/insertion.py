@@ -0,0 +1,88 @@
+# app/services/insertion.py
+"""
+Cheapest feasible insertion of a pickup/drop pair into an existing route.
+
+A route is its `steps` list as stored in the routes collection
+(start → pickups/drops → end). Inserting pickup p after step i and drop q
+after step j (i <= j) is scored for every (i, j) at once:
+
+    cost(i, j) = pick_delta[i] + drop_delta[j]        (i < j)
+    cost(i, i) = d(x_i, p) + d(p, q) + d(q, x_i+1) - d(x_i, x_i+1)
+
+and is feasible when the vehicle load over steps i..j plus the new kg stays
+within capacity. Precedence (pickup before drop) is built into i <= j.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.route_opt import haversine_to, leg_lengths
+
+_LOAD_SIGN = {"pickup": 1.0, "drop": -1.0}
+
+
+def route_arrays(steps: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(lat, lng, load-after-step) for a stored step list."""
+    lat = np.array([float(s["lat"]) for s in steps])
+    lng = np.array([float(s["lng"]) for s in steps])
+    delta = np.array([_LOAD_SIGN.get(s.get("action"), 0.0) * float(s.get("kg", 0) or 0) for s in steps])
+    return lat, lng, np.cumsum(delta)
+
+
+def best_pair_insertion(
+    steps: List[Dict[str, Any]],
+    pick: Tuple[float, float],
+    drop: Tuple[float, float],
+    kg: float,
+    capacity_kg: Optional[float],
+    first_pos: int = 0,
+) -> Optional[Tuple[float, int, int]]:
+    """
+    Cheapest feasible (delta_km, i, j): pickup goes after step i, drop after step j.
+    Positions before `first_pos` (already visited) are never used.
+    Returns None when no position respects capacity.
+    """
+    if len(steps) < 2:
+        return None
+    lat, lng, load = route_arrays(steps)
+    m = lat.size
+    dP = haversine_to(lat, lng, pick[0], pick[1])
+    dQ = haversine_to(lat, lng, drop[0], drop[1])
+    edge = leg_lengths(lat, lng)
+    pq = float(haversine_to([pick[0]], [pick[1]], drop[0], drop[1])[0])
+
+    e = m - 1  # insertion slots: after step 0 .. after step m-2
+    pick_delta = dP[:e] + dP[1:] - edge
+    drop_delta = dQ[:e] + dQ[1:] - edge
+    cost = pick_delta[:, None] + drop_delta[None, :]
+    idx = np.arange(e)
+    cost[idx, idx] = dP[:e] + pq + dQ[1:] - edge
+
+    valid = idx[None, :] >= idx[:, None]
+    valid &= (idx >= first_pos)[:, None]
+    if capacity_kg is not None:
+        # peak[i, j] = max(load[i..j]); load rises by kg between pickup and drop
+        seg = np.where(valid, load[:e][None, :], -np.inf)
+        peak = np.maximum.accumulate(seg, axis=1)
+        valid &= peak + kg <= capacity_kg + 1e-9
+    if not valid.any():
+        return None
+    cost = np.where(valid, cost, np.inf)
+    k = int(np.argmin(cost))
+    i, j = divmod(k, e)
+    return float(cost[i, j]), i, j
+
+
+def apply_pair(steps: List[Dict[str, Any]], pick_step: Dict[str, Any], drop_step: Dict[str, Any],
+               i: int, j: int) -> List[Dict[str, Any]]:
+    """Return a new step list with pickup after step i and drop after step j."""
+    return steps[:i + 1] + [pick_step] + steps[i + 1:j + 1] + [drop_step] + steps[j + 1:]
+
+
+def steps_distance_km(steps: List[Dict[str, Any]]) -> float:
+    if len(steps) < 2:
+        return 0.0
+    lat, lng, _ = route_arrays(steps)
+    return float(leg_lengths(lat, lng).sum())
@@ -0,0 +1,122 @@
+# app/services/listing.py
+"""
+Keyset pagination, filters and projection for the donation/request listings.
+
+Pages are newest first on (created_at, _id). The cursor is the last row's
+pair, base64'd; the next page is "strictly older than the cursor":
+
+    created_at < t  or  (created_at == t and _id < id)  or  created_at is null
+
+(documents without created_at sort after every dated one in descending
+order, so they come last and page by _id alone). With the compound indexes
+(created_at -1, _id -1), optionally prefixed by status / donor / ngo
+(see app/main.py), every page is an index range scan of `limit` entries,
+however deep the client pages.
+
+LEGACY_LISTINGS (default on) keeps the old "whole collection as one array"
+response for callers that send neither limit nor cursor, so the Flet
+client keeps working while it migrates.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+LEGACY_LISTINGS = os.getenv("LEGACY_LISTINGS", "1") == "1"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+SORT = [("created_at", -1), ("_id", -1)]
+
+
+def paged(limit: Optional[int], cursor: Optional[str]) -> bool:
+    """New page shape unless this is a legacy (no limit, no cursor) call with the flag on."""
+    return limit is not None or cursor is not None or not LEGACY_LISTINGS
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    t = doc.get("created_at")
+    raw = {"t": t.isoformat() if isinstance(t, datetime) else None, "id": str(doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        t = datetime.fromisoformat(raw["t"]) if raw.get("t") else None
+        if t is not None and t.tzinfo is not None:
+            t = t.astimezone(timezone.utc).replace(tzinfo=None)  # pymongo stores naive UTC
+        return t, ObjectId(raw["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(cursor: str) -> Dict[str, Any]:
+    t, oid = decode_cursor(cursor)
+    if t is None:
+        return {"created_at": None, "_id": {"$lt": oid}}
+    return {"$or": [
+        {"created_at": {"$lt": t}},
+        {"created_at": t, "_id": {"$lt": oid}},
+        {"created_at": None},
+    ]}
+
+
+def bbox_filter(bbox: str) -> Dict[str, Any]:
+    """"minLng,minLat,maxLng,maxLat" → geo within that box (uses the geo_2dsphere index)."""
+    try:
+        w, s, e, n = (float(x) for x in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be minLng,minLat,maxLng,maxLat")
+    if not (-180 <= w < e <= 180 and -90 <= s < n <= 90):
+        raise HTTPException(status_code=400, detail="bbox out of range or empty")
+    ring = [[w, s], [e, s], [e, n], [w, n], [w, s]]
+    return {"geo": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}}
+
+
+def in_list(value: Optional[str]) -> Optional[Any]:
+    """"open,assigned" → {"$in": [...]}, one value → that value."""
+    if not value:
+        return None
+    vals = [v.strip() for v in value.split(",") if v.strip()]
+    return vals[0] if len(vals) == 1 else {"$in": vals}
+
+
+def projection(fields: Optional[str], allowed: Iterable[str]) -> Tuple[Optional[Dict[str, int]], Optional[List[str]]]:
+    """
+    (Mongo projection, output keys) for ?fields=a,b; (None, None) for all fields.
+    `id` maps to _id; created_at is always read (the cursor needs it).
+    """
+    if not fields:
+        return None, None
+    allowed = set(allowed)
+    keys = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [k for k in keys if k not in allowed]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {bad}. Allowed: {sorted(allowed)}")
+    proj = {("_id" if k == "id" else k): 1 for k in keys}
+    proj["created_at"] = 1
+    return proj, keys
+
+
+async def page(col, filt: Dict[str, Any], *, limit: Optional[int], cursor: Optional[str],
+               proj: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page, newest first, and the cursor for the next one (None at the end)."""
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    q = dict(filt)
+    if cursor:
+        q = {"$and": [q, after_cursor(cursor)]} if q else after_cursor(cursor)
+    docs = await col.find(q, proj).sort(SORT).limit(limit + 1).to_list(length=limit + 1)
+    more = len(docs) > limit
+    docs = docs[:limit]
+    return docs, (encode_cursor(docs[-1]) if more else None)
+
+
+def pick(row: Dict[str, Any], keys: Optional[List[str]]) -> Dict[str, Any]:
+    return row if keys is None else {k: row.get(k) for k in keys}
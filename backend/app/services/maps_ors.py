@@ -4,6 +4,12 @@ import math
 import hashlib
 from typing import List, Tuple, Optional
 
+import numpy as np
+
+from app.services.gazetteer import aget_gazetteer
+from app.services.spatial import nn_order
+from app.services.speed_profile import get_profile, path_minutes
+
 def _hash_to_coord(s: str) -> Tuple[float, float]:
     """Deterministic pseudo-geocode near Metro Manila (lat ~14.x, lng ~121.x)."""
     h = hashlib.sha256(s.encode("utf-8")).hexdigest()
@@ -14,7 +20,10 @@ def _hash_to_coord(s: str) -> Tuple[float, float]:
     return (lat, lng)
 
 async def ors_geocode(query: str) -> Optional[dict]:
-    lat, lng = _hash_to_coord(query)
+    """Local gazetteer when one is configured (GAZETTEER_PATH), else the hash stub."""
+    gz = await aget_gazetteer()
+    hit = gz.lookup(query) if gz is not None else None
+    lat, lng = hit or _hash_to_coord(query)
     return {"lat": lat, "lng": lng}
 
 def _haversine_m(p1: Tuple[float,float], p2: Tuple[float,float]) -> float:
@@ -28,31 +37,33 @@ def _haversine_m(p1: Tuple[float,float], p2: Tuple[float,float]) -> float:
     return R * c
 
 async def ors_matrix(points: List[Tuple[float,float]]) -> List[List[float]]:
-    """Return a symmetric 'cost' matrix (seconds). Use straight-line * factor."""
-    # distance seconds ~ (meters / 7.0 m/s) * fudge
-    sec_matrix = []
-    for i in range(len(points)):
-        row = []
-        for j in range(len(points)):
-            if i == j:
-                row.append(0.0)
-            else:
-                m = _haversine_m(points[i], points[j])
-                s = (m / 7.0) * 1.35  # ~25 km/h avg + fudge
-                row.append(s)
-        sec_matrix.append(row)
-    return sec_matrix
+    """Return a 'cost' matrix (seconds): straight-line distance at speed-profile speeds."""
+    if not points:
+        return []
+    mins = get_profile().minutes_matrix([p[0] for p in points], [p[1] for p in points])
+    return (mins * 60.0).tolist()
 
-def greedy_order(sec_matrix: List[List[float]]) -> List[int]:
-    """Nearest-neighbor tour starting at 0."""
+def greedy_order(sec_matrix: List[List[float]], points: Optional[List[Tuple[float,float]]] = None) -> List[int]:
+    """
+    Nearest-neighbor tour starting at 0.
+    With `points` (lat, lng) the next stop comes from a KD-tree (log-time per step);
+    otherwise each step is one vectorized argmin over the matrix row.
+    """
     n = len(sec_matrix)
-    unvisited = set(range(1, n))
+    if n == 0:
+        return []
+    if points is not None and len(points) == n:
+        rest = nn_order(points[0], [p[0] for p in points[1:]], [p[1] for p in points[1:]])
+        return [0] + [i + 1 for i in rest]
+    M = np.asarray(sec_matrix, dtype=np.float64)
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
     order = [0]
     cur = 0
-    while unvisited:
-        nxt = min(unvisited, key=lambda j: sec_matrix[cur][j])
+    for _ in range(n - 1):
+        nxt = int(np.argmin(np.where(unvisited, M[cur], np.inf)))
         order.append(nxt)
-        unvisited.remove(nxt)
+        unvisited[nxt] = False
         cur = nxt
     return order
 
@@ -61,5 +72,5 @@ async def ors_directions(points: List[Tuple[float,float]]) -> dict:
     dist_m = 0.0
     for i in range(len(points)-1):
         dist_m += _haversine_m(points[i], points[i+1])
-    dur_s = (dist_m / 7.0) * 1.35
+    dur_s = path_minutes(points) * 60.0
     return {"distance_m": dist_m, "duration_s": dur_s}
@@ -7,6 +7,7 @@ from bson import ObjectId
 
 from app.core.db import get_db
 from app.services.units import to_kg
+from app.services import versions
 from app.schemas import MatchAllocation
 
 EARTH_RADIUS_KM = 6371.0
@@ -85,8 +86,9 @@ def sum_qty_kg(items: List[dict]) -> float:
     return sum(to_kg(float(it.get("qty", 0.0)), it.get("unit", "kg")) for it in items)
 
 async def fetch_open(db):
-    donations = await db.donations.find({"status": "open"}).to_list(length=10000)
-    requests = await db.requests.find({"status": "open"}).to_list(length=10000)
+    # geo_pending docs have no coordinates yet (background geocode in flight)
+    donations = await db.donations.find({"status": "open", "geo_pending": {"$ne": True}}).to_list(length=10000)
+    requests = await db.requests.find({"status": "open", "geo_pending": {"$ne": True}}).to_list(length=10000)
     return donations, requests
 
 def materialize_remaining(donations, requests):
@@ -201,6 +203,8 @@ async def apply_allocations(db, allocations: List[MatchAllocation]):
         if changed:
             await db.requests.update_one({"_id": doc["_id"]}, {"$set": {"needs": needs, "status": "matched"}})
 
+    await versions.bump(db, "matches", "donations", "requests")
+
 async def run_matching() -> Dict:
     """
     Greedy matcher by item label (Item.name):
@@ -0,0 +1,14 @@
+# app/services/ndjson.py
+"""Newline-delimited JSON for StreamingResponse endpoints (one compact object per line)."""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict
+
+from fastapi.encoders import jsonable_encoder
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson_line(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(jsonable_encoder(obj), separators=(",", ":")) + "\n").encode("utf-8")
@@ -0,0 +1,174 @@
+# app/services/packing.py
+"""
+Multi-dimensional best-fit bin packing for route batches.
+
+Every stop carries a demand per capacity dimension (kg, volume in litres,
+cold-chain slots); every bin is a vehicle with a capacity per dimension.
+Missing dimensions are unconstrained.
+
+Open bins are kept sorted by residual kg, so finding the tightest bin that
+still takes an item's weight is a bisect. From there we walk upward only
+until the other dimensions fit too. With spatial=True the walk looks at a
+few feasible bins and prefers the one whose stops are closest to the item.
+This keeps geographic clusters together at a small cost in fill rate.
+"""
+from __future__ import annotations
+
+import math
+import os
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DIMS = ("kg", "volume_l", "cold_slots")
+
+# Rough litres of cargo space per kg of mixed food; used when a donation doesn't say.
+VOLUME_L_PER_KG = float(os.getenv("VOLUME_L_PER_KG", "2.5"))
+
+# Matched by keyword against drivers.vehicle (first hit wins)
+VEHICLE_PROFILES: List[Tuple[str, Dict[str, float]]] = [
+    ("reefer",     {"kg": 800.0, "volume_l": 3000.0, "cold_slots": 8}),
+    ("refrigerat", {"kg": 800.0, "volume_l": 3000.0, "cold_slots": 8}),
+    ("truck",      {"kg": 2000.0, "volume_l": 8000.0, "cold_slots": 0}),
+    ("van",        {"kg": 600.0, "volume_l": 2500.0, "cold_slots": 2}),
+    ("pickup",     {"kg": 500.0, "volume_l": 1500.0, "cold_slots": 0}),
+    ("suv",        {"kg": 250.0, "volume_l": 700.0, "cold_slots": 1}),
+    ("car",        {"kg": 150.0, "volume_l": 400.0, "cold_slots": 1}),
+    ("sedan",      {"kg": 150.0, "volume_l": 400.0, "cold_slots": 1}),
+    ("tricycle",   {"kg": 120.0, "volume_l": 350.0, "cold_slots": 0}),
+    ("motor",      {"kg": 30.0, "volume_l": 80.0, "cold_slots": 0}),
+    ("bike",       {"kg": 20.0, "volume_l": 60.0, "cold_slots": 0}),
+]
+
+_SPATIAL_CANDIDATES = 32
+_EPS = 1e-9
+
+
+def vehicle_capacity(driver: Dict[str, Any], default_kg: Optional[float] = None) -> Dict[str, float]:
+    """Capacity per dimension for a driver doc: explicit fields win over the vehicle-type profile."""
+    vehicle = str(driver.get("vehicle") or "").lower()
+    cap: Dict[str, float] = {}
+    for key, prof in VEHICLE_PROFILES:
+        if key in vehicle:
+            cap = dict(prof)
+            break
+    if not cap and default_kg:
+        cap = {"kg": float(default_kg)}
+    for dim, field in (("kg", "capacity_kg"), ("volume_l", "volume_l"), ("cold_slots", "cold_slots")):
+        if driver.get(field) is not None:
+            cap[dim] = float(driver[field])
+    return cap
+
+
+def _demand(item: Dict[str, Any]) -> Tuple[float, ...]:
+    return tuple(float(item.get(d, 0) or 0) for d in DIMS)
+
+
+def _cap(c: Dict[str, float]) -> Tuple[float, ...]:
+    return tuple(float(c[d]) if c.get(d) is not None else math.inf for d in DIMS)
+
+
+def _fits(dem: Tuple[float, ...], res: List[float]) -> bool:
+    return all(x <= r + _EPS for x, r in zip(dem, res))
+
+
+def pack(
+    items: Sequence[Dict[str, Any]],
+    bins: Optional[Sequence[Dict[str, float]]] = None,
+    default_capacity: Optional[Dict[str, float]] = None,
+    spatial: bool = False,
+    spatial_km: float = 10.0,
+    keep_empty: bool = False,
+) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, float]], List[Dict[str, Any]]]:
+    """
+    Pack items into bins.
+
+    bins              fixed fleet capacities (each used at most once), may be empty
+    default_capacity  capacity for extra bins opened when nothing fits; None = no extra bins
+    spatial           prefer bins whose centroid is near the item (needs item lat/lng)
+    spatial_km        distance that costs as much as a fully empty bin in the score
+
+    Returns (batches, capacities, unpacked). Empty fleet bins are dropped unless
+    keep_empty=True, which keeps fleet bins at their input positions.
+    """
+    caps: List[Tuple[float, ...]] = [_cap(b) for b in (bins or [])]
+    residual: List[List[float]] = [list(c) for c in caps]
+    contents: List[List[Dict[str, Any]]] = [[] for _ in caps]
+    cent: List[Optional[List[float]]] = [None for _ in caps]  # [sum_lat, sum_lng, count]
+    # sorted (residual_kg, bin_id) — the best-fit search structure
+    order: List[Tuple[float, int]] = sorted((r[0], i) for i, r in enumerate(residual))
+    default = _cap(default_capacity) if default_capacity else None
+
+    # scale of each dimension for sorting "big first"
+    ref = [max((c[k] for c in caps + ([default] if default else []) if c[k] != math.inf), default=0.0)
+           for k in range(len(DIMS))]
+
+    def size(it):
+        dem = _demand(it)
+        return max((x / ref[k]) if ref[k] > 0 else 0.0 for k, x in enumerate(dem))
+
+    unpacked: List[Dict[str, Any]] = []
+
+    def place(it, b):
+        dem = _demand(it)
+        pos = bisect_left(order, (residual[b][0], b))
+        order.pop(pos)
+        for k, x in enumerate(dem):
+            residual[b][k] -= x
+        insort(order, (residual[b][0], b))
+        contents[b].append(it)
+        if spatial and it.get("lat") is not None:
+            c = cent[b] or [0.0, 0.0, 0]
+            c[0] += float(it["lat"]); c[1] += float(it["lng"]); c[2] += 1
+            cent[b] = c
+
+    for it in sorted(items, key=size, reverse=True):
+        dem = _demand(it)
+        start = bisect_left(order, (dem[0] - _EPS, -1))
+        choice = -1
+        if not spatial:
+            for _, b in order[start:]:
+                if _fits(dem, residual[b]):
+                    choice = b
+                    break
+        else:
+            best_score = math.inf
+            seen = 0
+            for _, b in order[start:]:
+                if not _fits(dem, residual[b]):
+                    continue
+                slack = residual[b][0] / caps[b][0] if caps[b][0] not in (0.0, math.inf) else 0.0
+                c = cent[b]
+                if c and it.get("lat") is not None:
+                    dlat = (c[0] / c[2] - float(it["lat"])) * 111.32
+                    dlng = (c[1] / c[2] - float(it["lng"])) * 111.32 * math.cos(math.radians(float(it["lat"])))
+                    far = math.hypot(dlat, dlng) / spatial_km
+                else:
+                    far = 1.0  # an empty bin is as good as one ~spatial_km away
+                score = slack + far
+                if score < best_score:
+                    best_score, choice = score, b
+                seen += 1
+                if seen >= _SPATIAL_CANDIDATES:
+                    break
+            # A fresh bin scores 2.0 (fully slack + "empty" distance term); open one
+            # when every feasible bin is worse, which keeps clusters tight.
+            if choice >= 0 and best_score > 2.0 and default is not None and _fits(dem, list(default)):
+                choice = -1
+
+        if choice < 0:
+            if default is None or not _fits(dem, list(default)):
+                unpacked.append(it)
+                continue
+            caps.append(default)
+            residual.append(list(default))
+            contents.append([])
+            cent.append(None)
+            choice = len(caps) - 1
+            insort(order, (residual[choice][0], choice))
+        place(it, choice)
+
+    n_fleet = len(bins or [])
+    used = [i for i, c in enumerate(contents) if c or (keep_empty and i < n_fleet)]
+    batches = [contents[i] for i in used]
+    capacities = [{d: caps[i][k] for k, d in enumerate(DIMS) if caps[i][k] != math.inf} for i in used]
+    return batches, capacities, unpacked
@@ -0,0 +1,103 @@
+# app/services/plan_cache.py
+"""
+Bounded, expiring memo of route plans.
+
+Plans are keyed by fingerprint(): a sha256 over a canonical JSON form of
+whatever determines the plan (depot, sorted stops with kg, capacity,
+objective, ...). Floats are rounded to 6 decimals (~0.1 m in lat/lng) so
+a round trip through JSON or Mongo doesn't change the key, and datetimes
+are written as UTC ISO strings.
+
+Values are deep-copied on put and get, so callers may mutate what they
+get back. The cache is per process and thread-safe (/routes/plan plans in
+the threadpool).
+"""
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "128"))
+PLAN_CACHE_TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "600"))
+
+
+def _canon(x: Any) -> Any:
+    if isinstance(x, float):
+        return round(x, 6)
+    if isinstance(x, datetime):
+        dt = x if x.tzinfo else x.replace(tzinfo=timezone.utc)
+        return dt.astimezone(timezone.utc).isoformat()
+    if isinstance(x, dict):
+        return {str(k): _canon(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_canon(v) for v in x]
+    if x is None or isinstance(x, (str, int, bool)):
+        return x
+    return str(x)
+
+
+def fingerprint(**parts: Any) -> str:
+    """Stable hex digest of keyword parts; order-sensitive inside lists, so sort stops first."""
+    blob = json.dumps(_canon(parts), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """LRU with a time-to-live; size 0 or ttl 0 disables it."""
+
+    def __init__(self, maxsize: int = PLAN_CACHE_SIZE, ttl_s: float = PLAN_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl_s > 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            value = item[1]
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl_s": self.ttl_s,
+                    "hits": self.hits, "misses": self.misses}
+
+
+# one cache per endpoint so a burst on one can't evict the other
+route_plans = PlanCache()
+match_plans = PlanCache()
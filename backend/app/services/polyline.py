@@ -0,0 +1,97 @@
+# app/services/polyline.py
+"""
+Encoded polylines (Google's algorithm, the format OSRM and Directions return)
+and Douglas–Peucker simplification for map zoom levels.
+
+Points are (lat, lng) tuples. At precision 5 a coordinate rounds to ~1 m,
+which is plenty for drawing and costs ~4-6 bytes per point instead of a
+pair of doubles in BSON.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+Point = Tuple[float, float]
+
+_M_PER_DEG = 111_320.0
+# Web-mercator ground resolution at the equator, zoom 0 (m / pixel)
+_M_PER_PX_Z0 = 156_543.03392
+
+
+def encode(points: Sequence[Point], precision: int = 5) -> str:
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        ilat = int(round(lat * factor))
+        ilng = int(round(lng * factor))
+        for delta in (ilat - prev_lat, ilng - prev_lng):
+            v = ~(delta << 1) if delta < 0 else delta << 1
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1F)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lng = ilat, ilng
+    return "".join(out)
+
+
+def decode(s: str, precision: int = 5) -> List[Point]:
+    factor = float(10 ** precision)
+    pts: List[Point] = []
+    i = lat = lng = 0
+    n = len(s)
+    while i < n:
+        vals = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(s[i]) - 63
+                i += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            vals.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += vals[0]
+        lng += vals[1]
+        pts.append((lat / factor, lng / factor))
+    return pts
+
+
+def simplify(points: Sequence[Point], tolerance_m: float) -> List[Point]:
+    """Douglas–Peucker on a local metric plane; endpoints are always kept."""
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return list(points)
+    arr = np.asarray(points, dtype=np.float64)
+    y = arr[:, 0] * _M_PER_DEG
+    x = arr[:, 1] * _M_PER_DEG * math.cos(math.radians(float(arr[:, 0].mean())))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        xs, ys = x[a + 1:b], y[a + 1:b]
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        seg = math.hypot(dx, dy)
+        if seg == 0.0:
+            d = np.hypot(xs - x[a], ys - y[a])
+        else:
+            d = np.abs(dy * (xs - x[a]) - dx * (ys - y[a])) / seg
+        k = int(np.argmax(d))
+        if d[k] > tolerance_m:
+            m = a + 1 + k
+            keep[m] = True
+            stack.append((a, m))
+            stack.append((m, b))
+    return [points[i] for i in np.flatnonzero(keep)]
+
+
+def tolerance_for_zoom(zoom: float, lat: float = 0.0, px: float = 1.0) -> float:
+    """Ground distance (m) of `px` screen pixels at a web-map zoom level."""
+    return px * _M_PER_PX_Z0 * math.cos(math.radians(lat)) / (2.0 ** zoom)
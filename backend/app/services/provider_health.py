@@ -0,0 +1,131 @@
+# app/services/provider_health.py
+"""
+Per-provider latency and circuit breaker for the geocoding chain.
+
+Each remote provider gets one ProviderHealth:
+
+  latency   the last GEOCODE_LATENCY_WINDOW answer times; hedge_delay() is
+            their p95 (GEOCODE_HEDGE_DEFAULT_MS until there are enough
+            samples), i.e. "this provider is later than usual now"
+  breaker   closed → open after GEOCODE_BREAKER_FAILS failures in a row;
+            open providers are skipped for GEOCODE_BREAKER_OPEN_S, then one
+            trial call is let through (half-open): success closes the
+            breaker, failure opens it again
+
+"No results" is an answer, not a failure. A call cancelled because another
+provider answered first counts as neither.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+import numpy as np
+
+GEOCODE_BREAKER_FAILS = int(os.getenv("GEOCODE_BREAKER_FAILS", "5"))
+GEOCODE_BREAKER_OPEN_S = float(os.getenv("GEOCODE_BREAKER_OPEN_S", "30"))
+GEOCODE_HEDGE_DEFAULT_MS = float(os.getenv("GEOCODE_HEDGE_DEFAULT_MS", "1500"))
+GEOCODE_HEDGE_MIN_MS = float(os.getenv("GEOCODE_HEDGE_MIN_MS", "150"))
+GEOCODE_LATENCY_WINDOW = int(os.getenv("GEOCODE_LATENCY_WINDOW", "200"))
+_MIN_SAMPLES = 10
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProviderHealth:
+    def __init__(self, name: str, fails: int = GEOCODE_BREAKER_FAILS, open_s: float = GEOCODE_BREAKER_OPEN_S,
+                 window: int = GEOCODE_LATENCY_WINDOW):
+        self.name = name
+        self.fails = fails
+        self.open_s = open_s
+        self.state = CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial = False
+        self._lat: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "failures": 0, "skipped": 0, "hedged": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether to call the provider now; counts the call (or the skip)."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self._open_until:
+                self.state = HALF_OPEN
+            if self.state == OPEN or (self.state == HALF_OPEN and self._trial):
+                self.counters["skipped"] += 1
+                return False
+            if self.state == HALF_OPEN:
+                self._trial = True
+            self.counters["calls"] += 1
+            return True
+
+    def success(self, seconds: float) -> None:
+        with self._lock:
+            self._lat.append(seconds)
+            self._failures = 0
+            self._trial = False
+            self.state = CLOSED
+
+    def failure(self) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+            self._failures += 1
+            self._trial = False
+            if self.state == HALF_OPEN or self._failures >= self.fails:
+                if self.state != OPEN:
+                    self.counters["opened"] += 1
+                self.state = OPEN
+                self._open_until = time.monotonic() + self.open_s
+
+    def release(self) -> None:
+        """The call was abandoned (a hedge won): no verdict on the provider."""
+        with self._lock:
+            self._trial = False
+
+    def hedged(self) -> None:
+        with self._lock:
+            self.counters["hedged"] += 1
+
+    def p95(self) -> float:
+        with self._lock:
+            lat = list(self._lat)
+        return float(np.percentile(lat, 95)) if len(lat) >= _MIN_SAMPLES else float("nan")
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for this provider before also asking the next one."""
+        p = self.p95()
+        ms = GEOCODE_HEDGE_DEFAULT_MS if np.isnan(p) else p * 1000.0
+        return max(GEOCODE_HEDGE_MIN_MS, ms) / 1000.0
+
+    def stats(self) -> Dict[str, Any]:
+        p = self.p95()
+        with self._lock:
+            return {**self.counters, "state": self.state, "samples": len(self._lat),
+                    "p95_ms": None if np.isnan(p) else round(p * 1000.0, 1)}
+
+
+_health: Dict[str, ProviderHealth] = {}
+_registry_lock = threading.Lock()
+
+
+def provider_health(name: str) -> ProviderHealth:
+    with _registry_lock:
+        h = _health.get(name)
+        if h is None:
+            h = _health[name] = ProviderHealth(name)
+        return h
+
+
+def health_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        items = list(_health.items())
+    return {name: h.stats() for name, h in items}
+
+
+def reset() -> None:
+    """Forget all providers' history (tests)."""
+    with _registry_lock:
+        _health.clear()
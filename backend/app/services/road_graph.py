@@ -0,0 +1,268 @@
+# app/services/road_graph.py
+"""
+Optional in-process road router.
+
+The graph is a preprocessed road extract for the service area stored as a
+compressed sparse row (CSR) adjacency in plain .npy files, so it can be
+memory-mapped at startup instead of parsed. Edge weights are travel time in
+seconds; edge lengths (meters) are carried along for distance reporting.
+
+Layout of a graph directory (see scripts/build_road_graph.py):
+    lat.npy, lng.npy                 float64[N]   node coordinates
+    fwd_indptr.npy, fwd_indices.npy  int64[N+1], int32[E]   outgoing edges
+    fwd_time.npy, fwd_len.npy        float32[E]   seconds / meters
+    rev_*.npy                        same, for the reversed graph
+"""
+from __future__ import annotations
+
+import os
+import math
+import heapq
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROAD_GRAPH_DIR = os.getenv("ROAD_GRAPH_DIR")
+
+EARTH_RADIUS_M = 6371000.0
+_GRID_DEG = 0.005  # ~550 m snapping cells
+
+_ARRAYS = ("indptr", "indices", "time", "len")
+
+
+def _hav_m(lat1, lng1, lat2, lng2):
+    """Vectorized haversine in meters (accepts scalars or numpy arrays)."""
+    lat1 = np.radians(lat1); lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlng = np.radians(lng2) - np.radians(lng1)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def _csr(n: int, src: np.ndarray, dst: np.ndarray, time_s: np.ndarray, len_m: np.ndarray):
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return (
+        indptr,
+        dst[order].astype(np.int32),
+        time_s[order].astype(np.float32),
+        len_m[order].astype(np.float32),
+    )
+
+
+class RoadGraph:
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, fwd: tuple, rev: tuple):
+        self.lat = lat
+        self.lng = lng
+        self.fwd = fwd
+        self.rev = rev
+        self.n = int(lat.shape[0])
+        self._grid = None
+        # Coordinates are small (16 B/node) and read per expansion, so keep a
+        # plain-list copy; the edge arrays stay memory-mapped.
+        self._lat_l: List[float] = np.asarray(lat, dtype=np.float64).tolist()
+        self._lng_l: List[float] = np.asarray(lng, dtype=np.float64).tolist()
+        # Fastest straight-line speed any edge allows; keeps the A* potential admissible
+        # and consistent even when stored edge lengths are slightly shorter than the chord.
+        indptr, indices, time_s, _ = fwd
+        src = np.repeat(np.arange(self.n), np.diff(indptr))
+        chord = _hav_m(lat[src], lng[src], lat[indices], lng[indices])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            speeds = np.where(time_s > 0, chord / time_s, 0.0)
+        self.vmax = float(max(speeds.max() if speeds.size else 0.0, 1.0))
+
+    # --------------------------------------------------
+    # Build / persist
+    # --------------------------------------------------
+    @classmethod
+    def from_edges(cls, lat, lng, src, dst, len_m, time_s) -> "RoadGraph":
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        len_m = np.asarray(len_m, dtype=np.float32)
+        time_s = np.asarray(time_s, dtype=np.float32)
+        n = lat.shape[0]
+        return cls(lat, lng, _csr(n, src, dst, time_s, len_m), _csr(n, dst, src, time_s, len_m))
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "lat.npy"), np.asarray(self.lat))
+        np.save(os.path.join(path, "lng.npy"), np.asarray(self.lng))
+        for prefix, arrays in (("fwd", self.fwd), ("rev", self.rev)):
+            for name, arr in zip(_ARRAYS, arrays):
+                np.save(os.path.join(path, f"{prefix}_{name}.npy"), np.asarray(arr))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "RoadGraph":
+        mode = "r" if mmap else None
+        ld = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+        fwd = tuple(ld(f"fwd_{a}") for a in _ARRAYS)
+        rev = tuple(ld(f"rev_{a}") for a in _ARRAYS)
+        return cls(ld("lat"), ld("lng"), fwd, rev)
+
+    # --------------------------------------------------
+    # Snapping (coordinate -> nearest node) via a coarse grid
+    # --------------------------------------------------
+    def _build_grid(self):
+        rows = np.floor(np.asarray(self.lat) / _GRID_DEG).astype(np.int64)
+        cols = np.floor(np.asarray(self.lng) / _GRID_DEG).astype(np.int64)
+        keys = rows * 1_000_003 + cols
+        order = np.argsort(keys, kind="stable")
+        skeys = keys[order]
+        uniq, starts = np.unique(skeys, return_index=True)
+        ends = np.append(starts[1:], skeys.shape[0])
+        cells = {int(k): order[s:e] for k, s, e in zip(uniq, starts, ends)}
+        self._grid = cells
+
+    def nearest_node(self, lat: float, lng: float) -> int:
+        if self._grid is None:
+            self._build_grid()
+        r0 = math.floor(lat / _GRID_DEG)
+        c0 = math.floor(lng / _GRID_DEG)
+        # Grow the search ring until something is found, then one extra ring
+        # so a closer node just across a cell boundary is not missed.
+        found_at = None
+        ring = 0
+        cand: List[np.ndarray] = []
+        while ring < 64:
+            for dr in range(-ring, ring + 1):
+                for dc in range(-ring, ring + 1):
+                    if max(abs(dr), abs(dc)) != ring:
+                        continue
+                    ids = self._grid.get((r0 + dr) * 1_000_003 + (c0 + dc))
+                    if ids is not None:
+                        cand.append(ids)
+            if cand and found_at is None:
+                found_at = ring
+            if found_at is not None and ring >= found_at + 1:
+                break
+            ring += 1
+        if not cand:
+            # far outside the extract: fall back to a full scan
+            ids = np.arange(self.n)
+        else:
+            ids = np.concatenate(cand)
+        d = _hav_m(lat, lng, np.asarray(self.lat)[ids], np.asarray(self.lng)[ids])
+        return int(ids[int(np.argmin(d))])
+
+    # --------------------------------------------------
+    # Queries
+    # --------------------------------------------------
+    def _h(self, v: int, lat: float, lng: float) -> float:
+        # scalar math is far cheaper than numpy for a single pair
+        lat1 = math.radians(self._lat_l[v]); lat2 = math.radians(lat)
+        dlng = math.radians(lng - self._lng_l[v])
+        a = math.sin((lat2 - lat1) / 2.0) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2.0) ** 2
+        return 2.0 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a))) / self.vmax
+
+    def shortest_path(self, s: int, t: int) -> Optional[Tuple[float, float, List[int]]]:
+        """
+        Bidirectional A* with average potentials.
+        Returns (time_s, length_m, node_path) or None when t is unreachable.
+        """
+        if s == t:
+            return 0.0, 0.0, [s]
+        s_lat, s_lng = self._lat_l[s], self._lng_l[s]
+        t_lat, t_lng = self._lat_l[t], self._lng_l[t]
+
+        pot_cache: Dict[int, float] = {}
+
+        def p_f(v: int) -> float:
+            p = pot_cache.get(v)
+            if p is None:
+                p = 0.5 * (self._h(v, t_lat, t_lng) - self._h(v, s_lat, s_lng))
+                pot_cache[v] = p
+            return p
+
+        dist = ({s: 0.0}, {t: 0.0})
+        length = ({s: 0.0}, {t: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({s: -1}, {t: -1})
+        done = (set(), set())
+        heaps = ([(p_f(s), s)], [(-p_f(t), t)])
+        graphs = (self.fwd, self.rev)
+        sign = (1.0, -1.0)
+
+        best = math.inf
+        meet = -1
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            du = dist[side][u]
+            lu = length[side][u]
+            indptr, indices, time_s, len_m = graphs[side]
+            a, b = int(indptr[u]), int(indptr[u + 1])
+            other = dist[1 - side]
+            for v, w, l in zip(indices[a:b].tolist(), time_s[a:b].tolist(), len_m[a:b].tolist()):
+                nd = du + w
+                if nd < dist[side].get(v, math.inf):
+                    dist[side][v] = nd
+                    length[side][v] = lu + l
+                    parent[side][v] = u
+                    heapq.heappush(heaps[side], (nd + sign[side] * p_f(v), v))
+                    if v in other and nd + other[v] < best:
+                        best = nd + other[v]
+                        meet = v
+
+        if meet < 0:
+            return None
+
+        path = []
+        v = meet
+        while v != -1:
+            path.append(v)
+            v = parent[0][v]
+        path.reverse()
+        v = parent[1][meet]
+        while v != -1:
+            path.append(v)
+            v = parent[1][v]
+        total_len = length[0][meet] + length[1][meet]
+        return best, total_len, path
+
+    def one_to_many(self, s: int, targets: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Plain Dijkstra from s that stops once every target is settled.
+        Returns (time_s[], length_m[]) aligned with targets; inf when unreachable.
+        """
+        want = set(int(t) for t in targets)
+        dist: Dict[int, float] = {s: 0.0}
+        length: Dict[int, float] = {s: 0.0}
+        done = set()
+        heap = [(0.0, s)]
+        indptr, indices, time_s, len_m = self.fwd
+        while heap and want:
+            du, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            want.discard(u)
+            lu = length[u]
+            a, b = int(indptr[u]), int(indptr[u + 1])
+            for v, w, l in zip(indices[a:b].tolist(), time_s[a:b].tolist(), len_m[a:b].tolist()):
+                nd = du + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    length[v] = lu + l
+                    heapq.heappush(heap, (nd, v))
+        times = np.array([dist.get(int(t), math.inf) if int(t) in done else math.inf for t in targets])
+        lens = np.array([length.get(int(t), math.inf) if int(t) in done else math.inf for t in targets])
+        return times, lens
+
+    def path_coords(self, path: List[int]) -> List[Tuple[float, float]]:
+        return [(self._lat_l[v], self._lng_l[v]) for v in path]
+
+
+@lru_cache(maxsize=1)
+def get_road_graph() -> Optional[RoadGraph]:
+    """Memory-mapped graph from ROAD_GRAPH_DIR, or None when not configured."""
+    if not ROAD_GRAPH_DIR or not os.path.isdir(ROAD_GRAPH_DIR):
+        return None
+    return RoadGraph.load(ROAD_GRAPH_DIR)
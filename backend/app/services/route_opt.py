@@ -0,0 +1,215 @@
+# app/services/route_opt.py
+"""
+Tour construction and local search on a precomputed cost matrix.
+
+Conventions:
+  - node 0 is the depot; a closed tour is an int array [0, ..., 0]
+  - matrices are symmetric (haversine- or profile-based), so reversing a
+    segment does not change its internal cost
+  - every improvement loop takes an absolute `deadline` (time.perf_counter())
+    and returns the best tour found when it runs out
+"""
+from __future__ import annotations
+
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+_EPS = 1e-9
+
+
+def haversine_matrix(lat: Sequence[float], lng: Sequence[float]) -> np.ndarray:
+    """Pairwise great-circle distances (km) between all points."""
+    la = np.radians(np.asarray(lat, dtype=np.float64))
+    ln = np.radians(np.asarray(lng, dtype=np.float64))
+    dlat = la[:, None] - la[None, :]
+    dlng = ln[:, None] - ln[None, :]
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(la)[:, None] * np.cos(la)[None, :] * np.sin(dlng / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_to(lat: Sequence[float], lng: Sequence[float], lat0: float, lng0: float) -> np.ndarray:
+    """Distances (km) from every point to one point."""
+    la = np.radians(np.asarray(lat, dtype=np.float64))
+    ln = np.radians(np.asarray(lng, dtype=np.float64))
+    la0 = np.radians(lat0)
+    a = np.sin((la - la0) / 2.0) ** 2 + np.cos(la) * np.cos(la0) * np.sin((ln - np.radians(lng0)) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def leg_lengths(lat: Sequence[float], lng: Sequence[float]) -> np.ndarray:
+    """Distances (km) between consecutive points of a path."""
+    la = np.radians(np.asarray(lat, dtype=np.float64))
+    ln = np.radians(np.asarray(lng, dtype=np.float64))
+    a = np.sin(np.diff(la) / 2.0) ** 2 + np.cos(la[:-1]) * np.cos(la[1:]) * np.sin(np.diff(ln) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def tour_cost(D: np.ndarray, tour: Sequence[int]) -> float:
+    t = np.asarray(tour)
+    if t.size < 2:
+        return 0.0
+    return float(D[t[:-1], t[1:]].sum())
+
+
+def nn_tour(D: np.ndarray, nodes: Optional[Sequence[int]] = None, start: int = 0) -> np.ndarray:
+    """Nearest-neighbour closed tour over `nodes` (default: all) starting and ending at `start`."""
+    if nodes is None:
+        nodes = range(D.shape[0])
+    todo = np.array([v for v in nodes if v != start], dtype=np.int64)
+    out = [start]
+    cur = start
+    alive = np.ones(todo.size, dtype=bool)
+    for _ in range(todo.size):
+        row = np.where(alive, D[cur, todo], np.inf)
+        k = int(np.argmin(row))
+        alive[k] = False
+        cur = int(todo[k])
+        out.append(cur)
+    out.append(start)
+    return np.array(out, dtype=np.int64)
+
+
+def two_opt(D: np.ndarray, tour: np.ndarray, deadline: float) -> np.ndarray:
+    """First-improvement 2-opt; each step scores every partner edge in one vector op."""
+    t = np.array(tour, dtype=np.int64)
+    n = t.size - 1  # number of edges
+    if n < 4:
+        return t
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(0, n - 2):
+            a, b = t[i], t[i + 1]
+            js = np.arange(i + 2, n if i > 0 else n - 1)
+            if js.size == 0:
+                continue
+            c = t[js]
+            d = t[js + 1]
+            delta = D[a, c] + D[b, d] - D[a, b] - D[c, d]
+            k = int(np.argmin(delta))
+            if delta[k] < -_EPS:
+                j = int(js[k])
+                t[i + 1:j + 1] = t[i + 1:j + 1][::-1].copy()
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return t
+
+
+def or_opt(D: np.ndarray, tour: np.ndarray, deadline: float, max_len: int = 3) -> np.ndarray:
+    """Relocate segments of 1..max_len stops (optionally reversed) to their best position."""
+    t = list(int(x) for x in tour)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for L in range(1, max_len + 1):
+            i = 1
+            while i + L < len(t):
+                if time.perf_counter() >= deadline:
+                    return np.array(t, dtype=np.int64)
+                seg = t[i:i + L]
+                prev, nxt = t[i - 1], t[i + L]
+                gain = D[prev, seg[0]] + D[seg[-1], nxt] - D[prev, nxt]
+                rest = np.array(t[:i] + t[i + L:], dtype=np.int64)
+                u = rest[:-1]
+                v = rest[1:]
+                fwd = D[u, seg[0]] + D[seg[-1], v] - D[u, v]
+                rev = D[u, seg[-1]] + D[seg[0], v] - D[u, v]
+                # inserting back where it came from is a no-op
+                fwd[i - 1] = np.inf
+                rev[i - 1] = np.inf
+                kf = int(np.argmin(fwd)); kr = int(np.argmin(rev))
+                best, k, flip = (fwd[kf], kf, False) if fwd[kf] <= rev[kr] else (rev[kr], kr, True)
+                if best - gain < -_EPS:
+                    ins = seg[::-1] if flip else seg
+                    t = list(rest[:k + 1]) + ins + list(rest[k + 1:])
+                    t = [int(x) for x in t]
+                    improved = True
+                else:
+                    i += 1
+    return np.array(t, dtype=np.int64)
+
+
+def improve(D: np.ndarray, tour: np.ndarray, deadline: float) -> np.ndarray:
+    """2-opt then Or-opt until neither helps or the deadline passes."""
+    best = np.asarray(tour, dtype=np.int64)
+    best_cost = tour_cost(D, best)
+    while time.perf_counter() < deadline:
+        cand = or_opt(D, two_opt(D, best, deadline), deadline)
+        c = tour_cost(D, cand)
+        if c < best_cost - _EPS:
+            best, best_cost = cand, c
+        else:
+            break
+    return best
+
+
+def orient(D: np.ndarray, tour: np.ndarray) -> np.ndarray:
+    """Canonical direction for a closed tour: visit the end nearer the depot first."""
+    t = np.asarray(tour, dtype=np.int64)
+    if t.size > 3 and D[t[0], t[1]] > D[t[-2], t[-1]] + _EPS:
+        return t[::-1].copy()
+    return t
+
+
+def split_tour(
+    order: Sequence[int],
+    D: np.ndarray,
+    demand: np.ndarray,
+    capacity: Optional[float],
+    max_cost: Optional[float],
+    balanced: bool = False,
+    limit: Optional[np.ndarray] = None,
+) -> List[List[int]]:
+    """
+    Optimal split of a giant tour into depot-to-depot trips (Prins' Split).
+    Trips respect `capacity` on summed demand and `max_cost` on round-trip cost
+    measured on `limit` (default D, the matrix being minimized).
+    With balanced=True, among splits using the fewest trips the longest trip is minimized.
+    """
+    L = D if limit is None else limit
+    seq = [int(x) for x in order]
+    n = len(seq)
+    INF = float("inf")
+    # label: (trips, longest, total) when balanced, (total,) otherwise
+    label: List[tuple] = [(0, 0.0, 0.0) if balanced else (0.0,)] + [(INF,)] * n
+    pred = [-1] * (n + 1)
+    for i in range(n):
+        if label[i][0] == INF:
+            continue
+        load = 0.0
+        path = 0.0
+        reach = 0.0
+        for j in range(i, n):
+            v = seq[j]
+            load += float(demand[v])
+            if capacity is not None and load > capacity + _EPS:
+                break
+            path = D[0, v] if j == i else path + D[seq[j - 1], v]
+            reach = L[0, v] if j == i else reach + L[seq[j - 1], v]
+            if max_cost is not None and reach > max_cost + _EPS:
+                break
+            c = float(path + D[v, 0])
+            if max_cost is not None and reach + L[v, 0] > max_cost + _EPS:
+                continue
+            if balanced:
+                trips, longest, total = label[i]
+                cand = (trips + 1, max(longest, c), total + c)
+            else:
+                cand = (label[i][0] + c,)
+            if cand < label[j + 1]:
+                label[j + 1] = cand
+                pred[j + 1] = i
+    if label[n][0] == INF:
+        return []
+    trips: List[List[int]] = []
+    j = n
+    while j > 0:
+        i = pred[j]
+        trips.append(seq[i:j])
+        j = i
+    trips.reverse()
+    return trips
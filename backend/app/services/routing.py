@@ -1,26 +1,48 @@
 # app/services/routing.py
 import os
+import time
+import asyncio
 import httpx
-from .matching import haversine  # re-use our distance helper
+import numpy as np
+from .matching import haversine_km  # re-use our distance helper
+from .road_graph import get_road_graph
+from . import route_opt, spatial
+from .polyline import encode as encode_polyline
+from .speed_profile import get_profile, path_minutes
+from . import time_windows as tw
+from datetime import datetime, timezone
 
 GOOGLE_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 OSRM_BASE = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
 
+# Wall-clock budget for one plan_route call (seconds)
+PLAN_BUDGET_S = float(os.getenv("ROUTE_PLAN_BUDGET_S", "1.5"))
+
+# Where stored route shapes come from: "" = road graph when configured, else
+# straight stop-to-stop segments; "osrm" / "google" = the provider's full polyline
+GEOMETRY_PROVIDER = os.getenv("ROUTE_GEOMETRY_PROVIDER", "").strip().lower()
+_PROVIDER_MAX_STOPS = {"osrm": 100, "google": 25}  # waypoints per request
+
+def haversine(a: dict, b: dict) -> float:
+    return haversine_km(a["lat"], a["lng"], b["lat"], b["lng"])
+
 def internal_plan(stops: list) -> dict:
     """
     Offline fallback. Expects stops = [{"lat":..,"lng":..}, ...]
-    Returns rough distance (km) via Haversine segments and ETA at ~25 km/h.
+    Returns rough distance (km) via Haversine segments and ETA from the speed profile.
     """
     if len(stops) < 2:
         return {"distance_km": 0.0, "duration_min": 0.0, "steps": []}
     dist = 0.0
     for i in range(len(stops) - 1):
         dist += haversine(stops[i], stops[i + 1])
-    duration_min = (dist / 25.0) * 60.0
+    duration_min = path_minutes(stops)
     return {
         "distance_km": round(dist, 3),
         "duration_min": round(duration_min, 1),
         "steps": [],
+        "geometry": encode_polyline([(float(s["lat"]), float(s["lng"])) for s in stops]),
+        "source": "stops",
     }
 
 async def google_plan(stops: list) -> dict:
@@ -46,13 +68,25 @@ async def google_plan(stops: list) -> dict:
     if not data.get("routes"):
         return internal_plan(stops)
 
-    legs = data["routes"][0]["legs"]
+    route = data["routes"][0]
+    legs = route["legs"]
     dist_km = sum(leg["distance"]["value"] for leg in legs) / 1000
     dur_min = sum(leg["duration"]["value"] for leg in legs) / 60
     return {
         "distance_km": round(dist_km, 3),
         "duration_min": round(dur_min, 1),
-        "steps": legs,
+        # per-leg summary only; the shape lives in `geometry`
+        "steps": [
+            {
+                "distance_km": round(leg["distance"]["value"] / 1000, 3),
+                "duration_min": round(leg["duration"]["value"] / 60, 1),
+                "start": leg.get("start_location"),
+                "end": leg.get("end_location"),
+            }
+            for leg in legs
+        ],
+        "geometry": (route.get("overview_polyline") or {}).get("points"),
+        "source": "google",
     }
 
 async def osrm_plan(stops: list) -> dict:
@@ -64,7 +98,7 @@ async def osrm_plan(stops: list) -> dict:
 
     coords = ";".join(f'{s["lng"]},{s["lat"]}' for s in stops)
     url = f"{OSRM_BASE}/route/v1/driving/{coords}"
-    params = {"overview": "false", "steps": "false", "geometries": "polyline"}
+    params = {"overview": "full", "steps": "false", "geometries": "polyline"}
 
     async with httpx.AsyncClient(timeout=20) as c:
         r = await c.get(url, params=params)
@@ -81,4 +115,193 @@ async def osrm_plan(stops: list) -> dict:
         "distance_km": round(dist_km, 3),
         "duration_min": round(dur_min, 1),
         "steps": [],
+        "geometry": route.get("geometry"),  # polyline, precision 5
+        "source": "osrm",
+    }
+
+def _road_path(graph, stops: list):
+    """(seconds, meters, node path) through all stops in order, or None if a leg is unreachable."""
+    nodes = [graph.nearest_node(float(s["lat"]), float(s["lng"])) for s in stops]
+    dist_m = 0.0
+    dur_s = 0.0
+    path: list = []
+    for a, b in zip(nodes, nodes[1:]):
+        res = graph.shortest_path(a, b)
+        if res is None:
+            return None
+        dur_s += res[0]
+        dist_m += res[1]
+        path.extend(res[2] if not path else res[2][1:])
+    return dur_s, dist_m, path
+
+def _road_plan_sync(graph, stops: list) -> dict:
+    res = _road_path(graph, stops)
+    if res is None:
+        return internal_plan(stops)
+    dur_s, dist_m, path = res
+    return {
+        "distance_km": round(dist_m / 1000, 3),
+        "duration_min": round(dur_s / 60, 1),
+        "steps": [],
+        "geometry": encode_polyline(graph.path_coords(path)),
+        "source": "road",
+    }
+
+def stops_geometry(stops: list) -> tuple:
+    """
+    (polyline, source) for drawing a stop sequence: road-following when the
+    road graph is configured, straight segments otherwise. CPU-bound; call
+    from a thread.
+    """
+    graph = get_road_graph()
+    if graph is not None and len(stops) >= 2:
+        res = _road_path(graph, stops)
+        if res is not None:
+            return encode_polyline(graph.path_coords(res[2])), "road"
+    return encode_polyline([(float(s["lat"]), float(s["lng"])) for s in stops]), "stops"
+
+async def route_geometry(stops: list) -> tuple:
+    """
+    (polyline, source) to store for a route: the ROUTE_GEOMETRY_PROVIDER's
+    road polyline when one is configured and answers, else stops_geometry().
+    """
+    plan = {"osrm": osrm_plan, "google": google_plan}.get(GEOMETRY_PROVIDER)
+    if plan is not None and 2 <= len(stops) <= _PROVIDER_MAX_STOPS[GEOMETRY_PROVIDER]:
+        try:
+            res = await plan(stops)
+        except (httpx.HTTPError, KeyError, ValueError):
+            res = {}
+        if res.get("source") == GEOMETRY_PROVIDER and res.get("geometry"):
+            return res["geometry"], res["source"]
+    return await asyncio.to_thread(stops_geometry, stops)
+
+async def road_plan(stops: list) -> dict:
+    """
+    In-process router on the memory-mapped road graph (ROAD_GRAPH_DIR).
+    Same shape as osrm_plan; falls back to internal_plan when no graph is configured.
+    """
+    graph = get_road_graph()
+    if graph is None or len(stops) < 2:
+        return internal_plan(stops)
+    # searches are CPU-bound; keep them off the event loop
+    return await asyncio.to_thread(_road_plan_sync, graph, stops)
+
+# --------------------------------------------------
+# Capacitated / distance-limited planning (POST /routes/plan)
+# --------------------------------------------------
+def plan_route(req: dict) -> dict:
+    """
+    Plan depot-to-depot trips for the stops in a PlanRequest-shaped dict.
+
+    1) giant tour over all stops (nearest neighbour + 2-opt/Or-opt)
+    2) optimal split into trips feasible for vehicle_capacity / max_distance_km
+    3) each trip re-optimized on its own, oriented nearest-end first
+
+    When any stop has a time_window, trips are instead built one after another
+    by cheapest feasible insertion and improved with window-checked moves
+    (see services/time_windows.py); ETAs then include waiting for windows.
+
+    Stops that can't be served (demand > capacity, round trip > max distance,
+    window unreachable) are returned in `unassigned` instead of being dropped.
+    Caveats about how the request was served are listed in `notes`.
+    """
+    t0 = time.perf_counter()
+    budget = float(req.get("time_budget_s") or PLAN_BUDGET_S)
+    deadline = t0 + budget
+
+    depot = req["depot"]          # [lon, lat]
+    stops = req.get("stops") or []
+    cap = req.get("vehicle_capacity")
+    max_km = req.get("max_distance_km")
+    objective = req.get("objective") or "shortest_path"
+    depart = req.get("depart_at") or datetime.now(timezone.utc)
+    if depart.tzinfo is None:
+        depart = depart.replace(tzinfo=timezone.utc)
+
+    lat = [float(depot[1])] + [float(s["coord"][1]) for s in stops]
+    lng = [float(depot[0])] + [float(s["coord"][0]) for s in stops]
+    D = route_opt.haversine_matrix(lat, lng)
+    T = get_profile().minutes_matrix(lat, lng, depart, D=D)  # minutes at the departure hour
+    C = T if objective == "min_time" else D
+    demand = np.array([0.0] + [abs(float(s.get("demand") or 0.0)) for s in stops])
+
+    unassigned = []
+    notes = []
+    nodes = []
+    for v in range(1, len(lat)):
+        if cap is not None and demand[v] > cap:
+            unassigned.append({"id": stops[v - 1]["id"], "reason": "demand exceeds vehicle_capacity"})
+        elif max_km is not None and D[0, v] + D[v, 0] > max_km:
+            unassigned.append({"id": stops[v - 1]["id"], "reason": "round trip exceeds max_distance_km"})
+        else:
+            nodes.append(v)
+
+    windowed = any(s.get("time_window") for s in stops)
+    trips = []
+    starts = []
+    if nodes and windowed:
+        e = np.full(len(lat), -np.inf)
+        l = np.full(len(lat), np.inf)
+        svc = np.zeros(len(lat))
+        for v, s in enumerate(stops, start=1):
+            e[v], l[v] = tw.window(depart, s.get("time_window"))
+            svc[v] = float(s["service_min"] if s.get("service_min") is not None else tw.SERVICE_MIN)
+        e[0] = 0.0
+        if objective == "balanced":
+            notes.append("objective 'balanced' is not supported with time windows; "
+                         "trips were built for shortest distance")
+        routes, starts, late = tw.build_trips(nodes, T, C, D, e, l, svc, demand, cap, max_km, deadline)
+        trips = [np.array(r, dtype=np.int64) for r in routes]
+        for v in late:
+            unassigned.append({"id": stops[v - 1]["id"], "reason": "time window cannot be met"})
+    elif nodes:
+        # nearest-neighbour construction via the KD-tree, then local search
+        nn = spatial.nn_order((lat[0], lng[0]), [lat[v] for v in nodes], [lng[v] for v in nodes])
+        start = np.array([0] + [nodes[k] for k in nn] + [0], dtype=np.int64)
+        giant = route_opt.improve(C, start, t0 + budget * 0.6)
+        # trips are costed on C but always limited on km (D)
+        trips = route_opt.split_tour(giant[1:-1], C, demand, cap, max_km,
+                                     balanced=(objective == "balanced"), limit=D)
+        if not trips:
+            for v in nodes:
+                unassigned.append({"id": stops[v - 1]["id"], "reason": "no trip split fits the limits"})
+        polished = []
+        for trip in trips:
+            tour = np.array([0] + trip + [0], dtype=np.int64)
+            tour = route_opt.improve(C, tour, deadline)
+            # a re-optimized trip must still fit the distance limit
+            if max_km is not None and route_opt.tour_cost(D, tour) > max_km:
+                tour = np.array([0] + trip + [0], dtype=np.int64)
+            polished.append(route_opt.orient(C, tour))
+        trips = polished
+
+    ids = ["DEPOT"] + [s["id"] for s in stops]
+    ordered, legs, trip_ids = [], [], []
+    clock = 0.0
+    total = 0.0
+    for k, tour in enumerate(trips):
+        trip_ids.append([ids[v] for v in tour[1:-1]])
+        ordered.extend(trip_ids[-1])
+        if windowed:
+            arr, _, _ = tw.schedule(tour, T, e, l, svc, starts[k])
+        for i, (a, b) in enumerate(zip(tour[:-1], tour[1:])):
+            clock = float(arr[i + 1]) if windowed else clock + float(T[a, b])
+            total += float(D[a, b])
+            legs.append({
+                "from_id": ids[a],
+                "to_id": ids[b],
+                "distance_km": round(float(D[a, b]), 3),
+                "eta_min": round(clock, 1),
+            })
+
+    pos = {sid: i for i, sid in enumerate(ids)}
+    unassigned.sort(key=lambda u: pos[u["id"]])
+    return {
+        "ordered_stop_ids": ordered,
+        "legs": legs,
+        "total_distance_km": round(total, 3),
+        "trips": trip_ids,
+        "unassigned": unassigned,
+        "notes": notes,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
     }
@@ -0,0 +1,121 @@
+# app/services/spatial.py
+"""
+Nearest-unvisited queries for tour construction.
+
+NearestIndex is a static KD-tree over stop coordinates with O(log n)
+deletion: every node keeps the number of live points in its subtree, so
+searches skip emptied branches and "nearest unvisited" stays logarithmic
+on average as stops are consumed.
+
+Coordinates are projected to a local equirectangular plane (km) around the
+mean latitude. At city scale the ordering matches haversine distances.
+"""
+from __future__ import annotations
+
+import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+_KM_PER_DEG = 111.32
+
+
+class NearestIndex:
+    def __init__(self, lat: Sequence[float], lng: Sequence[float]):
+        la = np.asarray(lat, dtype=np.float64)
+        ln = np.asarray(lng, dtype=np.float64)
+        self.n = int(la.size)
+        self._kx = _KM_PER_DEG * math.cos(math.radians(float(la.mean()))) if self.n else _KM_PER_DEG
+        xs = ln * self._kx
+        ys = la * _KM_PER_DEG
+        self._x: List[float] = xs.tolist()
+        self._y: List[float] = ys.tolist()
+
+        # implicit tree over a permutation: node k covers perm[lo:hi], its point is perm[mid]
+        self._perm = np.arange(self.n)
+        self._lo: List[int] = []
+        self._hi: List[int] = []
+        self._pt: List[int] = []
+        self._axis: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._parent: List[int] = []
+        self._live: List[int] = []
+        self._node_of = [0] * self.n
+        self.alive = [True] * self.n
+        pts = np.column_stack([xs, ys]) if self.n else np.zeros((0, 2))
+        self._root = self._build(pts, 0, self.n, 0, -1)
+
+    def _build(self, pts: np.ndarray, lo: int, hi: int, depth: int, parent: int) -> int:
+        if lo >= hi:
+            return -1
+        sub = self._perm[lo:hi]
+        spread = pts[sub].max(axis=0) - pts[sub].min(axis=0)
+        axis = int(np.argmax(spread))
+        mid = (hi - lo) // 2
+        part = np.argpartition(pts[sub, axis], mid)
+        self._perm[lo:hi] = sub[part]
+        k = len(self._pt)
+        p = int(self._perm[lo + mid])
+        self._lo.append(lo); self._hi.append(hi)
+        self._pt.append(p); self._axis.append(axis)
+        self._left.append(-1); self._right.append(-1)
+        self._parent.append(parent); self._live.append(hi - lo)
+        self._node_of[p] = k
+        self._left[k] = self._build(pts, lo, lo + mid, depth + 1, k)
+        self._right[k] = self._build(pts, lo + mid + 1, hi, depth + 1, k)
+        return k
+
+    def __len__(self) -> int:
+        return self._live[self._root] if self._root >= 0 else 0
+
+    def remove(self, i: int) -> None:
+        if not self.alive[i]:
+            return
+        self.alive[i] = False
+        k = self._node_of[i]
+        while k >= 0:
+            self._live[k] -= 1
+            k = self._parent[k]
+
+    def nearest(self, lat: float, lng: float) -> int:
+        """Index of the closest live point, or -1 when none are left."""
+        return self.nearest_xy(lng * self._kx, lat * _KM_PER_DEG)
+
+    def nearest_xy(self, qx: float, qy: float) -> int:
+        if len(self) == 0:
+            return -1
+        best = [math.inf, -1]
+        x, y, live, alive = self._x, self._y, self._live, self.alive
+        stack: List[Tuple[int, float]] = [(self._root, 0.0)]
+        while stack:
+            k, bound = stack.pop()
+            if k < 0 or live[k] == 0 or bound >= best[0]:
+                continue
+            p = self._pt[k]
+            if alive[p]:
+                d = (x[p] - qx) ** 2 + (y[p] - qy) ** 2
+                if d < best[0]:
+                    best[0] = d; best[1] = p
+            diff = (qx - x[p]) if self._axis[k] == 0 else (qy - y[p])
+            near, far = (self._left[k], self._right[k]) if diff < 0 else (self._right[k], self._left[k])
+            # push far first so the near side is explored first
+            stack.append((far, diff * diff))
+            stack.append((near, 0.0))
+        return best[1]
+
+    def point_xy(self, i: int) -> Tuple[float, float]:
+        return self._x[i], self._y[i]
+
+
+def nn_order(start: Tuple[float, float], lat: Sequence[float], lng: Sequence[float]) -> List[int]:
+    """Greedy nearest-neighbour visiting order of all points, starting from `start` (lat, lng)."""
+    idx = NearestIndex(lat, lng)
+    out: List[int] = []
+    cur = idx.nearest(start[0], start[1])
+    while cur >= 0:
+        out.append(cur)
+        idx.remove(cur)
+        cx, cy = idx.point_xy(cur)
+        cur = idx.nearest_xy(cx, cy)
+    return out
@@ -0,0 +1,274 @@
+# app/services/speed_profile.py
+"""
+Time-dependent travel speeds for offline ETAs.
+
+The profile is one small array: speed (km/h) per hour of the week (Mon 00:00
+= 0 … Sun 23:00 = 167) × grid cell (SPEED_CELL_DEG, ~2 km). Unknown cells fall
+back to the hour-of-week speed, and with no profile at all every lookup is
+DEFAULT_SPEED_KMH. So the rest of the code can always ask for a speed.
+
+Speeds are "effective straight-line" speeds: they are learned from completed
+routes as haversine km over wall-clock time (started_at → completed_at),
+including stops. They go with the haversine distances used everywhere else.
+
+Lookups are vectorized; a whole n×n minutes matrix is a few numpy ops.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover
+    ZoneInfo = None
+
+from app.services.route_opt import haversine_matrix, leg_lengths
+
+DEFAULT_SPEED_KMH = float(os.getenv("DEFAULT_SPEED_KMH", "25.0"))
+SPEED_PROFILE_PATH = os.getenv("SPEED_PROFILE_PATH")
+SPEED_CELL_DEG = float(os.getenv("SPEED_CELL_DEG", "0.02"))
+SPEED_PROFILE_TZ = os.getenv("SPEED_PROFILE_TZ", "Asia/Manila")
+
+HOURS = 168
+_KEY_MUL = 1_000_003
+_PRIOR_KM = 5.0            # pseudo-km of evidence behind every prior
+_MIN_KMH, _MAX_KMH = 2.0, 90.0
+
+
+def _tz():
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(SPEED_PROFILE_TZ)
+        except Exception:
+            pass
+    return timezone(timedelta(hours=8))
+
+
+def hour_of_week(when: Optional[datetime] = None) -> int:
+    """Local hour of the week; naive datetimes are UTC (what pymongo returns)."""
+    when = when or datetime.now(timezone.utc)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    local = when.astimezone(_tz())
+    return local.weekday() * 24 + local.hour
+
+
+def _cell_keys(lat, lng, cell_deg: float) -> np.ndarray:
+    r = np.floor(np.asarray(lat, dtype=np.float64) / cell_deg).astype(np.int64)
+    c = np.floor(np.asarray(lng, dtype=np.float64) / cell_deg).astype(np.int64)
+    return r * _KEY_MUL + c
+
+
+class SpeedProfile:
+    def __init__(self, cell_keys: np.ndarray, speed: np.ndarray, hour_speed: np.ndarray,
+                 cell_deg: float = SPEED_CELL_DEG, meta: Optional[Dict[str, Any]] = None):
+        self.cell_keys = np.asarray(cell_keys, dtype=np.int64)      # sorted, [C]
+        self.speed = np.asarray(speed, dtype=np.float32)            # [168, C]
+        self.hour_speed = np.asarray(hour_speed, dtype=np.float32)  # [168]
+        self.cell_deg = float(cell_deg)
+        self.meta = meta or {}
+
+    @classmethod
+    def flat(cls, kmh: float = DEFAULT_SPEED_KMH) -> "SpeedProfile":
+        return cls(np.zeros(0, np.int64), np.zeros((HOURS, 0), np.float32), np.full(HOURS, kmh, np.float32))
+
+    # --------------------------------------------------
+    # Lookup
+    # --------------------------------------------------
+    def speed_kmh(self, lat, lng, how) -> np.ndarray:
+        """Speed for points (arrays broadcast together) at hour(s) of week `how`."""
+        how = np.asarray(how, dtype=np.int64) % HOURS
+        lat = np.asarray(lat, dtype=np.float64)
+        base = self.hour_speed[how]
+        if self.cell_keys.size == 0:
+            return np.broadcast_to(base, np.broadcast(lat, how).shape).astype(np.float64)
+        keys = _cell_keys(lat, lng, self.cell_deg)
+        pos = np.clip(np.searchsorted(self.cell_keys, keys), 0, self.cell_keys.size - 1)
+        hit = self.cell_keys[pos] == keys
+        out = np.where(hit, self.speed[how, pos], base)
+        return out.astype(np.float64)
+
+    def minutes_matrix(self, lat: Sequence[float], lng: Sequence[float],
+                       depart: Optional[datetime] = None, D: Optional[np.ndarray] = None) -> np.ndarray:
+        """n×n travel minutes at the departure hour, speed taken at each leg's midpoint."""
+        la = np.asarray(lat, dtype=np.float64)
+        ln = np.asarray(lng, dtype=np.float64)
+        if D is None:
+            D = haversine_matrix(la, ln)
+        v = self.speed_kmh((la[:, None] + la[None, :]) / 2.0, (ln[:, None] + ln[None, :]) / 2.0,
+                           hour_of_week(depart))
+        return D / v * 60.0
+
+    def path_minutes(self, lat: Sequence[float], lng: Sequence[float],
+                     depart: Optional[datetime] = None) -> np.ndarray:
+        """Minutes per leg of a path. The clock moves along, so later legs use later hours."""
+        la = np.asarray(lat, dtype=np.float64)
+        ln = np.asarray(lng, dtype=np.float64)
+        if la.size < 2:
+            return np.zeros(0)
+        km = leg_lengths(la, ln)
+        mid_la = (la[:-1] + la[1:]) / 2.0
+        mid_ln = (ln[:-1] + ln[1:]) / 2.0
+        start = depart or datetime.now(timezone.utc)
+        h0 = hour_of_week(start)
+        # most paths finish inside the departure hour: price every leg at h0 and
+        # only walk the legs one by one when the clock crosses into the next hour
+        mins = km / self.speed_kmh(mid_la, mid_ln, h0) * 60.0
+        into_hour = start.minute + start.second / 60.0
+        if into_hour + mins.sum() < 60.0:
+            return mins
+        out = np.empty_like(km)
+        clock = into_hour
+        for k in range(km.size):
+            v = float(self.speed_kmh(mid_la[k], mid_ln[k], h0 + int(clock // 60)))
+            out[k] = km[k] / v * 60.0
+            clock += out[k]
+        return out
+
+    # --------------------------------------------------
+    # Build / persist
+    # --------------------------------------------------
+    @classmethod
+    def build(cls, routes: Iterable[Dict[str, Any]], cell_deg: float = SPEED_CELL_DEG) -> "SpeedProfile":
+        """
+        Learn speeds from completed routes (steps + started_at/completed_at).
+        Each leg is credited to its midpoint cell and to the hour when the
+        vehicle was on it, with the route's own average speed.
+        """
+        hows, keys, kms, hrs = [], [], [], []
+        used = 0
+        for r in routes:
+            obs = _observe(r)
+            if obs is None:
+                continue
+            t0, v, lat, lng, km = obs
+            cum_h = np.concatenate([[0.0], np.cumsum(km)]) / v
+            mid_h = (cum_h[:-1] + cum_h[1:]) / 2.0
+            hows.append((hour_of_week(t0) + np.floor((t0.minute / 60.0) + mid_h)).astype(np.int64) % HOURS)
+            keys.append(_cell_keys((lat[:-1] + lat[1:]) / 2.0, (lng[:-1] + lng[1:]) / 2.0, cell_deg))
+            kms.append(km)
+            hrs.append(km / v)
+            used += 1
+        if not used:
+            prof = cls.flat()
+            prof.meta = {"routes": 0}
+            return prof
+
+        how = np.concatenate(hows)
+        key = np.concatenate(keys)
+        km = np.concatenate(kms)
+        hr = np.concatenate(hrs)
+        cell_keys, cell = np.unique(key, return_inverse=True)
+        cell = cell.reshape(-1)
+        C = cell_keys.size
+
+        km_hc = np.zeros((HOURS, C)); hr_hc = np.zeros((HOURS, C))
+        np.add.at(km_hc, (how, cell), km)
+        np.add.at(hr_hc, (how, cell), hr)
+
+        # hour-of-week speeds, shrunk toward the global default
+        km_h = km_hc.sum(axis=1); hr_h = hr_hc.sum(axis=1)
+        hour_speed = (km_h + _PRIOR_KM) / (hr_h + _PRIOR_KM / DEFAULT_SPEED_KMH)
+        # how much faster/slower each cell is than its hours suggest: the time the
+        # hour speeds predict for its legs over the time they actually took
+        expected_hr = (km_hc / hour_speed[:, None]).sum(axis=0)
+        prior_hr = _PRIOR_KM / DEFAULT_SPEED_KMH
+        factor = (expected_hr + prior_hr) / (hr_hc.sum(axis=0) + prior_hr)
+        prior = hour_speed[:, None] * factor[None, :]
+        speed = (km_hc + _PRIOR_KM) / (hr_hc + _PRIOR_KM / prior)
+        speed = np.clip(speed, _MIN_KMH, _MAX_KMH)
+        return cls(cell_keys, speed, np.clip(hour_speed, _MIN_KMH, _MAX_KMH), cell_deg,
+                   {"routes": used, "legs": int(km.size), "cells": int(C)})
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            cell_keys=self.cell_keys,
+            speed=self.speed.astype(np.float16),
+            hour_speed=self.hour_speed,
+            cell_deg=np.array(self.cell_deg),
+            routes=np.array(int(self.meta.get("routes", 0))),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "SpeedProfile":
+        with np.load(path) as z:
+            return cls(z["cell_keys"], z["speed"].astype(np.float32), z["hour_speed"],
+                       float(z["cell_deg"]), {"routes": int(z["routes"])})
+
+
+def _observe(route: Dict[str, Any]):
+    """(start, km/h, lat[], lng[], leg_km[]) for a usable completed route, else None."""
+    t0, t1 = route.get("started_at"), route.get("completed_at")
+    steps = route.get("steps") or []
+    if not isinstance(t0, datetime) or not isinstance(t1, datetime) or len(steps) < 2:
+        return None
+    if t0.tzinfo is None:
+        t0 = t0.replace(tzinfo=timezone.utc)
+    if t1.tzinfo is None:
+        t1 = t1.replace(tzinfo=timezone.utc)
+    hours = (t1 - t0).total_seconds() / 3600.0
+    try:
+        lat = np.array([float(s["lat"]) for s in steps])
+        lng = np.array([float(s["lng"]) for s in steps])
+    except (KeyError, TypeError, ValueError):
+        return None
+    km = leg_lengths(lat, lng)
+    total = float(km.sum())
+    if hours <= 1.0 / 60 or total <= 0.1:
+        return None
+    v = total / hours
+    if not (_MIN_KMH <= v <= _MAX_KMH):
+        return None  # clock left running, or timestamps from a test
+    return t0, v, lat, lng, km
+
+
+def evaluate(routes: Iterable[Dict[str, Any]], profile: "SpeedProfile") -> Dict[str, Any]:
+    """ETA error of `profile` vs the flat DEFAULT_SPEED_KMH on completed routes (minutes)."""
+    flat = SpeedProfile.flat()
+    actual: List[float] = []; pred: List[float] = []; base: List[float] = []
+    for r in routes:
+        obs = _observe(r)
+        if obs is None:
+            continue
+        t0, v, lat, lng, km = obs
+        actual.append(float(km.sum()) / v * 60.0)
+        pred.append(float(profile.path_minutes(lat, lng, t0).sum()))
+        base.append(float(flat.path_minutes(lat, lng, t0).sum()))
+    if not actual:
+        return {"routes": 0}
+    a, p, b = np.array(actual), np.array(pred), np.array(base)
+    return {
+        "routes": int(a.size),
+        "mae_min": round(float(np.abs(p - a).mean()), 2),
+        "mape": round(float((np.abs(p - a) / a).mean()), 4),
+        "baseline_mae_min": round(float(np.abs(b - a).mean()), 2),
+        "baseline_mape": round(float((np.abs(b - a) / a).mean()), 4),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_profile() -> SpeedProfile:
+    """Profile from SPEED_PROFILE_PATH, or a flat DEFAULT_SPEED_KMH one."""
+    if SPEED_PROFILE_PATH and os.path.isfile(SPEED_PROFILE_PATH):
+        try:
+            return SpeedProfile.load(SPEED_PROFILE_PATH)
+        except Exception:
+            pass
+    return SpeedProfile.flat()
+
+
+def path_minutes(points: Sequence[Any], depart: Optional[datetime] = None) -> float:
+    """Total minutes along stops/steps ({"lat","lng"} dicts or (lat, lng) pairs)."""
+    if len(points) < 2:
+        return 0.0
+    if isinstance(points[0], dict):
+        lat = [float(p["lat"]) for p in points]; lng = [float(p["lng"]) for p in points]
+    else:
+        lat = [float(p[0]) for p in points]; lng = [float(p[1]) for p in points]
+    return float(get_profile().path_minutes(lat, lng, depart).sum())
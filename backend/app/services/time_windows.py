@@ -0,0 +1,283 @@
+# app/services/time_windows.py
+"""
+Time-window scheduling for routes (VRPTW).
+
+Times are minutes after the plan's departure. Every node v has a window
+[e[v], l[v]] (±inf when open) and a service time s[v]. A route is a list of
+nodes that starts and ends at the depot (node 0). Arriving early means
+waiting until e[v]; starting after l[v] is infeasible.
+
+schedule() propagates arrival/start times along a route and computes the
+forward time slack (Savelsbergh):
+
+    F[k] = min(l[k] - start[k], wait[k+1] + F[k+1])
+
+F[k] is how much the start at position k can be pushed back without
+breaking a window further down. So "can u go between positions p and p+1?"
+is an O(1) test: u's own window, plus the push it causes at p+1 against
+F[p+1]. Construction and relocate moves use that test; an accepted move
+recomputes the schedule once in O(len).
+
+`group` (optional, per node) pins an order between blocks of nodes, e.g.
+pickups (0) before drops (1): moves never put a lower group after a higher one.
+"""
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INF = float("inf")
+SERVICE_MIN = float(os.getenv("STOP_SERVICE_MIN", "0"))  # default minutes spent at each stop
+_EPS = 1e-6
+
+
+# --------------------------------------------------
+# Windows from documents
+# --------------------------------------------------
+def _as_dt(x: Any) -> Optional[datetime]:
+    if isinstance(x, datetime):
+        dt = x
+    elif isinstance(x, str) and x:
+        try:
+            dt = datetime.fromisoformat(x.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def to_minutes(x: Any, t0: datetime) -> Optional[float]:
+    dt = _as_dt(x)
+    return None if dt is None else (dt - t0).total_seconds() / 60.0
+
+
+def window(t0: datetime, tw: Optional[Dict[str, Any]] = None, ready_after: Any = None) -> Tuple[float, float]:
+    """(earliest, latest) minutes after t0 for a TimeWindow-shaped dict and/or a ready_after time."""
+    tw = tw or {}
+    starts = [m for m in (to_minutes(tw.get("start"), t0), to_minutes(ready_after, t0)) if m is not None]
+    end = to_minutes(tw.get("end"), t0)
+    return (max(starts) if starts else -INF), (end if end is not None else INF)
+
+
+# --------------------------------------------------
+# Schedule and O(1) insertion test
+# --------------------------------------------------
+def schedule(route: Sequence[int], T: np.ndarray, e: np.ndarray, l: np.ndarray, s: np.ndarray,
+             t_start: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(arrival, start, forward slack) per position; infeasible where start > l."""
+    L = len(route)
+    arr = np.empty(L); beg = np.empty(L); F = np.empty(L)
+    arr[0] = t_start
+    beg[0] = max(t_start, e[route[0]])
+    for k in range(1, L):
+        u, v = route[k - 1], route[k]
+        arr[k] = beg[k - 1] + s[u] + T[u, v]
+        beg[k] = arr[k] if arr[k] > e[v] else e[v]
+    late = l[np.asarray(route)] - beg
+    F[L - 1] = late[L - 1]
+    for k in range(L - 2, -1, -1):
+        f = beg[k + 1] - arr[k + 1] + F[k + 1]
+        F[k] = late[k] if late[k] < f else f
+    return arr, beg, F
+
+
+def feasible(route: Sequence[int], beg: np.ndarray, l: np.ndarray) -> bool:
+    return bool((beg <= l[np.asarray(route)] + _EPS).all())
+
+
+def insertion(route: Sequence[int], beg: np.ndarray, F: np.ndarray, cand: np.ndarray,
+              T: np.ndarray, C: np.ndarray, e: np.ndarray, l: np.ndarray, s: np.ndarray,
+              gpos: Optional[np.ndarray] = None, gcand: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cost delta and feasibility of inserting each candidate between every pair of
+    consecutive positions, as (P, U) arrays (P = len(route) - 1). All O(1) per cell.
+    """
+    r = np.asarray(route)
+    a, b = r[:-1], r[1:]
+    cand = np.asarray(cand)
+    arr_u = (beg[:-1] + s[a])[:, None] + T[a][:, cand]
+    beg_u = np.maximum(arr_u, e[cand][None, :])
+    ok = beg_u <= l[cand][None, :] + _EPS
+    arr_b = beg_u + s[cand][None, :] + T[cand][:, b].T
+    push = np.maximum(arr_b, e[b][:, None]) - beg[1:][:, None]
+    ok &= push <= F[1:][:, None] + _EPS
+    if gpos is not None:
+        ok &= (gpos[:-1][:, None] <= gcand[None, :]) & (gcand[None, :] <= gpos[1:][:, None])
+    delta = C[a][:, cand] + C[cand][:, b].T - C[a, b][:, None]
+    return delta, ok
+
+
+def _gpos(route: Sequence[int], group: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if group is None:
+        return None
+    g = group[np.asarray(route)].astype(np.float64)
+    g[0], g[-1] = -INF, INF  # the depot bounds every block
+    return g
+
+
+# --------------------------------------------------
+# Improvement
+# --------------------------------------------------
+def improve(route: List[int], T: np.ndarray, C: np.ndarray, e: np.ndarray, l: np.ndarray, s: np.ndarray,
+            t_start: float, deadline: float, group: Optional[np.ndarray] = None) -> List[int]:
+    """Relocate (O(1) window test per move) and 2-opt (checked on improving moves only)."""
+    route = list(route)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        # --- relocate one node
+        _, beg, F = schedule(route, T, e, l, s, t_start)
+        p = 1
+        while p < len(route) - 1 and time.perf_counter() < deadline:
+            u = route[p]
+            prev, nxt = route[p - 1], route[p + 1]
+            gain = C[prev, u] + C[u, nxt] - C[prev, nxt]
+            gp = _gpos(route, group)
+            delta, ok = insertion(route, beg, F, np.array([u]), T, C, e, l, s,
+                                  gp, None if group is None else group[[u]].astype(np.float64))
+            delta = np.where(ok[:, 0], delta[:, 0], INF)
+            delta[p - 1] = delta[p] = INF  # edges touching u itself
+            q = int(np.argmin(delta))
+            if delta[q] - gain < -_EPS:
+                cand = route[:p] + route[p + 1:]
+                at = q + 1 if q < p else q
+                cand = cand[:at] + [u] + cand[at:]
+                _, b2, F2 = schedule(cand, T, e, l, s, t_start)
+                # slack was read before u left the route; confirm on the real schedule
+                if feasible(cand, b2, l):
+                    route, beg, F = cand, b2, F2
+                    improved = True
+                    continue
+            p += 1
+        # --- 2-opt inside one block
+        n = len(route) - 1
+        gp = _gpos(route, group)
+        r = np.asarray(route)
+        for i in range(0, n - 2):
+            if time.perf_counter() >= deadline:
+                break
+            js = np.arange(i + 2, n)
+            delta = C[r[i], r[js]] + C[r[i + 1], r[js + 1]] - C[r[i], r[i + 1]] - C[r[js], r[js + 1]]
+            if gp is not None:
+                delta = np.where(gp[i + 1] == gp[js], delta, INF)
+            # only the few best improving reversals get the O(len) window check
+            for k in np.argsort(delta)[:8]:
+                if delta[k] >= -_EPS:
+                    break
+                j = int(js[k])
+                cand = route[:i + 1] + route[i + 1:j + 1][::-1] + route[j + 1:]
+                _, b2, _ = schedule(cand, T, e, l, s, t_start)
+                if feasible(cand, b2, l):
+                    route = cand
+                    r = np.asarray(route)
+                    improved = True
+                    break
+    return route
+
+
+# --------------------------------------------------
+# Construction (plan_route)
+# --------------------------------------------------
+def build_trips(
+    nodes: Sequence[int], T: np.ndarray, C: np.ndarray, D: np.ndarray,
+    e: np.ndarray, l: np.ndarray, s: np.ndarray, demand: np.ndarray,
+    capacity: Optional[float], max_km: Optional[float], deadline: float,
+) -> Tuple[List[List[int]], List[float], List[int]]:
+    """
+    Sequential trips of one vehicle, each built by cheapest feasible insertion
+    seeded with the most urgent stop. A trip starts when the previous one is
+    back at the depot. Returns (trips as full routes [0,…,0], start times, unscheduled nodes).
+    """
+    left = np.array(sorted(set(int(v) for v in nodes)), dtype=np.int64)
+    trips: List[List[int]] = []
+    starts: List[float] = []
+    clock = max(0.0, e[0])
+    cap = INF if capacity is None else float(capacity)
+    lim = INF if max_km is None else float(max_km)
+    while left.size:
+        # stops still reachable on their own from this departure
+        arr = clock + s[0] + T[0, left]
+        beg = np.maximum(arr, e[left])
+        back = beg + s[left] + T[left, 0]
+        alone = (beg <= l[left] + _EPS) & (back <= l[0] + _EPS)
+        if not alone.any():
+            break
+        seeds = left[alone]
+        seed = int(seeds[np.lexsort((-D[0, seeds], l[seeds]))[0]])
+        route = [0, seed, 0]
+        load = float(demand[seed])
+        dist = float(D[0, seed] + D[seed, 0])
+        pool = seeds[seeds != seed]
+        while pool.size and time.perf_counter() < deadline:
+            _, beg_r, F = schedule(route, T, e, l, s, clock)
+            delta, ok = insertion(route, beg_r, F, pool, T, C, e, l, s)
+            r = np.asarray(route)
+            dd = D[r[:-1]][:, pool] + D[pool][:, r[1:]].T - D[r[:-1], r[1:]][:, None]
+            ok &= (load + demand[pool] <= cap + _EPS)[None, :]
+            ok &= dist + dd <= lim + _EPS
+            cost = np.where(ok, delta, INF)
+            p, k = np.unravel_index(int(np.argmin(cost)), cost.shape)
+            if cost[p, k] == INF:
+                break
+            u = int(pool[k])
+            route.insert(int(p) + 1, u)
+            load += float(demand[u])
+            dist += float(dd[p, k])
+            pool = np.delete(pool, k)
+        built = route
+        route = improve(route, T, C, e, l, s, clock, deadline)
+        if lim < INF:
+            # moves are scored on C; with C = T a faster trip can be longer than max_km
+            r = np.asarray(route)
+            if float(D[r[:-1], r[1:]].sum()) > lim + _EPS:
+                route = built
+        trips.append(route)
+        starts.append(clock)
+        _, beg_r, _ = schedule(route, T, e, l, s, clock)
+        clock = float(beg_r[-1])
+        left = np.setdiff1d(left, np.asarray(route[1:-1]), assume_unique=True)
+    return trips, starts, [int(v) for v in left]
+
+
+# --------------------------------------------------
+# Repair (plan_from_matches batches)
+# --------------------------------------------------
+def repair(route: List[int], T: np.ndarray, C: np.ndarray, e: np.ndarray, l: np.ndarray, s: np.ndarray,
+           t_start: float, group: Optional[np.ndarray] = None) -> Tuple[List[int], List[int]]:
+    """
+    Make a fixed route window-feasible: the first late stop is moved to its cheapest
+    feasible position, or dropped when there is none. Returns (route, dropped nodes).
+    """
+    route = list(route)
+    dropped: List[int] = []
+    for _ in range(2 * len(route)):
+        _, beg, _ = schedule(route, T, e, l, s, t_start)
+        late = np.flatnonzero(beg > l[np.asarray(route)] + _EPS)
+        if late.size == 0:
+            return route, dropped
+        k = int(late[0])
+        if k == 0 or k == len(route) - 1:
+            # the depot itself closes too early: nothing on this route can be served
+            return [route[0], route[-1]], dropped + route[1:-1]
+        u = route.pop(k)
+        _, beg, F = schedule(route, T, e, l, s, t_start)
+        delta, ok = insertion(route, beg, F, np.array([u]), T, C, e, l, s,
+                              _gpos(route, group), None if group is None else group[[u]].astype(np.float64))
+        cost = np.where(ok[:, 0], delta[:, 0], INF)
+        q = int(np.argmin(cost))
+        if cost[q] < INF:
+            route.insert(q + 1, u)
+        else:
+            dropped.append(u)
+    # moves kept un-settling each other (travel times off the triangle inequality):
+    # keep only the on-time prefix
+    _, beg, _ = schedule(route, T, e, l, s, t_start)
+    late = np.flatnonzero(beg > l[np.asarray(route)] + _EPS)
+    k = int(late[0]) if late.size else len(route) - 1
+    k = max(1, min(k, len(route) - 1))
+    return route[:k] + [route[-1]], dropped + route[k:-1]
@@ -0,0 +1,97 @@
+# app/services/versions.py
+"""
+Per-collection version counters and conditional GET (ETag / 304).
+
+Every write to a collection that is served with an ETag (donations,
+requests, matches, drivers) calls bump(db, name) *after* the write. The
+counter lives in one small document per collection:
+
+    collection_versions: {_id: "donations", v: 42, epoch: "65f0..."}
+
+epoch is set when the counter document is created, so a dropped/reset
+counter never repeats an old tag.
+
+A list endpoint calls check(request, response, db, *names) first. The
+ETag hashes the path, the sorted query params and the versions of the
+collections the response is built from; if the client's If-None-Match
+carries it, the endpoint answers 304 after reading only those counters,
+without touching the collections themselves.
+
+Bumping after the write (never before) keeps this safe: a listing that
+races a write may label newer data with the older version, which only
+costs the client one extra refetch; it can never pin old data under a new
+tag. Writes made outside the app (mongo shell, seed scripts) must bump too.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from bson import ObjectId
+from fastapi import Request, Response
+from pymongo import UpdateOne
+
+VERSIONS = "collection_versions"
+
+
+def _bump_ops(names: Iterable[str], namespace: Optional[str] = None):
+    kw = {"namespace": namespace} if namespace else {}
+    return [UpdateOne({"_id": n}, {"$inc": {"v": 1}, "$setOnInsert": {"epoch": str(ObjectId())}}, upsert=True, **kw)
+            for n in sorted(set(names))]
+
+
+def bump_models(db, *names: str) -> list:
+    """bump() as namespaced write models, to ride along in a client.bulk_write."""
+    return _bump_ops(names, f"{db.name}.{VERSIONS}")
+
+
+async def bump(db, *names: str, session=None) -> None:
+    """Mark the collections changed (call after the write, inside its transaction if any)."""
+    if names:
+        await db[VERSIONS].bulk_write(_bump_ops(names), ordered=False, session=session)
+
+
+def bump_sync(db, *names: str) -> None:
+    """bump() for pymongo databases (tools, sync endpoints)."""
+    if names:
+        db[VERSIONS].bulk_write(_bump_ops(names), ordered=False)
+
+
+async def current(db, names: Iterable[str]) -> Dict[str, str]:
+    """collection → "epoch.v" ("0" for a collection never bumped)."""
+    names = sorted(set(names))
+    out = {n: "0" for n in names}
+    async for d in db[VERSIONS].find({"_id": {"$in": names}}):
+        out[d["_id"]] = f'{d.get("epoch", "")}.{d.get("v", 0)}'
+    return out
+
+
+def etag(request: Request, versions: Dict[str, str]) -> str:
+    query = sorted(request.query_params.multi_items())
+    raw = repr((request.url.path, query, sorted(versions.items())))
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:24] + '"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """If-None-Match comparison (weak: W/ prefixes are ignored)."""
+    if not if_none_match:
+        return False
+    bare = tag.removeprefix("W/")
+    for t in if_none_match.split(","):
+        t = t.strip()
+        if t == "*" or t.removeprefix("W/") == bare:
+            return True
+    return False
+
+
+async def check(request: Request, response: Response, db, *names: str) -> Optional[Response]:
+    """
+    A 304 response when the client's copy is current, else None (and the
+    ETag is set on `response` for the 200).
+    """
+    tag = etag(request, await current(db, names))
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
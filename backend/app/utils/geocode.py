@@ -1,20 +1,22 @@
 # app/utils/geocode.py
-import requests
+from app.core.geocode import geocode_address as _geocode, geocode_address_async as _geocode_async
 
 def geocode_address(addr: str):
+    """{"lat", "lng"} or None. Same provider and cache as app.core.geocode (blocking)."""
     if not addr or not addr.strip():
         return None
     try:
-        r = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"q": addr, "format": "json", "limit": 1},
-            timeout=8,
-            headers={"User-Agent": "foodbridge/1.0"}
-        )
-        r.raise_for_status()
-        data = r.json()
-        if not data:
-            return None
-        return {"lat": float(data[0]["lat"]), "lng": float(data[0]["lon"])}
+        lat, lng = _geocode(addr)
+        return {"lat": float(lat), "lng": float(lng)}
+    except Exception:
+        return None
+
+async def geocode_address_async(addr: str):
+    """geocode_address for async handlers."""
+    if not addr or not addr.strip():
+        return None
+    try:
+        lat, lng = await _geocode_async(addr)
+        return {"lat": float(lat), "lng": float(lng)}
     except Exception:
         return None
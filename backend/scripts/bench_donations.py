@@ -0,0 +1,110 @@
+# scripts/bench_donations.py
+"""
+Load benchmark for /api/donations: the Motor router vs the previous
+pymongo-in-threadpool handlers, against a real MongoDB. Both run on a
+scratch database (--db, default foodbridge_bench) that is dropped before and
+after the run, so its name must end in "_bench"; MONGODB_DB is never used.
+
+Requests go through httpx's in-process ASGI transport, so the numbers are
+server-side costs (routing, validation, Mongo round trips, threadpool
+queueing) without network noise. Each mode runs the same mix: a create,
+then a status change on the created donation.
+
+    python -m scripts.bench_donations --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+from bson import ObjectId
+from fastapi import FastAPI, HTTPException, Query
+
+import app.api.donations as donations_api
+from app.core import mongo
+
+BODY = {"donor_name": "Bench Bakery", "items": [{"name": "bread", "qty": 12, "unit": "pcs"}],
+        "location": {"lat": 14.5547, "lng": 121.0244}}
+
+
+def sync_app(db_name: str) -> FastAPI:
+    """The donations handlers as they were: `def` endpoints, pymongo, update/insert then read back."""
+    app = FastAPI()
+    db = mongo.get_sync_client()[db_name]
+
+    @app.post("/api/donations", status_code=201)
+    def create(body: dict):
+        doc = {**body, "status": "open", "created_at": datetime.utcnow()}
+        ins = db.donations.insert_one(doc)
+        saved = db.donations.find_one({"_id": ins.inserted_id})
+        return {"donation": donations_api._serialize(saved)}
+
+    @app.patch("/api/donations/{donation_id}/status")
+    def update_status(donation_id: str, status_q: str = Query(..., alias="status")):
+        _id = ObjectId(donation_id)
+        res = db.donations.update_one({"_id": _id}, {"$set": {"status": status_q}})
+        if res.matched_count == 0:
+            raise HTTPException(status_code=404, detail="Donation not found")
+        return {"ok": True, "donation": donations_api._serialize(db.donations.find_one({"_id": _id}))}
+
+    return app
+
+
+def async_app(db_name: str) -> FastAPI:
+    app = FastAPI()
+    app.include_router(donations_api.router)
+    app.dependency_overrides[donations_api.get_db] = lambda: mongo.get_client()[db_name]
+    return app
+
+
+async def run(app: FastAPI, n: int, concurrency: int):
+    sem = asyncio.Semaphore(concurrency)
+    lat = []
+
+    async def one(client):
+        async with sem:
+            t = time.perf_counter()
+            r = await client.post("/api/donations", json=BODY)
+            did = r.json()["donation"]["id"]
+            await client.patch(f"/api/donations/{did}/status", params={"status": "picked_up"})
+            lat.append((time.perf_counter() - t) * 1000)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*(one(client) for _ in range(20)))  # warm the pools
+        lat.clear()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(n)))
+        wall = time.perf_counter() - t0
+    a = np.array(lat)
+    return {"req/s": round(2 * n / wall, 1), "p50_ms": round(float(np.percentile(a, 50)), 1),
+            "p95_ms": round(float(np.percentile(a, 95)), 1), "p99_ms": round(float(np.percentile(a, 99)), 1)}
+
+
+async def main_async(args):
+    client = mongo.get_client()
+    await client.drop_database(args.db)
+    try:
+        for name, factory in (("before (sync pymongo)", sync_app), ("after (Motor)", async_app)):
+            print(f"{name:24s}", await run(factory(args.db), args.requests, args.concurrency))
+        print("pools:", mongo.pool_stats()["pools"])
+    finally:
+        await client.drop_database(args.db)
+        mongo.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=2000, help="create+status pairs per mode")
+    ap.add_argument("--concurrency", type=int, default=200)
+    ap.add_argument("--db", default="foodbridge_bench", help="scratch database, dropped; must end in _bench")
+    args = ap.parse_args()
+    if not args.db.endswith("_bench"):
+        ap.error(f"refusing to use (and drop) database {args.db!r}: the name must end in '_bench'")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
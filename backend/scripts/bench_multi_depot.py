@@ -0,0 +1,114 @@
+# scripts/bench_multi_depot.py
+"""
+Multi-depot planning benchmark on synthetic three-hub data (no Mongo).
+
+Matches are drawn around three hubs (north, central, south) with some
+cross-town traffic. Reports:
+  - depot assignment time: vectorized vs a per-match Python loop
+  - route km when everything runs from the central hub vs per-hub planning
+  - wall time for planning the hubs one after another vs concurrently
+
+    python -m scripts.bench_multi_depot --matches 600 --budget 1.0
+"""
+import argparse
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.routers.routes import _assign_hubs, _hubs, _plan_hub, _route_steps
+from app.services.batch_opt import shutdown_pool
+from app.services.depots import depot_costs
+
+HUBS = [
+    {"id": "north", "lat": 14.70, "lng": 121.03},
+    {"id": "central", "lat": 14.58, "lng": 121.00},
+    {"id": "south", "lat": 14.43, "lng": 121.02},
+]
+
+
+def synthetic_recs(n: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    home = rng.integers(0, len(HUBS), n)
+    away = np.where(rng.random(n) < 0.2, rng.integers(0, len(HUBS), n), home)  # 20% cross-town
+    recs = []
+    for i in range(n):
+        a, b = HUBS[home[i]], HUBS[away[i]]
+        pick = (a["lat"] + rng.normal(0, 0.03), a["lng"] + rng.normal(0, 0.03))
+        drop = (b["lat"] + rng.normal(0, 0.03), b["lng"] + rng.normal(0, 0.03))
+        d, r = f"d{i // 2}", f"r{i // 3}"
+        recs.append({
+            "_id": i, "kg": float(rng.integers(3, 25)), "cold": False, "l_per_kg": 2.0,
+            "ddoc": {"_id": d, "donor_name": d}, "rdoc": {"_id": r, "ngo_name": r},
+            "dkey": d, "rkey": r, "pick": pick, "drop": drop,
+        })
+    return recs
+
+
+def loop_assign(recs, hubs):
+    out = []
+    for r in recs:
+        best, arg = math.inf, 0
+        for k, h in enumerate(hubs):
+            c = depot_costs(np.array([r["pick"]]), np.array([r["drop"]]), np.array([h["pair"]]))[0, 0]
+            if c < best:
+                best, arg = c, k
+        out.append(arg)
+    return np.array(out)
+
+
+def total_km(hubs, batches):
+    return sum(_route_steps(hubs[b["depot"]]["pair"], b["picks"], b["drops"])[1] for b in batches)
+
+
+async def plan(recs, hubs, labels, budget, concurrent):
+    jobs = [
+        _plan_hub([r for r, lab in zip(recs, labels) if lab == k], hub, k, None, False, "kmeans", budget, datetime.now(timezone.utc))
+        for k, hub in enumerate(hubs)
+    ]
+    if concurrent:
+        parts = await asyncio.gather(*jobs)
+    else:
+        parts = [await j for j in jobs]
+    return [b for bs, _ in parts for b in bs]
+
+
+async def run(args):
+    recs = synthetic_recs(args.matches)
+    hubs = _hubs(None, HUBS, args.capacity)
+    central = _hubs(HUBS[1], None, args.capacity)
+
+    t = time.perf_counter(); labels = _assign_hubs(recs, hubs, [None] * len(hubs)); vec_ms = (time.perf_counter() - t) * 1000
+    t = time.perf_counter(); slow = loop_assign(recs, hubs); loop_ms = (time.perf_counter() - t) * 1000
+    assert (labels == slow).all()
+    print(f"assignment: vectorized {vec_ms:.1f} ms, loop {loop_ms:.1f} ms ({loop_ms / max(vec_ms, 1e-6):.0f}x)")
+    print("matches per hub:", {h["id"]: int((labels == k).sum()) for k, h in enumerate(hubs)})
+
+    await plan(recs[:30], central, np.zeros(30, dtype=int), 0.1, False)  # warm the worker pool
+
+    t = time.perf_counter(); one = await plan(recs, central, np.zeros(len(recs), dtype=int), args.budget, False)
+    one_s = time.perf_counter() - t
+    t = time.perf_counter(); seq = await plan(recs, hubs, labels, args.budget, False); seq_s = time.perf_counter() - t
+    t = time.perf_counter(); par = await plan(recs, hubs, labels, args.budget, True); par_s = time.perf_counter() - t
+
+    print(f"central hub only: {len(one)} routes, {total_km(central, one):.0f} km, {one_s:.2f} s")
+    print(f"per hub, sequential: {len(seq)} routes, {total_km(hubs, seq):.0f} km, {seq_s:.2f} s")
+    print(f"per hub, concurrent: {len(par)} routes, {total_km(hubs, par):.0f} km, {par_s:.2f} s")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--matches", type=int, default=600)
+    ap.add_argument("--capacity", type=float, default=80.0)
+    ap.add_argument("--budget", type=float, default=1.0)
+    args = ap.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
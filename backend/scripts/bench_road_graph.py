@@ -0,0 +1,66 @@
+# scripts/bench_road_graph.py
+"""
+Queries-per-second benchmark for the in-process road router.
+
+Uses the graph in ROAD_GRAPH_DIR when set, otherwise a synthetic grid
+roughly the size of a Metro Manila street network sample.
+
+    python -m scripts.bench_road_graph --queries 500 --side 150
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.road_graph import RoadGraph, get_road_graph
+
+
+def synthetic_grid(side: int, seed: int = 7) -> RoadGraph:
+    rng = np.random.default_rng(seed)
+    step = 0.002  # ~220 m blocks
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lat = 14.45 + rows * step + rng.normal(0, step * 0.1, rows.size)
+    lng = 120.95 + cols * step + rng.normal(0, step * 0.1, cols.size)
+    ids = np.arange(side * side).reshape(side, side)
+    src = np.concatenate([ids[:, :-1].ravel(), ids[:, 1:].ravel(), ids[:-1, :].ravel(), ids[1:, :].ravel()])
+    dst = np.concatenate([ids[:, 1:].ravel(), ids[:, :-1].ravel(), ids[1:, :].ravel(), ids[:-1, :].ravel()])
+    length = np.hypot((lat[src] - lat[dst]) * 111_000, (lng[src] - lng[dst]) * 107_000) * 1.05
+    kmh = rng.choice([20.0, 30.0, 45.0], size=src.size, p=[0.6, 0.3, 0.1])
+    return RoadGraph.from_edges(lat, lng, src, dst, length, length / (kmh / 3.6))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--side", type=int, default=120)
+    ap.add_argument("--targets", type=int, default=25)
+    args = ap.parse_args()
+
+    g = get_road_graph() or synthetic_grid(args.side)
+    rng = np.random.default_rng(1)
+    pairs = rng.integers(0, g.n, size=(args.queries, 2))
+    print(f"graph: {g.n} nodes, {int(g.fwd[0][-1])} edges")
+
+    t0 = time.perf_counter()
+    for s, t in pairs:
+        g.shortest_path(int(s), int(t))
+    dt = time.perf_counter() - t0
+    print(f"point-to-point: {args.queries / dt:,.1f} q/s ({dt / args.queries * 1000:.2f} ms/q)")
+
+    n_otm = max(1, args.queries // 10)
+    t0 = time.perf_counter()
+    for s in pairs[:n_otm, 0]:
+        g.one_to_many(int(s), rng.integers(0, g.n, size=args.targets).tolist())
+    dt = time.perf_counter() - t0
+    print(f"one-to-{args.targets}: {n_otm / dt:,.1f} q/s ({dt / n_otm * 1000:.2f} ms/q)")
+
+    pts = np.column_stack([rng.uniform(g.lat.min(), g.lat.max(), 1000), rng.uniform(g.lng.min(), g.lng.max(), 1000)])
+    t0 = time.perf_counter()
+    for la, ln in pts:
+        g.nearest_node(float(la), float(ln))
+    dt = time.perf_counter() - t0
+    print(f"snap: {len(pts) / dt:,.0f} q/s")
+
+
+if __name__ == "__main__":
+    main()
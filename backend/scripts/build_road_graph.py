@@ -0,0 +1,60 @@
+# scripts/build_road_graph.py
+"""
+Convert a preprocessed road extract (CSV) into the memory-mappable CSR layout
+read by app.services.road_graph.
+
+    nodes.csv: id,lat,lng
+    edges.csv: u,v,length_m,speed_kmh[,oneway]
+
+Typical source: an OSM extract of the service area exported with osmnx/osmium
+to node and edge tables. Two-way roads are expanded into both directions
+unless oneway is 1/true/yes.
+"""
+import argparse
+import csv
+
+import numpy as np
+
+from app.services.road_graph import RoadGraph
+
+TRUE = {"1", "true", "yes", "y"}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", required=True)
+    ap.add_argument("--edges", required=True)
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args()
+
+    index = {}
+    lat, lng = [], []
+    with open(args.nodes, newline="") as f:
+        for row in csv.DictReader(f):
+            index[row["id"]] = len(lat)
+            lat.append(float(row["lat"]))
+            lng.append(float(row["lng"]))
+
+    src, dst, length, secs = [], [], [], []
+    skipped = 0
+    with open(args.edges, newline="") as f:
+        for row in csv.DictReader(f):
+            u = index.get(row["u"]); v = index.get(row["v"])
+            kmh = float(row.get("speed_kmh") or 0)
+            if u is None or v is None or kmh <= 0:
+                skipped += 1
+                continue
+            m = float(row["length_m"])
+            s = m / (kmh / 3.6)
+            src.append(u); dst.append(v); length.append(m); secs.append(s)
+            if (row.get("oneway") or "").strip().lower() not in TRUE:
+                src.append(v); dst.append(u); length.append(m); secs.append(s)
+
+    g = RoadGraph.from_edges(np.array(lat), np.array(lng), np.array(src), np.array(dst),
+                             np.array(length), np.array(secs))
+    g.save(args.out)
+    print(f"Saved {g.n} nodes, {len(src)} directed edges to {args.out} (skipped {skipped} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.services.clustering import capacitated_kmeans, groups, project_km, sweep
+
+
+def _blobs(seed=0):
+    # two towns ~30 km apart
+    rng = np.random.default_rng(seed)
+    lat = np.concatenate([14.70 + rng.normal(0, 0.01, 60), 14.45 + rng.normal(0, 0.01, 60)])
+    lng = np.concatenate([120.98 + rng.normal(0, 0.01, 60), 121.00 + rng.normal(0, 0.01, 60)])
+    x, y = project_km(lat, lng)
+    return np.column_stack([x, y]), rng.integers(1, 20, lat.size).astype(float)
+
+
+def test_capacity_and_coverage():
+    X, dem = _blobs()
+    for labels in (capacitated_kmeans(X, dem, 100.0), sweep(X, dem, 100.0, tuple(X.mean(axis=0)))):
+        parts = groups(labels)
+        assert sorted(i for g in parts for i in g) == list(range(len(X)))
+        assert all(dem[g].sum() <= 100.0 + 1e-9 for g in parts)
+
+
+def test_kmeans_keeps_towns_apart():
+    X, dem = _blobs()
+    labels = capacitated_kmeans(X, dem, 150.0)
+    for g in groups(labels):
+        towns = set((np.array(g) >= 60).tolist())
+        assert len(towns) == 1
+
+
+def test_oversized_point_gets_own_cluster():
+    X = np.array([[0.0, 0.0], [0.1, 0.0], [0.2, 0.0], [0.3, 0.0]])
+    labels = capacitated_kmeans(X, [5.0, 500.0, 5.0, 5.0], 50.0)
+    assert [1] in groups(labels)
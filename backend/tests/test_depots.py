@@ -0,0 +1,24 @@
+import numpy as np
+
+from app.services.depots import assign_depots, depot_costs
+
+
+def test_nearest_hub_and_capacity_spill():
+    hubs = np.array([[14.70, 121.0], [14.45, 121.0]])
+    pick = np.array([[14.71, 121.0], [14.69, 121.0], [14.68, 121.0], [14.46, 121.0]])
+    drop = pick + 0.005
+    cost = depot_costs(pick, drop, hubs)
+    assert cost.shape == (4, 2)
+    assert assign_depots(cost).tolist() == [0, 0, 0, 1]
+
+    # north can carry 20 kg: the match it loses least by giving up moves south
+    labels = assign_depots(cost, demand=[10, 10, 10, 10], capacity=[20, np.inf])
+    assert labels.tolist() == [0, 0, 1, 1]
+
+
+def test_costs_agree_with_route_km():
+    from app.services.route_opt import leg_lengths
+
+    pick, drop, dep = np.array([[14.55, 121.02]]), np.array([[14.60, 121.05]]), np.array([[14.50, 121.00]])
+    legs = leg_lengths([14.50, 14.55], [121.00, 121.02]).sum() + leg_lengths([14.60, 14.50], [121.05, 121.00]).sum()
+    assert abs(depot_costs(pick, drop, dep)[0, 0] - legs) < 1e-12
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+from app.core.db import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_complete_route_runs_once(test_client: AsyncClient):
+    don, req, rid = ObjectId(), ObjectId(), ObjectId()
+    await db.donations.insert_one({"_id": don, "status": "open"})
+    await db.requests.insert_one({"_id": req, "status": "open"})
+    await db.routes.insert_one({"_id": rid, "status": "in_progress", "donation_ids": [don], "request_ids": [req]})
+    await db.matches.insert_many([{"route_id": rid, "status": "in_progress"} for _ in range(3)])
+
+    r1, r2 = await asyncio.gather(
+        test_client.post(f"/api/dispatch/routes/{rid}/complete"),
+        test_client.post(f"/api/dispatch/routes/{rid}/complete"),
+    )
+    assert r1.status_code == r2.status_code == 200
+    assert [r1.json().get("already_completed"), r2.json().get("already_completed")].count(True) == 1
+
+    route = await db.routes.find_one({"_id": rid})
+    assert [e["type"] for e in route["events"]] == ["complete"]
+    assert (await db.donations.find_one({"_id": don}))["status"] == "delivered"
+    assert (await db.requests.find_one({"_id": req}))["status"] == "closed"
+    assert await db.matches.count_documents({"route_id": rid, "status": "completed"}) == 3
+
+    r = await test_client.post(f"/api/dispatch/routes/{ObjectId()}/complete")
+    assert r.status_code == 404
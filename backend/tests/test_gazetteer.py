@@ -0,0 +1,98 @@
+import httpx
+import pytest
+
+from app.core import geocode
+from app.services.gazetteer import Gazetteer
+
+pytestmark = pytest.mark.anyio
+
+PLACES = [
+    ("Ayala Avenue", 14.5547, 121.0244, "street", "Makati"),
+    ("Rizal Street", 14.5995, 120.9842, "street", "Manila"),
+    ("Rizal Street", 14.5764, 121.0851, "street", "Pasig"),
+    ("Barangay San Lorenzo", 14.5512, 121.0245, "barangay", "Makati"),
+    ("SM Megamall", 14.5849, 121.0563, "landmark", "Mandaluyong"),
+    ("Makati", 14.5547, 121.0244, "city", ""),
+]
+
+
+@pytest.fixture
+def gz():
+    names, lat, lng, kinds, locs = zip(*PLACES)
+    return Gazetteer(names, lat, lng, kinds, locs)
+
+
+def test_fuzzy_address_queries(gz):
+    assert gz.lookup("Unit 5B, 123 Ayala Ave., Makati City") == (14.5547, 121.0244)
+    assert gz.lookup("rizal st pasig") == (14.5764, 121.0851)
+    assert gz.lookup("Rizal St., Manila") == (14.5995, 120.9842)
+    assert gz.search("Brgy. San Lorenso")[0]["name"] == "Barangay San Lorenzo"  # typo
+    assert gz.search("SM Megamal, EDSA")[0]["kind"] == "landmark"              # typo
+    assert gz.search("Makati")[0]["kind"] == "city"
+    assert gz.lookup("42 Nowhere Road, Atlantis") is None
+    assert gz.lookup("") is None
+
+
+async def test_chain_falls_through_to_remote_provider(gz, monkeypatch):
+    monkeypatch.setattr(geocode, "PROVIDERS", ["local", "nominatim"])
+    monkeypatch.setattr(geocode, "get_gazetteer", lambda: gz)
+    assert geocode.local_first("Ayala Avenue, Makati") == (14.5547, 121.0244)
+    assert geocode.local_first("Quiapo Church") is None
+
+    seen = []
+
+    def provider(request):
+        seen.append(request.url.params["q"])
+        return httpx.Response(200, json=[{"lat": "14.5986", "lon": "120.9836"}])
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(provider)) as client:
+        assert await geocode._alookup("Quiapo Church", client) == (14.5986, 120.9836)
+    assert seen == ["Quiapo Church"]
+
+
+async def test_chain_error_handling(gz, monkeypatch):
+    monkeypatch.setattr(geocode, "PROVIDERS", ["nominatim", "local"])
+    monkeypatch.setattr(geocode, "get_gazetteer", lambda: gz)
+
+    def down(request):
+        return httpx.Response(503)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(down)) as client:
+        # remote failed, local found it
+        assert await geocode._alookup("SM Megamall", client) == (14.5849, 121.0563)
+        # remote failed and local has nothing: the transient error wins over "no results"
+        with pytest.raises(httpx.HTTPStatusError):
+            await geocode._alookup("Quiapo Church", client)
+    monkeypatch.setattr(geocode, "PROVIDERS", ["local"])
+    with pytest.raises(geocode.NoResults):
+        await geocode._alookup("Quiapo Church")
+
+
+async def test_index_built_once_and_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+    import time
+
+    from app.services import gazetteer
+
+    path = tmp_path / "places.csv"
+    path.write_text("name,lat,lng,kind,locality\n" + "".join(f"{n},{la},{ln},{k},{loc}\n" for n, la, ln, k, loc in PLACES))
+    monkeypatch.setattr(gazetteer, "GAZETTEER_PATH", str(path))
+    monkeypatch.setattr(gazetteer, "_gazetteer", None)
+    monkeypatch.setattr(gazetteer, "_loaded", False)
+    builds = []
+    real_load = Gazetteer.load.__func__
+
+    def slow_load(cls, p):
+        builds.append(threading.current_thread())
+        time.sleep(0.05)
+        return real_load(cls, p)
+
+    monkeypatch.setattr(Gazetteer, "load", classmethod(slow_load))
+    loop_thread = threading.current_thread()
+    warm = threading.Thread(target=gazetteer.get_gazetteer)
+    warm.start()
+    got = await asyncio.gather(*(gazetteer.aget_gazetteer() for _ in range(5)))
+    warm.join()
+    assert len(builds) == 1 and builds[0] is not loop_thread
+    assert all(g is got[0] for g in got) and got[0].lookup("SM Megamall") == (14.5849, 121.0563)
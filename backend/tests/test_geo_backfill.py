@@ -0,0 +1,23 @@
+from bson import ObjectId
+
+from app.services.geo_backfill import plan_batch
+
+
+def test_plan_batch_sorts_documents_into_located_queued_cleared():
+    located, queued, cleared = ObjectId(), ObjectId(), ObjectId()
+    docs = [
+        {"_id": located, "location": {"lat": "14.55", "lng": 121.02}},
+        {"_id": queued, "address": " 1 Ayala Ave ", "location": {"lat": 0, "lng": 0}},
+        {"_id": cleared, "location": {}},
+    ]
+    ops, jobs, counts = plan_batch("donations", docs)
+
+    assert counts == {"located": 1, "queued": 1, "cleared": 1}
+    updates = {op._filter["_id"]: op._doc for op in ops}
+    assert updates[located]["$set"]["geo"] == {"type": "Point", "coordinates": [121.02, 14.55]}
+    assert updates[queued] == {"$set": {"geo_pending": True}, "$unset": {"geo": ""}}
+    assert updates[cleared] == {"$unset": {"geo": ""}}
+
+    [job] = jobs
+    assert job["collection"] == "donations" and job["doc_id"] == queued
+    assert job["address"] == "1 Ayala Ave" and job["key"] == "1 ayala avenue" and job["status"] == "queued"
@@ -0,0 +1,43 @@
+import pytest
+from bson import ObjectId
+
+from app.core.geocode import NoResults
+from app.services import geocode_worker, geo_repair
+from app.services.geocode_cache import geocode_cache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_repair_dedupes_addresses_and_reports_progress(monkeypatch):
+    from app.core.db import db
+
+    calls = []
+
+    async def provider(a):
+        calls.append(a)
+        if "Nowhere" in a:
+            raise NoResults("No results")
+        return 14.55, 121.02
+
+    monkeypatch.setattr(geocode_worker, "_alookup", provider)
+    geocode_cache.clear_memory()
+    name = f"fixgeo_{ObjectId()}"
+    tag = ObjectId()
+    docs = [{"_id": ObjectId(), "address": f"{tag} Ayala Ave"} for _ in range(5)]
+    docs += [{"_id": ObjectId(), "address": f"{tag} Nowhere"},
+             {"_id": ObjectId(), "location": {"lat": 14.6, "lng": 121.1}, "geo": {"type": "Point", "coordinates": [0, 0]}}]
+    await db[name].insert_many(docs)
+    try:
+        events = [e async for e in geo_repair.repair(db, [name], chunk=3, limiter=geocode_worker._RateLimiter(0))]
+        assert [e["type"] for e in events] == ["progress"] * 3 + ["summary"]
+        assert [e["scanned"] for e in events[:-1]] == [3, 6, 7]
+        summary = events[-1]
+        assert summary["fixed"] == {name: 6}
+        assert summary["collections"][name]["not_found"] == 1
+        assert len(calls) == 2  # one lookup per distinct address across chunks
+
+        fixed = await db[name].find_one({"_id": docs[0]["_id"]})
+        assert fixed["geo"] == {"type": "Point", "coordinates": [121.02, 14.55]}
+        assert (await db[name].find_one({"_id": docs[5]["_id"]}))["_geocode_error"] == "No results"
+    finally:
+        await db.drop_collection(name)
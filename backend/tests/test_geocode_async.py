@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.geocode import _alookup
+from app.services.geocode_cache import GeocodeCache
+
+pytestmark = pytest.mark.anyio
+
+
+class _DownCollection:
+    async def find_one(self, *a, **k):
+        raise ConnectionError("mongo down")
+
+    update_one = find_one
+
+
+async def test_slow_geocode_keeps_event_loop_responsive():
+    async def slow_provider(request):
+        await asyncio.sleep(0.3)
+        return httpx.Response(200, json=[{"lat": "14.6", "lon": "121.0"}])
+
+    cache = GeocodeCache(acollection=_DownCollection())
+    async with httpx.AsyncClient(transport=httpx.MockTransport(slow_provider)) as client:
+        task = asyncio.create_task(cache.alookup("1 Ayala Ave", lambda a: _alookup(a, client)))
+        gaps, last = [], time.perf_counter()
+        while not task.done():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+        assert await task == (14.6, 121.0)
+    assert len(gaps) > 10 and max(gaps) < 0.1
+
+    # answered from memory the second time, without the provider
+    assert await cache.alookup("1 ayala avenue", lambda a: _alookup(a, None)) == (14.6, 121.0)
@@ -0,0 +1,50 @@
+import pytest
+
+from app.services.geocode_cache import GeocodeCache, NotFound, normalize_address
+
+
+class _DownCollection:
+    def find_one(self, *a, **k):
+        raise ConnectionError("mongo down")
+
+    update_one = find_one
+
+
+def test_normalize_address_folds_variants():
+    a = normalize_address("123 Rizal Ave., Brgy. Sto. Niño, QC")
+    b = normalize_address("  123 rizal AVENUE barangay santo nino quezon city ")
+    assert a == b == "123 rizal avenue barangay santo nino quezon city"
+    assert normalize_address("Unit #5") == "unit number 5"
+    assert normalize_address("   ") == ""
+
+
+def test_repeat_lookups_stay_local_and_negatives_are_cached():
+    calls = []
+
+    def fetch(addr):
+        calls.append(addr)
+        if "nowhere" in addr.lower():
+            raise NotFound(addr)
+        return (14.6, 121.0)
+
+    cache = GeocodeCache(maxsize=8, collection=_DownCollection())
+    assert cache.lookup("1 Ayala Ave", fetch) == (14.6, 121.0)
+    assert cache.lookup("1 ayala avenue.", fetch) == (14.6, 121.0)
+    assert cache.lookup("Nowhere St", fetch) is None
+    assert cache.lookup("nowhere street", fetch) is None
+    assert len(calls) == 2
+
+    s = cache.stats()
+    assert (s["misses"], s["memory_hits"], s["negative_hits"]) == (2, 2, 1)
+    assert s["db_errors"] == 1  # the Mongo tier backs off after the first failure
+
+
+def test_provider_errors_are_not_cached():
+    cache = GeocodeCache(collection=_DownCollection())
+
+    def flaky(addr):
+        raise TimeoutError
+
+    with pytest.raises(TimeoutError):
+        cache.lookup("2 Taft Ave", flaky)
+    assert cache.lookup("2 Taft Ave", lambda a: (14.5, 120.99)) == (14.5, 120.99)
@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.core import geocode
+from app.services import provider_health as ph
+
+pytestmark = pytest.mark.anyio
+
+
+class StandIn:
+    """Local HTTP server playing a geocoding provider."""
+
+    def __init__(self, body, delay=0.0, status=200):
+        self.body, self.delay, self.status, self.hits = body, delay, status, 0
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                outer.hits += 1
+                time.sleep(outer.delay)
+                payload = json.dumps(outer.body).encode()
+                self.send_response(outer.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *a):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    ph.reset()
+    servers = {
+        "nominatim": StandIn([{"lat": "14.60", "lon": "121.00"}]),
+        "opencage": StandIn({"results": [{"geometry": {"lat": 14.70, "lng": 121.10}}]}),
+    }
+    monkeypatch.setattr(geocode, "PROVIDERS", ["nominatim", "opencage"])
+    monkeypatch.setattr(geocode, "NOMINATIM_URL", servers["nominatim"].url)
+    monkeypatch.setattr(geocode, "OPENCAGE_URL", servers["opencage"].url)
+    monkeypatch.setattr(geocode, "OPENCAGE_KEY", "test")
+    monkeypatch.setattr(ph, "GEOCODE_HEDGE_DEFAULT_MS", 100.0)
+    monkeypatch.setattr(ph, "GEOCODE_HEDGE_MIN_MS", 50.0)
+    yield servers
+    for s in servers.values():
+        s.close()
+    ph.reset()
+
+
+async def test_slow_primary_is_hedged(chain):
+    chain["nominatim"].delay = 1.0
+    async with httpx.AsyncClient(timeout=5) as client:
+        t0 = time.perf_counter()
+        assert await geocode._alookup("1 Ayala Ave", client) == (14.70, 121.10)
+        assert time.perf_counter() - t0 < 0.6
+    assert chain["opencage"].hits == 1
+    stats = ph.health_stats()
+    assert stats["nominatim"]["hedged"] == 1 and stats["nominatim"]["failures"] == 0
+
+
+async def test_fast_primary_is_not_hedged(chain):
+    async with httpx.AsyncClient(timeout=5) as client:
+        for _ in range(3):
+            assert await geocode._alookup("1 Ayala Ave", client) == (14.60, 121.00)
+    assert chain["opencage"].hits == 0
+
+
+async def test_failing_provider_trips_its_breaker(chain):
+    ph._health["nominatim"] = ph.ProviderHealth("nominatim", fails=2, open_s=60)
+    chain["nominatim"].status = 503
+    async with httpx.AsyncClient(timeout=5) as client:
+        for _ in range(5):
+            assert await geocode._alookup("1 Ayala Ave", client) == (14.70, 121.10)
+    assert chain["nominatim"].hits == 2  # skipped once open
+    assert ph.health_stats()["nominatim"]["state"] == ph.OPEN
+
+    # sync path honours the same breaker
+    assert geocode._lookup("1 Ayala Ave") == (14.70, 121.10)
+    assert chain["nominatim"].hits == 2
+
+
+def test_breaker_half_open_trial():
+    h = ph.ProviderHealth("p", fails=1, open_s=0.05)
+    assert h.allow()
+    h.failure()
+    assert not h.allow()
+    time.sleep(0.06)
+    assert h.allow() and not h.allow()  # one trial call at a time
+    h.success(0.01)
+    assert h.state == ph.CLOSED and h.allow()
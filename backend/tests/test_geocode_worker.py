@@ -0,0 +1,54 @@
+import time
+
+import pytest
+from bson import ObjectId
+
+from app.services import geocode_worker
+from app.services.geocode_cache import geocode_cache
+from app.services.geocode_worker import _RateLimiter, pending_fields
+
+pytestmark = pytest.mark.anyio
+
+
+def test_pending_fields_only_for_address_without_coords():
+    doc = {"address": "1 Ayala Ave", "location": {"lat": 0, "lng": 0}, "geo": {"type": "Point", "coordinates": [0, 0]}}
+    assert pending_fields(doc) is True
+    assert doc["geo_pending"] is True and "geo" not in doc
+
+    assert pending_fields({"address": "1 Ayala Ave", "location": {"lat": 14.55, "lng": 121.02}}) is False
+    assert pending_fields({"address": "  ", "location": {"lat": None, "lng": None}}) is False
+    assert pending_fields({"location": {}}) is False
+
+
+async def test_rate_limiter_spaces_calls():
+    limiter = _RateLimiter(20)  # one call per 50 ms
+    t0 = time.perf_counter()
+    for _ in range(5):
+        await limiter.acquire()
+    assert time.perf_counter() - t0 >= 0.19
+
+
+async def test_process_batch_dedupes_identical_addresses(monkeypatch):
+    from app.core.db import db
+
+    calls = []
+
+    async def provider(a):
+        calls.append(a)
+        return 14.55, 121.02
+
+    monkeypatch.setattr(geocode_worker, "_alookup", provider)
+    geocode_cache.clear_memory()
+    address = f"{ObjectId()} Ayala Ave, Makati"
+    ids = [ObjectId() for _ in range(3)]
+    await db.donations.insert_many([{"_id": i, "status": "open", "address": address, "geo_pending": True} for i in ids])
+    for i in ids:
+        await geocode_worker.enqueue(db, "donations", i, address.upper() if i == ids[0] else address)
+
+    assert await geocode_worker.process_batch(db, _RateLimiter(0)) >= 3
+    assert len(calls) == 1
+    for i in ids:
+        d = await db.donations.find_one({"_id": i})
+        assert "geo_pending" not in d
+        assert d["geo"] == {"type": "Point", "coordinates": [121.02, 14.55]}
+    assert await db.geocode_jobs.count_documents({"doc_id": {"$in": ids}, "status": "done"}) == 3
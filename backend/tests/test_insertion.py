@@ -0,0 +1,98 @@
+import itertools
+
+import numpy as np
+
+from app.services.insertion import apply_pair, best_pair_insertion, route_arrays, steps_distance_km
+from app.services.route_opt import haversine_to
+
+
+def _route(points, loads=None):
+    """start, pickups/drops (kg from loads: + pickup, - drop), end."""
+    steps = [{"action": "start", "lat": points[0][0], "lng": points[0][1]}]
+    for (lat, lng), kg in zip(points[1:-1], loads or [0] * (len(points) - 2)):
+        steps.append({"action": "pickup" if kg >= 0 else "drop", "lat": lat, "lng": lng, "kg": abs(kg)})
+    steps.append({"action": "end", "lat": points[-1][0], "lng": points[-1][1]})
+    return steps
+
+
+def _line(n):
+    return [(14.5, 121.0 + 0.01 * k) for k in range(n)]
+
+
+def _brute(steps, pick, drop, kg, cap, first_pos=0):
+    """Every (i, j) by rebuilding the route: (delta, i, j) of the cheapest feasible one."""
+    base = steps_distance_km(steps)
+    best = None
+    for i, j in itertools.product(range(first_pos, len(steps) - 1), repeat=2):
+        if j < i:
+            continue
+        new = apply_pair(steps, {"action": "pickup", "lat": pick[0], "lng": pick[1], "kg": kg},
+                         {"action": "drop", "lat": drop[0], "lng": drop[1], "kg": kg}, i, j)
+        if cap is not None and route_arrays(new)[2].max() > cap + 1e-9:
+            continue
+        d = steps_distance_km(new) - base
+        if best is None or d < best[0] - 1e-12:
+            best = (d, i, j)
+    return best
+
+
+def test_matches_brute_force_and_keeps_pickup_before_drop():
+    rng = np.random.default_rng(3)
+    for _ in range(40):
+        pts = [(14.4 + rng.random() * 0.2, 120.9 + rng.random() * 0.2) for _ in range(7)]
+        steps = _route(pts, [10, 5, -10, 20, -25])
+        pick = (14.4 + rng.random() * 0.2, 120.9 + rng.random() * 0.2)
+        drop = (14.4 + rng.random() * 0.2, 120.9 + rng.random() * 0.2)
+        res = best_pair_insertion(steps, pick, drop, 10, 40)
+        ref = _brute(steps, pick, drop, 10, 40)
+        assert (res is None) == (ref is None)
+        if res:
+            assert res[1] <= res[2]
+            assert abs(res[0] - ref[0]) < 1e-9
+
+
+def test_capacity_excludes_positions_over_peak_load():
+    # load after each step: 0, 30, 30, 0, 0 → with cap 40 a 15 kg pair can't span steps 1..2
+    steps = _route(_line(5), [30, 0, -30])
+    res = best_pair_insertion(steps, (14.5, 121.015), (14.5, 121.025), 15, 40)
+    assert res is not None
+    _, i, j = res
+    assert not (i <= 2 and j >= 1)
+    load = route_arrays(apply_pair(steps, {"action": "pickup", "lat": 14.5, "lng": 121.015, "kg": 15},
+                                   {"action": "drop", "lat": 14.5, "lng": 121.025, "kg": 15}, i, j))[2]
+    assert load.max() <= 40
+    # without the limit the on-the-way slots win
+    _, i, j = best_pair_insertion(steps, (14.5, 121.015), (14.5, 121.025), 15, None)
+    assert (i, j) == (1, 2)
+
+
+def test_never_before_first_pos():
+    steps = _route(_line(6), [5, 5, -5, -5])
+    pick, drop = (14.5, 121.005), (14.5, 121.006)  # cheapest right after the start
+    assert best_pair_insertion(steps, pick, drop, 1, None)[1] == 0
+    for first in range(1, 5):
+        _, i, j = best_pair_insertion(steps, pick, drop, 1, None, first_pos=first)
+        assert i >= first and j >= first
+    assert best_pair_insertion(steps, pick, drop, 1, None, first_pos=5) is None
+
+
+def test_none_when_nothing_fits():
+    steps = _route(_line(4), [50, -50])
+    assert best_pair_insertion(steps, (14.5, 121.0), (14.5, 121.02), 60, 50) is None
+    assert best_pair_insertion(steps[:1], (14.5, 121.0), (14.5, 121.02), 1, None) is None
+
+
+def test_apply_pair_and_distance():
+    steps = _route(_line(5), [1, 1, -2])
+    p, q = {"action": "pickup", "label": "P"}, {"action": "drop", "label": "Q"}
+    out = apply_pair(steps, p, q, 1, 3)
+    assert len(out) == len(steps) + 2
+    assert out[2] is p and out[5] is q
+    assert out[:2] == steps[:2] and out[3:5] == steps[2:4] and out[6:] == steps[4:]
+    same = apply_pair(steps, p, q, 2, 2)
+    assert same[3] is p and same[4] is q
+
+    lat, lng, _ = route_arrays(steps)
+    manual = sum(float(haversine_to([lat[k]], [lng[k]], lat[k + 1], lng[k + 1])[0]) for k in range(len(steps) - 1))
+    assert abs(steps_distance_km(steps) - manual) < 1e-9
+    assert steps_distance_km(steps[:1]) == 0.0
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.services import listing
+
+
+def test_cursor_roundtrip_and_keyset_filter():
+    t = datetime(2025, 3, 1, 8, 30, 15, 123000)
+    oid = ObjectId()
+    cur = listing.encode_cursor({"_id": oid, "created_at": t})
+    assert "=" not in cur
+    assert listing.decode_cursor(cur) == (t, oid)
+    assert listing.after_cursor(cur) == {"$or": [
+        {"created_at": {"$lt": t}},
+        {"created_at": t, "_id": {"$lt": oid}},
+        {"created_at": None},
+    ]}
+    # undated documents page by _id alone
+    undated = listing.encode_cursor({"_id": oid})
+    assert listing.after_cursor(undated) == {"created_at": None, "_id": {"$lt": oid}}
+
+
+def test_bad_inputs_are_400():
+    for bad in ("nope", "e30", ""):
+        with pytest.raises(HTTPException) as e:
+            listing.decode_cursor(bad)
+        assert e.value.status_code == 400
+    for bad in ("1,2,3", "121.1,14.5,121.0,14.6", "a,b,c,d"):
+        with pytest.raises(HTTPException):
+            listing.bbox_filter(bad)
+    with pytest.raises(HTTPException):
+        listing.projection("id,password", {"id", "status"})
+
+
+def test_filters_and_projection():
+    box = listing.bbox_filter("121.0,14.5,121.1,14.6")
+    ring = box["geo"]["$geoWithin"]["$geometry"]["coordinates"][0]
+    assert ring[0] == ring[-1] == [121.0, 14.5] and [121.1, 14.6] in ring
+    assert listing.in_list("open") == "open"
+    assert listing.in_list("open, assigned") == {"$in": ["open", "assigned"]}
+    assert listing.projection(None, {"id"}) == (None, None)
+    proj, keys = listing.projection("id,status", {"id", "status"})
+    assert proj == {"_id": 1, "status": 1, "created_at": 1} and keys == ["id", "status"]
+    assert listing.pick({"id": "1", "status": "open", "items": []}, keys) == {"id": "1", "status": "open"}
+
+
+@pytest.mark.anyio
+async def test_pages_walk_every_document_once():
+    from app.core.db import db
+
+    col = db[f"listing_{ObjectId()}"]
+    base = datetime(2025, 1, 1)
+    # ties on created_at, and a few undated legacy rows
+    docs = [{"_id": ObjectId(), "created_at": base + timedelta(minutes=i // 3), "status": "open" if i % 2 else "closed"}
+            for i in range(20)]
+    docs += [{"_id": ObjectId(), "status": "open"} for _ in range(3)]
+    await col.insert_many(docs)
+    try:
+        seen, cursor = [], None
+        while True:
+            page, cursor = await listing.page(col, {}, limit=4, cursor=cursor)
+            seen += page
+            if cursor is None:
+                break
+        expected = sorted(docs, key=lambda d: (d.get("created_at") or datetime.min, d["_id"]), reverse=True)
+        assert [d["_id"] for d in seen] == [d["_id"] for d in expected]
+
+        open_page, nxt = await listing.page(col, {"status": "open"}, limit=50, cursor=None,
+                                            proj={"status": 1, "created_at": 1})
+        assert nxt is None and len(open_page) == 13
+        assert all(set(d) <= {"_id", "status", "created_at"} for d in open_page)
+    finally:
+        await col.drop()
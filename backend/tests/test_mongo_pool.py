@@ -0,0 +1,31 @@
+from pymongo import monitoring
+
+from app.core import mongo
+
+ADDR = ("db.internal", 27017)
+
+
+def test_pool_metrics_track_checkouts_and_waits():
+    m = mongo.PoolMetrics("test")
+    for cid in (1, 2):
+        m.connection_created(monitoring.ConnectionCreatedEvent(ADDR, cid))
+    m.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDR, 1, 0.002))
+    m.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDR, 2, 0.010))
+    m.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDR, 1))
+    m.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(ADDR, "timeout", 0.5))
+
+    [row] = m.snapshot()
+    assert row["client"] == "test" and row["server"] == "db.internal:27017"
+    assert row["open"] == 2 and row["checked_out"] == 1 and row["max_checked_out"] == 2
+    assert row["checkouts"] == 2 and row["checkout_failures"] == {"timeout": 1}
+    assert row["wait_ms_max"] == 500.0
+
+
+def test_settings_come_from_env(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "25")
+    monkeypatch.setenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")
+    opts = mongo.client_options()
+    assert opts["maxPoolSize"] == 25 and opts["readPreference"] == "secondaryPreferred"
+    assert opts["waitQueueTimeoutMS"] == 2000
+    assert "zlib" in opts["compressors"].split(",")
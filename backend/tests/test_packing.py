@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.services.packing import pack, vehicle_capacity
+
+
+def _items(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"kg": float(rng.integers(1, 40)), "volume_l": float(rng.integers(1, 100)),
+         "cold_slots": int(rng.random() < 0.2),
+         "lat": 14.4 + rng.random() * 0.3, "lng": 120.9 + rng.random() * 0.3}
+        for _ in range(n)
+    ]
+
+
+def _within(batch, cap):
+    return all(sum(it[d] for it in batch) <= cap.get(d, float("inf")) + 1e-9
+               for d in ("kg", "volume_l", "cold_slots"))
+
+
+def test_every_dimension_is_respected():
+    items = _items(400)
+    cap = {"kg": 200, "volume_l": 500, "cold_slots": 2}
+    for spatial in (False, True):
+        batches, caps, unpacked = pack(items, default_capacity=cap, spatial=spatial)
+        assert not unpacked
+        assert sum(len(b) for b in batches) == len(items)
+        assert all(_within(b, c) for b, c in zip(batches, caps))
+
+
+def test_fleet_bins_and_overflow():
+    fleet = [vehicle_capacity({"vehicle": "Refrigerated van"}), vehicle_capacity({"vehicle": "motorcycle"})]
+    assert fleet[0]["cold_slots"] == 8 and fleet[1]["kg"] == 30
+    items = [{"kg": 25, "cold_slots": 1}, {"kg": 700}, {"kg": 900}]
+    batches, caps, unpacked = pack(items, fleet, keep_empty=True)
+    assert len(batches) == 2
+    assert unpacked == [{"kg": 900}]
+    assert vehicle_capacity({"vehicle": "L300", "capacity_kg": 300}) == {"kg": 300.0}
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime, timezone
+
+from app.routers.route_planning import PlanRequest, _plan_route
+from app.services.plan_cache import PlanCache, fingerprint, route_plans
+
+
+def test_fingerprint_is_canonical():
+    a = fingerprint(depot=[121.0, 14.5], stops=[[1.0000000001, 2.0, 3]], capacity=80)
+    b = fingerprint(capacity=80, stops=[[1.0, 2.0, 3]], depot=(121.0, 14.5))
+    assert a == b
+    assert a != fingerprint(depot=[121.0, 14.5], stops=[[1.0, 2.0, 4]], capacity=80)
+    naive = datetime(2026, 10, 6, 8, 0)
+    assert fingerprint(t=naive) == fingerprint(t=naive.replace(tzinfo=timezone.utc))
+
+
+def test_lru_ttl_and_copies():
+    c = PlanCache(maxsize=2, ttl_s=0.05)
+    c.put("a", {"x": [1]})
+    c.put("b", {"x": [2]})
+    c.get("a")["x"].append(9)          # callers get their own copy
+    c.put("c", {"x": [3]})             # evicts b, the least recently used
+    assert c.get("a") == {"x": [1]} and c.get("b") is None
+    time.sleep(0.06)
+    assert c.get("a") is None and c.stats()["size"] == 1
+
+
+def test_route_plan_served_from_cache():
+    route_plans.clear()
+    stops = [{"id": f"s{i}", "coord": [121.0 + i * 0.01, 14.5 + (i % 3) * 0.01], "demand": 1} for i in range(8)]
+    req = PlanRequest(depot=[121.0, 14.5], stops=stops, vehicle_capacity=4)
+    first = _plan_route(req)
+    again = _plan_route(PlanRequest(depot=[121.0, 14.5], stops=stops[::-1], vehicle_capacity=4))
+    assert not first.cached and again.cached
+    assert again.ordered_stop_ids == first.ordered_stop_ids
+    assert not _plan_route(PlanRequest(depot=[121.0, 14.5], stops=stops, vehicle_capacity=5)).cached
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+from bson import ObjectId
+from httpx import AsyncClient
+from app.core.db import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_plan_stream_emits_routes_then_summary(test_client: AsyncClient):
+    don, req = ObjectId(), ObjectId()
+    await db.donations.insert_one({"_id": don, "donor_name": "Stream D", "location": {"lat": 14.56, "lng": 121.02}})
+    await db.requests.insert_one({"_id": req, "ngo_name": "Stream R", "location": {"lat": 14.60, "lng": 121.05}})
+    mids = (await db.matches.insert_many([
+        {"donation_id": don, "request_id": req, "item": "rice", "allocated": 5, "status": "planned"} for _ in range(2)
+    ])).inserted_ids
+
+    r = await test_client.post("/api/routes/plan_from_matches/stream",
+                               json={"depot": {"lat": 14.55, "lng": 121.0}, "time_budget_s": 0})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(x) for x in r.text.splitlines() if x]
+    routes = [x for x in lines if x["type"] == "route"]
+    assert lines[-1]["type"] == "summary" and lines[-1]["count"] == len(routes)
+
+    locked = await db.matches.find({"_id": {"$in": mids}}).to_list(None)
+    assert all(m["status"] == "in_progress" for m in locked)
+    assert {str(m["route_id"]) for m in locked} <= {p["plan"]["_id"] for p in routes}
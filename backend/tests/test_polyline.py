@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.services.polyline import decode, encode, simplify, tolerance_for_zoom
+
+
+def test_reference_encoding_round_trips():
+    pts = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    s = encode(pts)
+    assert s == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode(s) == pts
+
+
+def test_simplify_by_zoom():
+    # a wiggly 5 km street: ~10 m jitter around a straight line
+    rng = np.random.default_rng(0)
+    lat = np.linspace(14.50, 14.545, 400)
+    lng = 121.0 + rng.normal(0, 0.0001, 400)
+    pts = list(zip(lat.tolist(), lng.tolist()))
+    far = simplify(pts, tolerance_for_zoom(10, 14.5))
+    near = simplify(pts, tolerance_for_zoom(18, 14.5))
+    assert far[0] == pts[0] and far[-1] == pts[-1]
+    assert len(far) < 10 < len(near) <= len(pts)
+
+
+def test_stored_geometry_prefers_configured_provider(monkeypatch):
+    import asyncio
+    import httpx
+    from app.services import routing
+
+    stops = [{"lat": 14.55, "lng": 121.02}, {"lat": 14.56, "lng": 121.03}]
+    road = encode([(14.55, 121.02), (14.555, 121.021), (14.56, 121.03)])
+
+    async def osrm(s):
+        return {"geometry": road, "source": "osrm"}
+
+    monkeypatch.setattr(routing, "osrm_plan", osrm)
+    monkeypatch.setattr(routing, "GEOMETRY_PROVIDER", "osrm")
+    assert asyncio.run(routing.route_geometry(stops)) == (road, "osrm")
+
+    async def down(s):
+        raise httpx.ConnectError("down")
+
+    # provider failure (or no provider) → stop-to-stop shape
+    monkeypatch.setattr(routing, "osrm_plan", down)
+    line, source = asyncio.run(routing.route_geometry(stops))
+    assert source in ("stops", "road") and len(decode(line)) >= 2
+    monkeypatch.setattr(routing, "GEOMETRY_PROVIDER", "")
+    assert asyncio.run(routing.route_geometry(stops))[1] in ("stops", "road")
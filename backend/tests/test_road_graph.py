@@ -0,0 +1,33 @@
+import numpy as np
+
+from app.services.road_graph import RoadGraph
+from scripts.bench_road_graph import synthetic_grid
+
+
+def test_bidirectional_astar_matches_dijkstra():
+    g = synthetic_grid(20)
+    rng = np.random.default_rng(3)
+    for s, t in rng.integers(0, g.n, size=(25, 2)):
+        res = g.shortest_path(int(s), int(t))
+        times, lens = g.one_to_many(int(s), [int(t)])
+        assert res is not None
+        assert abs(res[0] - times[0]) < 1e-3
+        assert res[2][0] == s and res[2][-1] == t
+
+
+def test_mmap_roundtrip_and_snap(tmp_path):
+    g = synthetic_grid(10)
+    g.save(str(tmp_path))
+    h = RoadGraph.load(str(tmp_path))
+    assert isinstance(h.fwd[1], np.memmap)
+    v = 37
+    assert h.nearest_node(float(h.lat[v]) + 1e-6, float(h.lng[v])) == v
+    a = g.shortest_path(0, g.n - 1)
+    b = h.shortest_path(0, h.n - 1)
+    assert abs(a[0] - b[0]) < 1e-6
+
+
+def test_unreachable_returns_none():
+    g = RoadGraph.from_edges([14.5, 14.6], [121.0, 121.1], [0], [1], [100.0], [10.0])
+    assert g.shortest_path(1, 0) is None
+    assert g.shortest_path(0, 1)[1] == 100.0
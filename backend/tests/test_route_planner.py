@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+
+from app.services.routing import plan_route
+from app.services.route_opt import haversine_matrix, leg_lengths
+from app.services.batch_opt import improve_batch
+
+
+def _stops(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {"id": f"S{i}", "coord": [120.95 + rng.random() * 0.1, 14.5 + rng.random() * 0.1],
+         "demand": float(rng.integers(1, 15))}
+        for i in range(n)
+    ]
+
+
+def test_trips_respect_capacity_and_distance():
+    stops = _stops(150)
+    depot = [121.0, 14.55]
+    plan = plan_route({"depot": depot, "stops": stops, "vehicle_capacity": 60, "max_distance_km": 40})
+    by_id = {s["id"]: s for s in stops}
+    assert sorted(plan["ordered_stop_ids"]) == sorted(by_id)
+    for trip in plan["trips"]:
+        assert sum(by_id[i]["demand"] for i in trip) <= 60
+        pts = [depot] + [by_id[i]["coord"] for i in trip] + [depot]
+        D = haversine_matrix([p[1] for p in pts], [p[0] for p in pts])
+        assert sum(D[k, k + 1] for k in range(len(pts) - 1)) <= 40 + 1e-6
+    assert plan["legs"][0]["from_id"] == "DEPOT"
+    assert plan["legs"][-1]["to_id"] == "DEPOT"
+    etas = [lg["eta_min"] for lg in plan["legs"]]
+    assert etas == sorted(etas)
+
+
+def test_infeasible_stops_are_reported():
+    stops = [
+        {"id": "near", "coord": [121.0, 14.56], "demand": 5},
+        {"id": "heavy", "coord": [121.0, 14.57], "demand": 500},
+        {"id": "far", "coord": [122.5, 15.9], "demand": 1},
+    ]
+    plan = plan_route({"depot": [121.0, 14.55], "stops": stops, "vehicle_capacity": 50, "max_distance_km": 30})
+    assert plan["ordered_stop_ids"] == ["near"]
+    assert {u["id"] for u in plan["unassigned"]} == {"heavy", "far"}
+
+
+def test_batch_improvement_keeps_pickups_first_and_never_worsens():
+    rng = np.random.default_rng(3)
+    depot = (14.55, 121.0)
+    picks = [(14.5 + rng.random() * 0.1, 120.95 + rng.random() * 0.1) for _ in range(12)]
+    drops = [(14.5 + rng.random() * 0.1, 120.95 + rng.random() * 0.1) for _ in range(9)]
+
+    def length(p, d):
+        pts = [depot] + p + d + [depot]
+        return leg_lengths([x[0] for x in pts], [x[1] for x in pts]).sum()
+
+    po, do = improve_batch(depot, picks, drops, time.time() + 2.0)
+    assert sorted(po) == list(range(12)) and sorted(do) == list(range(9))
+    assert length([picks[i] for i in po], [drops[i] for i in do]) <= length(picks, drops) + 1e-9
+    assert improve_batch(depot, picks, drops, time.time() - 1.0) is None
+
+
+def test_min_time_limits_trips_on_km_not_fastest_speed(monkeypatch):
+    # 10 km/h in the cell on the depot→A leg, 60 km/h everywhere else
+    from app.services import routing
+    from app.services.speed_profile import HOURS, SpeedProfile, _cell_keys
+
+    depot, a, b = [121.0, 14.55], [121.0, 14.59], [121.03, 14.55]
+    slow = _cell_keys([14.57], [121.0], 0.01)
+    prof = SpeedProfile(slow, np.full((HOURS, 1), 10.0, np.float32), np.full(HOURS, 60.0, np.float32), 0.01)
+    monkeypatch.setattr(routing, "get_profile", lambda: prof)
+    req = {"depot": depot, "stops": [{"id": "A", "coord": a}, {"id": "B", "coord": b}], "max_distance_km": 15}
+
+    fast = plan_route({**req, "objective": "min_time"})
+    short = plan_route({**req, "objective": "shortest_path"})
+    assert sorted(fast["ordered_stop_ids"]) == sorted(short["ordered_stop_ids"]) == ["A", "B"]
+    assert fast["unassigned"] == []
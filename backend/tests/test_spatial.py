@@ -0,0 +1,32 @@
+import numpy as np
+
+from app.services.spatial import NearestIndex, nn_order
+
+
+def _brute(idx, lat, lng, qa, qb, dead):
+    d = (lat - qa) ** 2 * 111.32 ** 2 + ((lng - qb) * idx._kx) ** 2
+    d[list(dead)] = np.inf
+    return int(np.argmin(d))
+
+
+def test_nearest_with_deletions_matches_brute_force():
+    rng = np.random.default_rng(5)
+    lat = 14.4 + rng.random(500) * 0.3
+    lng = 120.9 + rng.random(500) * 0.3
+    idx = NearestIndex(lat, lng)
+    dead = set()
+    for step in range(400):
+        qa, qb = 14.4 + rng.random() * 0.3, 120.9 + rng.random() * 0.3
+        assert idx.nearest(qa, qb) == _brute(idx, lat, lng, qa, qb, dead)
+        victim = int(rng.integers(0, 500))
+        idx.remove(victim)
+        dead.add(victim)
+    assert len(idx) == 500 - len(dead)
+
+
+def test_nn_order_visits_every_point_once():
+    rng = np.random.default_rng(1)
+    lat = 14.5 + rng.random(1200) * 0.2
+    lng = 121.0 + rng.random(1200) * 0.2
+    order = nn_order((14.55, 121.05), lat, lng)
+    assert sorted(order) == list(range(1200))
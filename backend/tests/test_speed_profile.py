@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services.route_opt import leg_lengths
+from app.services.speed_profile import SpeedProfile, evaluate, hour_of_week
+
+
+def _routes(n, seed=0):
+    # Manila time = UTC+8: 07:00-09:00 local weekdays crawl at 8 km/h, otherwise 30 km/h
+    rng = np.random.default_rng(seed)
+    monday = datetime(2026, 10, 5, tzinfo=timezone.utc) - timedelta(hours=8)  # Mon 00:00 local
+    out = []
+    for _ in range(n):
+        start = monday + timedelta(days=int(rng.integers(0, 5)), hours=int(rng.integers(5, 20)))
+        lat = 14.5 + rng.random(5) * 0.1
+        lng = 121.0 + rng.random(5) * 0.1
+        km = leg_lengths(lat, lng).sum()
+        local_h = hour_of_week(start) % 24
+        kmh = 8.0 if 7 <= local_h < 9 else 30.0
+        out.append({
+            "steps": [{"lat": a, "lng": b} for a, b in zip(lat, lng)],
+            "started_at": start,
+            "completed_at": start + timedelta(hours=km / kmh),
+        })
+    return out
+
+
+def test_profile_beats_flat_speed_and_round_trips(tmp_path):
+    train, test = _routes(400), _routes(100, seed=1)
+    prof = SpeedProfile.build(train)
+    rep = evaluate(test, prof)
+    assert rep["routes"] == 100
+    assert rep["mae_min"] < rep["baseline_mae_min"] / 2
+
+    path = str(tmp_path / "p.npz")
+    prof.save(path)
+    again = SpeedProfile.load(path)
+    lat, lng = [14.52, 14.58], [121.02, 121.07]
+    rush = datetime(2026, 10, 6, 0, 5, tzinfo=timezone.utc)   # Tue 08:05 local
+    night = datetime(2026, 10, 6, 14, 5, tzinfo=timezone.utc)  # Tue 22:05 local
+    assert again.path_minutes(lat, lng, rush).sum() > 2 * again.path_minutes(lat, lng, night).sum()
+
+
+def test_flat_profile_matches_constant_speed():
+    prof = SpeedProfile.flat(25.0)
+    lat, lng = [14.5, 14.6, 14.55], [121.0, 121.05, 121.1]
+    km = leg_lengths(lat, lng).sum()
+    assert np.isclose(prof.path_minutes(lat, lng).sum(), km / 25.0 * 60.0)
+    M = prof.minutes_matrix(lat, lng)
+    assert M.shape == (3, 3) and np.allclose(np.diag(M), 0.0)
@@ -0,0 +1,98 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.services import time_windows as tw
+from app.services.routing import plan_route
+
+
+def _instance(n, seed=0):
+    rng = np.random.default_rng(seed)
+    T = rng.uniform(5, 30, (n, n))
+    np.fill_diagonal(T, 0.0)
+    e = rng.uniform(0, 200, n)
+    l = e + rng.uniform(30, 120, n)
+    e[0], l[0] = 0.0, np.inf
+    return T, e, l, np.full(n, 2.0)
+
+
+def test_slack_insertion_matches_full_recompute():
+    T, e, l, s = _instance(12)
+    route = [0, 3, 7, 1, 0]
+    _, beg, F = tw.schedule(route, T, e, l, s)
+    assert tw.feasible(route, beg, l)
+    cand = np.array([2, 4, 5, 6, 8, 9, 10, 11])
+    _, ok = tw.insertion(route, beg, F, cand, T, T, e, l, s)
+    for p in range(len(route) - 1):
+        for k, u in enumerate(cand):
+            r2 = route[:p + 1] + [int(u)] + route[p + 1:]
+            _, b2, _ = tw.schedule(r2, T, e, l, s)
+            assert ok[p, k] == tw.feasible(r2, b2, l)
+    assert ok.any() and not ok.all()
+
+
+def _stops(n, t0, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        start = t0 + timedelta(minutes=int(rng.integers(0, 480)))
+        out.append({
+            "id": f"s{i}",
+            "coord": [121.0 + rng.random() * 0.1, 14.5 + rng.random() * 0.1],
+            "demand": 1,
+            "time_window": {"start": start, "end": start + timedelta(minutes=240)},
+            "service_min": 2,
+        })
+    return out
+
+
+def test_plan_route_respects_windows_and_reports_misses():
+    t0 = datetime(2026, 10, 6, 1, tzinfo=timezone.utc)
+    stops = _stops(40, t0)
+    stops.append({"id": "past", "coord": [121.05, 14.55],
+                  "time_window": {"start": t0 - timedelta(hours=3), "end": t0 - timedelta(hours=2)}})
+    out = plan_route({"depot": [121.05, 14.55], "stops": stops, "vehicle_capacity": 15, "depart_at": t0})
+
+    assert {"id": "past", "reason": "time window cannot be met"} in out["unassigned"]
+    served = set(out["ordered_stop_ids"])
+    assert served | {u["id"] for u in out["unassigned"]} == {s["id"] for s in stops}
+    ends = {s["id"]: (s["time_window"]["end"] - t0).total_seconds() / 60 for s in stops}
+    for leg in out["legs"]:
+        if leg["to_id"] != "DEPOT":
+            assert leg["eta_min"] <= ends[leg["to_id"]] + 0.1
+    etas = [leg["eta_min"] for leg in out["legs"]]
+    assert etas == sorted(etas)
+
+
+def test_300_stops_replan_fast():
+    t0 = datetime(2026, 10, 6, 1, tzinfo=timezone.utc)
+    stops = _stops(300, t0, seed=1)
+    start = time.perf_counter()
+    out = plan_route({"depot": [121.05, 14.55], "stops": stops, "vehicle_capacity": 60, "depart_at": t0})
+    assert time.perf_counter() - start < 2.0
+    assert len(out["ordered_stop_ids"]) + len(out["unassigned"]) == 300
+
+
+def test_improved_trip_kept_within_max_km(monkeypatch):
+    # depot and three corners of a unit square: the perimeter is 4 km, a crossing order 4.41 km
+    xy = np.array([[0, 0], [0, 1], [1, 1], [1, 0]], dtype=float)
+    D = np.linalg.norm(xy[:, None] - xy[None, :], axis=2)
+    T = D * 2.0
+    e, l, s = np.full(4, -np.inf), np.full(4, np.inf), np.zeros(4)
+    e[0] = 0.0
+    demand = np.zeros(4)
+    # a time-scored move that lengthens the trip must not push it past max_km
+    monkeypatch.setattr(tw, "improve", lambda route, *a, **k: [0, 1, 3, 2, 0])
+    trips, _, left = tw.build_trips([1, 2, 3], T, T, D, e, l, s, demand, None, 4.2, time.perf_counter() + 1)
+    assert not left and len(trips) == 1
+    r = np.asarray(trips[0])
+    assert D[r[:-1], r[1:]].sum() <= 4.2
+
+
+def test_balanced_with_windows_is_noted():
+    t0 = datetime(2026, 10, 6, 1, tzinfo=timezone.utc)
+    out = plan_route({"depot": [121.05, 14.55], "stops": _stops(5, t0), "objective": "balanced", "depart_at": t0})
+    assert out["notes"] and "balanced" in out["notes"][0]
+    out = plan_route({"depot": [121.05, 14.55], "stops": _stops(5, t0), "depart_at": t0})
+    assert out["notes"] == []
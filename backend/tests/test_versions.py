@@ -0,0 +1,52 @@
+import pytest
+from bson import ObjectId
+from starlette.requests import Request
+
+from app.services import versions
+
+
+def _request(path="/api/donations", query=b""):
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []})
+
+
+def test_etag_depends_on_path_query_and_versions():
+    v = {"donations": "e.1"}
+    tag = versions.etag(_request(query=b"limit=5&status=open"), v)
+    assert tag.startswith('W/"') and tag.endswith('"')
+    # query param order doesn't matter, values and versions do
+    assert versions.etag(_request(query=b"status=open&limit=5"), v) == tag
+    assert versions.etag(_request(query=b"limit=6&status=open"), v) != tag
+    assert versions.etag(_request(query=b"limit=5&status=open"), {"donations": "e.2"}) != tag
+    assert versions.etag(_request("/api/requests", b"limit=5&status=open"), v) != tag
+
+
+def test_if_none_match():
+    tag = 'W/"abc"'
+    assert versions.matches('W/"abc"', tag)
+    assert versions.matches('"abc"', tag)
+    assert versions.matches('"x", W/"abc"', tag)
+    assert versions.matches("*", tag)
+    assert not versions.matches('W/"abd"', tag)
+    assert not versions.matches(None, tag)
+
+
+@pytest.mark.anyio
+async def test_listing_answers_304_until_a_write(test_client):
+    from app.core.db import db
+
+    r = await test_client.get("/api/donations", params={"limit": 1})
+    assert r.status_code == 200
+    tag = r.headers["etag"]
+
+    r = await test_client.get("/api/donations", params={"limit": 1}, headers={"If-None-Match": tag})
+    assert r.status_code == 304 and r.headers["etag"] == tag
+
+    created = await test_client.post("/api/donations", json={
+        "donor_name": f"etag {ObjectId()}", "items": [{"name": "rice", "qty": 1, "unit": "kg"}],
+        "location": {"lat": 14.55, "lng": 121.02},
+    })
+    assert created.status_code == 201
+    r = await test_client.get("/api/donations", params={"limit": 1}, headers={"If-None-Match": tag})
+    assert r.status_code == 200 and r.headers["etag"] != tag
+    assert r.json()["items"][0]["id"] == created.json()["donation"]["id"]
+    await db.donations.delete_one({"_id": ObjectId(created.json()["donation"]["id"])})
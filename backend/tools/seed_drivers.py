@@ -1,13 +1,11 @@
 # tools/seed_drivers.py
 from datetime import datetime
-from pymongo import MongoClient, ASCENDING
-import os
+from pymongo import ASCENDING
 
-URI = os.getenv("MONGODB_URI", "mongodb://127.0.0.1:27017")
-DB_NAME = os.getenv("MONGODB_DB", "foodbridge")
+from app.core.mongo import get_sync_db
+from app.services.versions import bump_sync
 
-client = MongoClient(URI)
-db = client[DB_NAME]
+db = get_sync_db()
 
 # --- Drop existing drivers collection if you want to refresh it ---
 db.drop_collection("drivers")
@@ -21,6 +19,7 @@ drivers = [
 ]
 
 db.drivers.insert_many(drivers)
+bump_sync(db, "drivers")  # running clients' cached /drivers/ lists are stale now
 
 # --- Helpful indexes ---
 db.drivers.create_index([("availability", ASCENDING)])
@@ -1,6 +1,7 @@
 import flet as ft
 import requests
 import urllib.parse
+import copy
 from datetime import datetime
 
 import webbrowser
@@ -40,12 +41,28 @@ def http_post_json(url, payload: dict, headers=None):
     r.raise_for_status()
     return r.json()
 
+# url (+ auth) -> (ETag, parsed body) of the last 200, for conditional GETs
+_GET_CACHE = {}
+
 def http_get(url, headers=None):
+    """GET JSON; revalidates with If-None-Match and reuses the cached body on 304."""
+    headers = dict(headers or {})
+    key = (url, headers.get("Authorization"))
+    cached = _GET_CACHE.get(key)
+    if cached:
+        headers["If-None-Match"] = cached[0]
     print("GET", url)
-    r = requests.get(url, headers=headers or {})
+    r = requests.get(url, headers=headers)
     print("->", r.status_code)
+    if r.status_code == 304 and cached:
+        return copy.deepcopy(cached[1])
     r.raise_for_status()
-    return r.json()
+    data = r.json()
+    if r.headers.get("ETag"):
+        _GET_CACHE[key] = (r.headers["ETag"], copy.deepcopy(data))
+    else:
+        _GET_CACHE.pop(key, None)
+    return data
 
 def http_patch(url, params=None, headers=None, timeout=10):
     print("PATCH", url, params)